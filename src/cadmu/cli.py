@@ -2,17 +2,32 @@ from __future__ import annotations
 
 import argparse
 import os
-import tarfile
-from datetime import datetime
+from dataclasses import replace
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Iterable
 
 from cadmu import __version__
-from cadmu.core.reporting import report_writer
+from cadmu.core.reporting import (
+    COMPRESSION_SUFFIXES,
+    FLUSH_POLICIES,
+    JsonlRecorder,
+    ReportRecorder,
+    available_codecs,
+    compressed_path,
+    report_writer,
+    sidecar_path,
+)
+from cadmu.core import report_index
 from cadmu.core.runner import CommandRunner
-from cadmu.core.system import default_report_path, detect_host, is_arch
+from cadmu.core.snapshots import SnapshotSession, SnapshotStore
+from cadmu.core.system import default_report_path, detect_host, is_arch, snapshot_store_path
+from cadmu.core.table import page, terminal_width
+from cadmu.core.timeseries import METRICS_NAME
+from cadmu.core.usage_index import USAGE_INDEX_NAME
 from cadmu.modules.arch import pacman as arch_pacman
-from cadmu.modules.audit.base import AuditOptions, run_audit
+from cadmu.modules.audit.base import AuditOptions, run_audit_checks
+from cadmu.modules.audit.watch import AuditWatcher, WatchEvent
 from cadmu.modules.cleaning.base import CleanupAction, CleanupOptions, execute_actions, planned_actions
 from cadmu.modules.diagnostics import arch as arch_diag
 from cadmu.modules.diagnostics.base import DiagnosticsOptions, run_diagnostics
@@ -28,13 +43,56 @@ def main() -> None:
 
     diag_parser = subparsers.add_parser("diag", help="Generate a diagnostic report")
     diag_parser.add_argument("--output", type=Path, help="Explicit output file path (.txt)")
-    diag_parser.add_argument("--compress", action="store_true", help="Additionally create a .tar.gz archive")
+    diag_parser.add_argument(
+        "--compress",
+        nargs="?",
+        const="gzip",
+        choices=list(COMPRESSION_SUFFIXES),
+        help="Write the report through a streaming compressor (default codec: gzip)",
+    )
+    diag_parser.add_argument("--compress-level", type=int, default=None, help="Compression level for --compress")
+    diag_parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Only store output that changed since the previous report in the same directory",
+    )
+    diag_parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="Also store each command output once, by content hash, in the snapshot store",
+    )
+    diag_parser.add_argument(
+        "--format",
+        choices=["text", "jsonl"],
+        default="text",
+        help="jsonl additionally writes one JSON record per command next to the text report",
+    )
     diag_parser.add_argument("--skip-arch", action="store_true", help="Skip Arch-specific diagnostics")
     diag_parser.add_argument("--no-optional", action="store_true", help="Skip optional diagnostics")
     diag_parser.add_argument("--sudo", action="store_true", help="Allow CADMU to use sudo for privileged commands")
+    diag_parser.add_argument("--jobs", type=int, default=1, help="Run up to N diagnostic commands concurrently (default: 1)")
+    diag_parser.add_argument(
+        "--flush",
+        choices=FLUSH_POLICIES,
+        default="section",
+        help="When to flush the report buffer to disk (default: section)",
+    )
+    diag_parser.add_argument("--fsync", action="store_true", help="fsync the report after every completed section")
+    diag_parser.add_argument(
+        "--full-scan",
+        action="store_true",
+        help="Re-read every directory for the disk-usage summaries instead of trusting the cached index",
+    )
 
     audit_parser = subparsers.add_parser("audit", help="Run health audits and print findings")
     audit_parser.add_argument("--sudo", action="store_true", help="Allow sudo for commands that require it")
+    audit_parser.add_argument("--timings", action="store_true", help="Print how long each check took")
+    audit_parser.add_argument(
+        "--watch", action="store_true", help="Keep running and print findings as they appear, change or clear"
+    )
+    audit_parser.add_argument(
+        "--check-timeout", type=float, default=None, help="Seconds each check may run (default: per-check limits)"
+    )
 
     clean_parser = subparsers.add_parser("clean", help="List or execute cleanup routines")
     clean_parser.add_argument("--execute", action="store_true", help="Execute the proposed cleanup actions")
@@ -49,17 +107,41 @@ def main() -> None:
     update_parser.add_argument("--execute", action="store_true", help="Run update commands instead of printing them")
     update_parser.add_argument("--sudo", action="store_true", help="Allow sudo for update commands")
 
+    report_parser = subparsers.add_parser("report", help="Inspect previously generated diagnostic reports")
+    report_commands = report_parser.add_subparsers(dest="report_command", required=True)
+    show_parser = report_commands.add_parser("show", help="Print one section of a report using its index")
+    show_parser.add_argument("file", type=Path, help="Report file (.txt, .txt.gz, .txt.xz, .txt.zst)")
+    show_parser.add_argument("--section", help="Section title to print (omit to list sections)")
+    show_parser.add_argument("--command", dest="command_label", help="Only print the block for this command label")
+    history_parser = report_commands.add_parser("history", help="Show stored outputs of one command over time")
+    history_parser.add_argument("label", help="Command label or command line, e.g. 'ip route'")
+    history_parser.add_argument("--at", type=datetime.fromisoformat, help="Print the output as of this ISO date/time")
+    history_parser.add_argument("--store", type=Path, help="Snapshot store directory (default: diagnostic_reports/store)")
+    gc_parser = report_commands.add_parser("gc", help="Expire old snapshots and delete unreferenced outputs")
+    gc_parser.add_argument("--keep", type=int, help="Keep only the newest N snapshots")
+    gc_parser.add_argument("--max-age", type=int, metavar="DAYS", help="Drop snapshots older than DAYS days")
+    gc_parser.add_argument("--store", type=Path, help="Snapshot store directory (default: diagnostic_reports/store)")
+
     arch_parser = subparsers.add_parser("arch", help="Arch Linux focused tooling")
     arch_parser.add_argument("--pacman", action="store_true", help="Enable pacman dataset outputs")
     arch_parser.add_argument("--explicit-installed", action="store_true", help="Summarise explicitly installed packages")
+    arch_parser.add_argument("--all-installed", action="store_true", help="Summarise every installed package")
     arch_parser.add_argument("--recommendations", action="store_true", help="Include recommendation columns")
     arch_parser.add_argument("--limit", type=int, default=None, help="Limit number of rows displayed")
+    arch_parser.add_argument(
+        "--sort",
+        choices=arch_pacman.SORT_FIELDS,
+        default=None,
+        help="Order rows by field (largest/oldest first; name ascending)",
+    )
+    arch_parser.add_argument("--top", type=int, default=None, help="Only show the top N rows by --sort (default: age)")
+    arch_parser.add_argument("--no-pager", action="store_true", help="Never pipe the package table through $PAGER")
     arch_parser.add_argument("--sudo", action="store_true", help="Allow sudo for privileged arch commands")
 
     args = parser.parse_args()
 
     identity = detect_host()
-    runner = CommandRunner(use_sudo=args.sudo or os.geteuid() == 0)
+    runner = CommandRunner(use_sudo=getattr(args, "sudo", False) or os.geteuid() == 0)
 
     if args.command == "diag":
         handle_diag(args, identity, runner)
@@ -71,6 +153,8 @@ def main() -> None:
         handle_maintain(args, identity, runner)
     elif args.command == "update":
         handle_update(args, identity, runner)
+    elif args.command == "report":
+        handle_report(args, identity)
     elif args.command == "arch":
         arch_runner = CommandRunner(use_sudo=args.sudo or os.geteuid() == 0)
         handle_arch(args, identity, arch_runner)
@@ -82,30 +166,162 @@ def handle_diag(args: argparse.Namespace, identity, runner: CommandRunner) -> No
     filename.parent.mkdir(parents=True, exist_ok=True)
 
     include_arch = not args.skip_arch and is_arch(identity.os_release)
-    options = DiagnosticsOptions(home=identity.home, include_optional=not args.no_optional, include_arch=include_arch)
+    options = DiagnosticsOptions(
+        home=identity.home,
+        include_optional=not args.no_optional,
+        include_arch=include_arch,
+        jobs=max(1, args.jobs),
+        usage_index=default_report_path(identity.home, USAGE_INDEX_NAME),
+        full_scan=args.full_scan,
+    )
 
     arch_sections = arch_diag.arch_sections(options) if include_arch else None
 
-    with report_writer(filename, host=os.uname().nodename, effective_user=identity.effective_user, owner=identity.report_owner) as writer:
-        run_diagnostics(writer, runner, options, arch_sections=arch_sections)
-
-    archive_path: Path | None = None
     if args.compress:
-        archive_path = filename.with_suffix(".tar.gz")
-        with tarfile.open(archive_path, "w:gz") as tar:
-            tar.add(filename, arcname=filename.name)
+        if args.compress not in available_codecs():
+            print(f"{args.compress} compression is unavailable (install the 'zstandard' package for zstd).")
+            return
+        filename = compressed_path(filename, args.compress)
+
+    if args.delta:
+        options.delta = True
+        baseline = report_index.load_baseline(filename.parent, exclude=filename)
+        if baseline is not None:
+            options.baseline_report, options.baseline = baseline
+            print(f"Delta mode: unchanged output will reference {options.baseline_report}")
+
+    recorders: list[ReportRecorder] = [report_index.IndexRecorder(filename)]
+    records_path: Path | None = None
+    if args.format == "jsonl":
+        records_path = sidecar_path(filename, ".jsonl")
+        recorders.append(JsonlRecorder(records_path))
+
+    snapshots = None
+    if args.snapshot:
+        snapshots = SnapshotSession(
+            SnapshotStore(snapshot_store_path(identity.home)), report=filename.name, host=os.uname().nodename
+        )
+
+    with report_writer(
+        filename,
+        host=os.uname().nodename,
+        effective_user=identity.effective_user,
+        owner=identity.report_owner,
+        flush_policy=args.flush,
+        fsync=args.fsync,
+        compression=args.compress,
+        compression_level=args.compress_level,
+        recorders=recorders,
+        snapshots=snapshots,
+    ) as writer:
+        run_diagnostics(writer, runner, options, arch_sections=arch_sections)
 
     print(f"Diagnostic report written to {filename}")
-    if archive_path:
-        print(f"Compressed archive created at {archive_path}")
+    if records_path:
+        print(f"Structured records written to {records_path}")
+    if snapshots is not None:
+        print(f"Snapshot manifest written to {snapshots.manifest_path}")
+
+
+def handle_report(args: argparse.Namespace, identity) -> None:
+    if args.report_command == "history":
+        handle_report_history(args, identity)
+        return
+    if args.report_command == "gc":
+        handle_report_gc(args, identity)
+        return
+    if not args.file.exists():
+        print(f"Report not found: {args.file}")
+        return
+    index = report_index.load_index(args.file)
+    if not args.section:
+        if index is None:
+            print("No index found for this report; pass --section to scan for it.")
+            return
+        print(f"Sections in {args.file}:")
+        for entry in index.sections:
+            print(f" - {entry.title} ({len(entry.commands)} commands, {entry.length} bytes)")
+        return
+
+    if index is None:
+        block = report_index.scan_section(args.file, args.section)
+        if block is None:
+            print(f"Section '{args.section}' not found.")
+            return
+        print(block.decode("utf-8", errors="replace"), end="")
+        return
+
+    section = index.find_section(args.section)
+    if section is None:
+        print(f"Section '{args.section}' not found. Available: {', '.join(s.title for s in index.sections)}")
+        return
+    if args.command_label:
+        match = next((c for c in section.commands if c.label == args.command_label), None)
+        if match is None:
+            labels = ", ".join(c.label or c.command for c in section.commands)
+            print(f"Command '{args.command_label}' not found in '{section.title}'. Available: {labels}")
+            return
+        block = report_index.read_command(args.file, index, match)
+    else:
+        block = report_index.read_section(args.file, index, section)
+    print(block.decode("utf-8", errors="replace"), end="")
+
+
+def handle_report_history(args: argparse.Namespace, identity) -> None:
+    store = SnapshotStore(args.store or snapshot_store_path(identity.home))
+    if args.at is not None:
+        manifest = store.manifest_at(args.at)
+        entry = manifest.find(args.label) if manifest else None
+        if manifest is None or entry is None:
+            print(f"No snapshot of '{args.label}' at or before {args.at.isoformat()}.")
+            return
+        print(f"# {entry.command} ({manifest.created.isoformat()}, {manifest.report})")
+        if entry.blob is None:
+            print("(output not stored)")
+            return
+        print(store.read_blob(entry.blob).decode("utf-8", errors="replace"))
+        return
+
+    history = store.history(args.label)
+    if not history:
+        print(f"No snapshots of '{args.label}' found.")
+        return
+    previous = None
+    for manifest, entry in history:
+        marker = "" if entry.blob == previous else " (changed)" if previous else ""
+        digest = entry.blob[:12] if entry.blob else "-"
+        print(f"{manifest.created.isoformat()}  {digest}  {entry.size:>8} bytes  {manifest.report}{marker}")
+        previous = entry.blob
+
+
+def handle_report_gc(args: argparse.Namespace, identity) -> None:
+    if args.keep is None and args.max_age is None:
+        print("Nothing to do: pass --keep and/or --max-age.")
+        return
+    store = SnapshotStore(args.store or snapshot_store_path(identity.home))
+    max_age = timedelta(days=args.max_age) if args.max_age is not None else None
+    stats = store.gc(keep=args.keep, max_age=max_age)
+    print(
+        f"Removed {stats.manifests_removed} snapshots and {stats.blobs_removed} unreferenced outputs "
+        f"({stats.bytes_freed} bytes freed)."
+    )
 
 
 def handle_audit(args: argparse.Namespace, identity, runner: CommandRunner) -> None:
-    findings = run_audit(runner, AuditOptions(home=identity.home, os_release=identity.os_release))
-    if not findings:
-        print("No audit findings detected. System looks healthy!")
+    options = AuditOptions(
+        home=identity.home,
+        os_release=identity.os_release,
+        usage_index=default_report_path(identity.home, USAGE_INDEX_NAME),
+        pacman_cache=default_report_path(identity.home, arch_pacman.PACMAN_CACHE_NAME),
+        metrics=default_report_path(identity.home, METRICS_NAME),
+    )
+    if args.watch:
+        handle_audit_watch(runner, options)
         return
-    for finding in findings:
+    report = run_audit_checks(runner, options, timeout=args.check_timeout)
+    if not report.findings:
+        print("No audit findings detected. System looks healthy!")
+    for finding in report.findings:
         header = f"[{finding.severity.upper()}] {finding.category}: {finding.summary}"
         print(header)
         if finding.detail:
@@ -113,6 +329,29 @@ def handle_audit(args: argparse.Namespace, identity, runner: CommandRunner) -> N
         if finding.remediation:
             print(f"  fix: {finding.remediation}")
         print()
+    if args.timings:
+        print("Check timings:")
+        for timing in report.timings:
+            print(f" - {timing.name}: {timing.duration:.2f}s ({timing.status})")
+
+
+def handle_audit_watch(runner: CommandRunner, options: AuditOptions) -> None:
+    # The storage check samples statvfs every few seconds; skip the largest-directory
+    # scan that a one-shot audit attaches to a nearly full home.
+    watcher = AuditWatcher(runner, replace(options, usage_index=None))
+    print("Watching for audit changes (Ctrl-C to stop)...", flush=True)
+    try:
+        watcher.watch(_print_watch_event)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+
+def _print_watch_event(event: WatchEvent) -> None:
+    finding = event.finding
+    stamp = event.at.astimezone().strftime("%H:%M:%S")
+    print(f"{stamp} {event.kind.upper():<7} [{finding.severity.upper()}] {finding.category}: {finding.summary}", flush=True)
+    if finding.detail and event.kind != "cleared":
+        print(f"  details: {finding.detail}", flush=True)
 
 
 def handle_clean(args: argparse.Namespace, identity, runner: CommandRunner) -> None:
@@ -174,23 +413,33 @@ def handle_arch(args: argparse.Namespace, identity, runner: CommandRunner) -> No
         print("No data source selected. Use --pacman to query pacman insights.")
         return
 
-    if not args.explicit_installed:
-        print("Currently only --explicit-installed is supported. Use --explicit-installed to list packages.")
+    if not args.explicit_installed and not args.all_installed:
+        print("Select a package listing: --explicit-installed or --all-installed.")
+        return
+
+    cache_path = default_report_path(identity.home, arch_pacman.PACMAN_CACHE_NAME)
+    if args.all_installed:
+        handle_arch_installed(args, runner, cache_path)
         return
 
     try:
-        infos = arch_pacman.collect_explicit_infos(runner)
+        infos = arch_pacman.collect_explicit_infos(runner, cache_path=cache_path)
     except arch_pacman.PacmanDataError as exc:  # type: ignore[attr-defined]
         print(f"Failed to query pacman data: {exc}")
         return
-
-    table = arch_pacman.build_explicit_package_table(
-        runner,
-        include_recommendations=args.recommendations,
-        limit=args.limit,
-        infos=infos,
+    if args.sort or args.top:
+        infos = arch_pacman.order_infos(infos, args.sort or "age", limit=args.top)
+
+    page(
+        arch_pacman.iter_explicit_package_table(
+            runner,
+            include_recommendations=args.recommendations,
+            limit=args.limit,
+            infos=infos,
+            width=terminal_width(),
+        ),
+        use_pager=not args.no_pager,
     )
-    print(table)
 
     oldest = arch_pacman.top_oldest_packages(infos)
     if oldest:
@@ -201,5 +450,34 @@ def handle_arch(args: argparse.Namespace, identity, runner: CommandRunner) -> No
             print(f" - {info.name} ({info.version}) • {age} • {stability}")
 
 
+def handle_arch_installed(args: argparse.Namespace, runner: CommandRunner, cache_path: Path) -> None:
+    try:
+        table = arch_pacman.collect_installed_table(runner, cache_path=cache_path)
+    except arch_pacman.PacmanDataError as exc:
+        print(f"Failed to query pacman data: {exc}")
+        return
+    if args.sort or args.top:
+        table = table.take(table.top(args.sort or "age", args.top))
+
+    page(
+        arch_pacman.iter_explicit_package_table(
+            runner,
+            include_recommendations=args.recommendations,
+            limit=args.limit,
+            table=table,
+            width=terminal_width(),
+            empty_message=arch_pacman.NO_INSTALLED_PACKAGES,
+        ),
+        use_pager=not args.no_pager,
+    )
+    oldest = table.oldest()
+    if oldest:
+        ages = table.age_labels()
+        stabilities = table.stabilities()
+        print("\nOldest installs:")
+        for index in oldest:
+            print(f" - {table.names[index]} ({table.versions[index]}) • {ages[index]} • {stabilities[index]}")
+
+
 if __name__ == "__main__":  # pragma: no cover
     main()
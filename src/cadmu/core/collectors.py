@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import struct
+import time
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable, Sequence
+
+from cadmu.core.runner import CommandResult
+
+PROC_MODULES = Path("/proc/modules")
+PROC_UPTIME = Path("/proc/uptime")
+PROC_LOADAVG = Path("/proc/loadavg")
+UTMP_PATH = Path("/var/run/utmp")
+
+# struct utmp on Linux (glibc): ut_type at 0, ut_user[32] at 44, 384 bytes per record.
+_UTMP_RECORD = 384
+_UTMP_USER_PROCESS = 7
+
+
+@dataclass(slots=True)
+class CollectorSpec:
+    """An in-process diagnostic that reads kernel/config files instead of forking.
+
+    ``command`` is only used for the ``# command`` report header, so a collector can
+    stand in for the command it replaces without changing the report layout.
+    """
+
+    label: str
+    command: Sequence[str] | str
+    collect: Callable[[], str]
+    optional: bool = False
+
+
+def run_collector(spec: CollectorSpec) -> CommandResult:
+    """Run ``spec`` and wrap its text in a ``CommandResult`` like ``CommandRunner.execute``.
+
+    Read errors become a failed result with the error on stderr, as ``cat`` would report.
+    """
+    started = time.monotonic()
+    try:
+        stdout, stderr, exit_code = spec.collect().strip(), "", 0
+    except OSError as exc:
+        stdout, stderr, exit_code = "", f"{exc.filename or spec.label}: {exc.strerror or exc}", 1
+    return CommandResult(
+        spec=spec,
+        stdout=stdout,
+        stderr=stderr,
+        exit_code=exit_code,
+        duration=time.monotonic() - started,
+    )
+
+
+def file_collector(label: str, path: Path | str, *, optional: bool = False) -> CollectorSpec:
+    """Collector equivalent of ``cat <path>``."""
+    return CollectorSpec(label=label, command=["cat", str(path)], collect=partial(read_file, Path(path)), optional=optional)
+
+
+def lsmod_collector(label: str = "lsmod") -> CollectorSpec:
+    return CollectorSpec(label=label, command=["lsmod"], collect=format_modules)
+
+
+def uptime_collector(label: str = "uptime") -> CollectorSpec:
+    return CollectorSpec(label=label, command=["uptime"], collect=format_uptime)
+
+
+def read_file(path: Path) -> str:
+    return path.read_text(encoding="utf-8", errors="replace")
+
+
+def format_modules(path: Path = PROC_MODULES) -> str:
+    """Render ``/proc/modules`` the way ``lsmod`` does."""
+    lines = ["Module                  Size  Used by"]
+    for entry in read_file(path).splitlines():
+        fields = entry.split()
+        if len(fields) < 4:
+            continue
+        name, size, refcount, holders = fields[:4]
+        line = f"{name:<19} {size:>8}  {refcount}"
+        users = [holder for holder in holders.split(",") if holder and holder != "-"]
+        if users:
+            line += " " + ",".join(users)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_uptime(
+    uptime_path: Path = PROC_UPTIME,
+    loadavg_path: Path = PROC_LOADAVG,
+    utmp_path: Path = UTMP_PATH,
+    now: time.struct_time | None = None,
+) -> str:
+    """Render ``/proc/uptime`` and ``/proc/loadavg`` in the procps ``uptime`` format."""
+    seconds = int(float(read_file(uptime_path).split()[0]))
+    loads = [float(value) for value in read_file(loadavg_path).split()[:3]]
+    clock = now or time.localtime()
+
+    text = f" {clock.tm_hour:02d}:{clock.tm_min:02d}:{clock.tm_sec:02d} up "
+    days, remainder = divmod(seconds, 86400)
+    if days:
+        text += f"{days} day{'s' if days != 1 else ''}, "
+    hours, minutes = divmod(remainder // 60, 60)
+    text += f"{hours:2d}:{minutes:02d}, " if hours else f"{minutes} min, "
+    users = _count_users(utmp_path)
+    text += f"{users:2d} user{'s' if users != 1 else ''},  "
+    text += "load average: " + ", ".join(f"{load:.2f}" for load in loads)
+    return text
+
+
+def _count_users(path: Path) -> int:
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return 0
+    users = 0
+    for start in range(0, len(data) - _UTMP_RECORD + 1, _UTMP_RECORD):
+        (kind,) = struct.unpack_from("<h", data, start)
+        if kind == _UTMP_USER_PROCESS and data[start + 44] != 0:
+            users += 1
+    return users
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Tuple
+
+DEFAULT_SCAN_JOBS = 8
+SIZE_UNITS = "KMGTPEZY"
+
+
+@dataclass(slots=True)
+class DiskUsage:
+    """Result of one traversal: cumulative size of every directory plus the root's children.
+
+    Sizes are allocated bytes (``st_blocks * 512``), matching ``du`` without
+    ``--apparent-size``.
+    """
+
+    root: Path
+    directories: Dict[str, int] = field(default_factory=dict)
+    entries: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    # Outermost directories on another device than the root, i.e. where ``du -x`` stops;
+    # only a walk that crosses filesystems finds any.
+    mount_points: List[str] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return self.directories.get(str(self.root), 0)
+
+    def largest_directories(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """The ``limit`` biggest directories on the root's filesystem, largest first (``du -x | sort -h | tail``)."""
+        return heapq.nlargest(limit, self.local_directories().items(), key=lambda item: item[1])
+
+    def local_directories(self) -> Dict[str, int]:
+        """``directories`` as ``du -x`` sees them: without the mounted subtrees, in listing or totals."""
+        if not self.mount_points:
+            return self.directories
+        totals = dict(self.directories)
+        root = str(self.root)
+        for mount_point in self.mount_points:
+            size = self.directories.get(mount_point, 0)
+            parent = mount_point
+            while parent != root:
+                parent = os.path.dirname(parent)
+                if parent in totals:
+                    totals[parent] -= size
+        below = tuple(mount_point + os.sep for mount_point in self.mount_points)
+        skipped = set(self.mount_points)
+        return {path: size for path, size in totals.items() if path not in skipped and not path.startswith(below)}
+
+    def top_level(self, *, hidden: bool) -> List[Tuple[str, int]]:
+        """Direct children of the root, largest first; ``hidden`` selects dot entries."""
+        selected = [
+            (path, size) for path, size in self.entries.items() if os.path.basename(path).startswith(".") == hidden
+        ]
+        return sorted(selected, key=lambda item: item[1], reverse=True)
+
+
+class _InodeSet:
+    """Hardlinked inodes already counted, shared by every walker thread."""
+
+    def __init__(self) -> None:
+        self._seen: Set[Tuple[int, int]] = set()
+        self._lock = threading.Lock()
+
+    def first_sighting(self, st: os.stat_result) -> bool:
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            return True
+
+
+def scan_usage(root: Path, *, jobs: int = DEFAULT_SCAN_JOBS, one_file_system: bool = True) -> DiskUsage:
+    """Walk ``root`` once with ``os.scandir``, one thread-pool task per top-level subtree.
+
+    Files with several hard links are counted once; with ``one_file_system`` the walk
+    stays on the root's device like ``du -x``. Otherwise it descends into mounts like
+    plain ``du`` and records where it crossed in ``mount_points``.
+    """
+    root_stat = root.stat()
+    root_device = root_stat.st_dev
+    device = root_device if one_file_system else None
+    inodes = _InodeSet()
+    usage = DiskUsage(root=root)
+    root_key = str(root)
+    root_total = allocated_size(root_stat)
+
+    subtrees: List[Tuple[str, int, bool]] = []
+    with os.scandir(root) as listing:
+        for entry in listing:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                usage.errors += 1
+                continue
+            if device is not None and st.st_dev != device:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                local = st.st_dev == root_device
+                if not local:
+                    usage.mount_points.append(entry.path)
+                subtrees.append((entry.path, allocated_size(st), local))
+            elif st.st_nlink <= 1 or inodes.first_sighting(st):
+                usage.entries[entry.path] = allocated_size(st)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="cadmu-du") as pool:
+        walks = [
+            pool.submit(_walk, path, size, device, inodes, root_device, local) for path, size, local in subtrees
+        ]
+        for (path, _, _), walk in zip(subtrees, walks):
+            directories, errors, mount_points = walk.result()
+            usage.directories.update(directories)
+            usage.entries[path] = directories[path]
+            usage.errors += errors
+            usage.mount_points.extend(mount_points)
+
+    usage.directories[root_key] = root_total + sum(usage.entries.values())
+    return usage
+
+
+def _walk(
+    top: str, top_size: int, device: int | None, inodes: _InodeSet, root_device: int, top_local: bool
+) -> Tuple[Dict[str, int], int, List[str]]:
+    """Iterative post-order walk returning cumulative sizes for ``top`` and every directory below it.
+
+    Also returns the directories where the walk first left ``root_device`` (see
+    :attr:`DiskUsage.mount_points`); ``top_local`` says whether ``top`` is still on it.
+    """
+    totals: Dict[str, int] = {}
+    parents: Dict[str, str] = {}
+    order: List[str] = []
+    mount_points: List[str] = []
+    errors = 0
+    stack = [(top, top_size, top_local)]
+    while stack:
+        path, size, local = stack.pop()
+        order.append(path)
+        try:
+            listing = os.scandir(path)
+        except OSError:
+            errors += 1
+            totals[path] = size
+            continue
+        with listing:
+            for entry in listing:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    errors += 1
+                    continue
+                if device is not None and st.st_dev != device:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    parents[entry.path] = path
+                    child_local = local and st.st_dev == root_device
+                    if local and not child_local:
+                        mount_points.append(entry.path)
+                    stack.append((entry.path, allocated_size(st), child_local))
+                elif st.st_nlink <= 1 or inodes.first_sighting(st):
+                    size += allocated_size(st)
+        totals[path] = size
+    # Children always come after their parent in ``order``, so walking it backwards folds
+    # every subtree into its parent before the parent itself is folded.
+    for path in reversed(order):
+        parent = parents.get(path)
+        if parent is not None:
+            totals[parent] += totals[path]
+    return totals, errors, mount_points
+
+
+def allocated_size(st: os.stat_result) -> int:
+    blocks = getattr(st, "st_blocks", None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+
+def format_size(size: int) -> str:
+    """Human-readable size rounded up like ``du -h`` (``4.0K``, ``12K``, ``1.5G``)."""
+    if size < 1024:
+        return str(size)
+    value = float(size)
+    for unit in SIZE_UNITS:
+        value /= 1024
+        if value < 10:
+            rounded = math.ceil(value * 10) / 10
+            if rounded < 10:
+                return f"{rounded:.1f}{unit}"
+        rounded_int = math.ceil(value)
+        if rounded_int < 1024 or unit == SIZE_UNITS[-1]:
+            return f"{rounded_int}{unit}"
+    return f"{math.ceil(value)}{SIZE_UNITS[-1]}"  # pragma: no cover - loop always returns
+
+
+def format_listing(items: List[Tuple[str, int]]) -> str:
+    return "\n".join(f"{format_size(size)}\t{path}" for path, size in items)
+
+
+class SharedUsageScan:
+    """Runs :func:`scan_usage` at most once and shares the result between report blocks.
+
+    Several diagnostics summarise the same tree; the first caller scans while concurrent
+    callers wait on the lock instead of walking the tree again. ``scanner`` replaces the
+    default walk, e.g. with :func:`cadmu.core.usage_index.scan_indexed`.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        jobs: int = DEFAULT_SCAN_JOBS,
+        one_file_system: bool = True,
+        scanner: Callable[[Path], DiskUsage] | None = None,
+    ) -> None:
+        self.root = root
+        self.jobs = jobs
+        self.one_file_system = one_file_system
+        self.scanner = scanner
+        self._usage: DiskUsage | None = None
+        self._lock = threading.Lock()
+
+    def usage(self) -> DiskUsage:
+        with self._lock:
+            if self._usage is None and self.scanner is not None:
+                self._usage = self.scanner(self.root)
+            elif self._usage is None:
+                self._usage = scan_usage(self.root, jobs=self.jobs, one_file_system=self.one_file_system)
+            return self._usage
+
+    def largest_directories_text(self, limit: int = 10) -> str:
+        # ``sort -h | tail`` lists the biggest directory last.
+        return format_listing(list(reversed(self.usage().largest_directories(limit))))
+
+    def top_level_text(self, *, hidden: bool) -> str:
+        return format_listing(self.usage().top_level(hidden=hidden))
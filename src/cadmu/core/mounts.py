@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+MOUNTINFO = Path("/proc/self/mountinfo")
+# A stale network mount blocks statvfs indefinitely; it is reported instead of waited on.
+STATVFS_TIMEOUT = 5.0
+
+# Kernel and memory-backed filesystems: nothing on them is disk space to run out of.
+# autofs is skipped as well, since statting its trigger directory would mount it.
+PSEUDO_FILESYSTEMS = frozenset(
+    {
+        "autofs", "binfmt_misc", "bpf", "cgroup", "cgroup2", "configfs", "debugfs", "devpts",
+        "devtmpfs", "efivarfs", "fusectl", "hugetlbfs", "mqueue", "nsfs", "overlay", "proc",
+        "pstore", "ramfs", "rpc_pipefs", "securityfs", "selinuxfs", "sysfs", "tmpfs", "tracefs",
+        "fuse.gvfsd-fuse", "fuse.portal",
+    }
+)
+# Filesystem images report themselves 100% full by construction.
+IMAGE_FILESYSTEMS = frozenset({"erofs", "iso9660", "squashfs", "udf"})
+
+_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+# Mount point -> statvfs thread that has not returned yet; see statvfs_mounts.
+_PENDING: Dict[str, threading.Thread] = {}
+_PENDING_LOCK = threading.Lock()
+
+
+@dataclass(slots=True)
+class Mount:
+    device: str  # "major:minor"; bind mounts and btrfs subvolumes share one
+    root: str  # directory of the filesystem mounted here, "/" unless a bind or subvolume
+    mountpoint: Path
+    fstype: str
+    source: str
+    read_only: bool = False
+
+
+@dataclass(slots=True)
+class MountUsage:
+    mount: Mount
+    total: int = 0
+    used: int = 0
+    available: int = 0
+    inodes: int = 0
+    inodes_free: int = 0
+    # "timed out" for a mount that did not answer, otherwise the OSError text.
+    error: str | None = None
+
+    @property
+    def fraction_used(self) -> float:
+        return self.used / self.total if self.total else 0.0
+
+    @property
+    def inode_fraction_used(self) -> float:
+        # btrfs, vfat and most network filesystems report no inode limit at all.
+        return (self.inodes - self.inodes_free) / self.inodes if self.inodes else 0.0
+
+
+def parse_mountinfo(text: str) -> List[Mount]:
+    """Parse ``/proc/<pid>/mountinfo`` (see proc(5)); malformed lines are skipped."""
+    mounts: List[Mount] = []
+    for line in text.splitlines():
+        fields = line.split(" ")
+        try:
+            separator = fields.index("-", 6)
+            fstype, source = fields[separator + 1], fields[separator + 2]
+        except (ValueError, IndexError):
+            continue
+        mountpoint = Path(_unescape(fields[4]))
+        read_only = "ro" in fields[5].split(",")
+        mounts.append(Mount(fields[2], _unescape(fields[3]), mountpoint, fstype, _unescape(source), read_only))
+    return mounts
+
+
+def _unescape(field: str) -> str:
+    # Spaces, tabs, newlines and backslashes in paths are written as octal escapes.
+    return _ESCAPE.sub(lambda match: chr(int(match.group(1), 8)), field)
+
+
+def read_mounts(path: Path | None = None) -> List[Mount]:
+    """Mounts of this process, or an empty list when mountinfo cannot be read."""
+    try:
+        text = (path or MOUNTINFO).read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return []
+    return parse_mountinfo(text)
+
+
+def fallback_mounts(paths: Iterable[Path]) -> List[Mount]:
+    """Stand-in mounts for ``paths`` when mountinfo is unavailable, keyed by ``st_dev``."""
+    mounts: List[Mount] = []
+    for path in paths:
+        try:
+            device = path.stat().st_dev
+        except OSError:
+            continue
+        mounts.append(Mount(f"{os.major(device)}:{os.minor(device)}", "/", path, "", ""))
+    return mounts
+
+
+def disk_mounts(mounts: Iterable[Mount], *, keep: Iterable[Path] = ()) -> List[Mount]:
+    """One mount per device backed by real storage, in mountinfo order.
+
+    Pseudo and image filesystems and read-only mounts, which cannot fill up, are
+    dropped, except at the mount points in ``keep``: a container's overlay ``/`` is
+    still the disk it runs on. Of several mounts of one device the one
+    exposing the filesystem root is kept, then the shortest mount point.
+    """
+    kept = set(keep)
+    chosen: Dict[str, Mount] = {}
+    for mount in mounts:
+        excluded = mount.read_only or mount.fstype in PSEUDO_FILESYSTEMS or mount.fstype in IMAGE_FILESYSTEMS
+        if excluded and mount.mountpoint not in kept:
+            continue
+        current = chosen.get(mount.device)
+        if current is None or _preference(mount) < _preference(current):
+            chosen[mount.device] = mount
+    return list(chosen.values())
+
+
+def _preference(mount: Mount) -> Tuple[bool, int, str]:
+    return (mount.root != "/", len(mount.mountpoint.parts), str(mount.mountpoint))
+
+
+def mount_for(path: Path, mounts: Iterable[Mount]) -> Mount | None:
+    """The mount ``path`` lives on: the one with the longest matching mount point."""
+    best: Mount | None = None
+    for mount in mounts:
+        if path == mount.mountpoint or mount.mountpoint in path.parents:
+            if best is None or len(mount.mountpoint.parts) >= len(best.mountpoint.parts):
+                best = mount
+    return best
+
+
+def statvfs_mounts(mounts: Iterable[Mount], *, timeout: float = STATVFS_TIMEOUT) -> List[MountUsage]:
+    """``os.statvfs`` every mount at once, giving up on the ones still blocked after ``timeout``.
+
+    Each call runs on its own daemon thread; a pool's workers would be joined at
+    interpreter exit and a hung NFS mount would then block cadmu from exiting. A mount
+    whose earlier call has still not returned is reported as timed out straight away
+    rather than stacking another blocked thread on it.
+    """
+    usages = [MountUsage(mount) for mount in mounts]
+    started: List[Tuple[MountUsage, threading.Thread]] = []
+    with _PENDING_LOCK:
+        for usage in usages:
+            key = str(usage.mount.mountpoint)
+            if key in _PENDING:
+                usage.error = "timed out"
+                continue
+            thread = threading.Thread(
+                target=_statvfs, args=(usage,), name=f"cadmu-statvfs-{key}", daemon=True
+            )
+            _PENDING[key] = thread
+            started.append((usage, thread))
+    for _, thread in started:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for usage, thread in started:
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            usage.error = "timed out"
+    return usages
+
+
+def _statvfs(usage: MountUsage) -> None:
+    key = str(usage.mount.mountpoint)
+    try:
+        stats = os.statvfs(key)
+    except OSError as exc:
+        usage.error = exc.strerror or str(exc)
+    else:
+        # Same arithmetic as shutil.disk_usage: "used" includes root-reserved blocks.
+        usage.total = stats.f_blocks * stats.f_frsize
+        usage.used = (stats.f_blocks - stats.f_bfree) * stats.f_frsize
+        usage.available = stats.f_bavail * stats.f_frsize
+        usage.inodes = stats.f_files
+        usage.inodes_free = stats.f_ffree
+    finally:
+        with _PENDING_LOCK:
+            _PENDING.pop(key, None)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import mmap
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List
+
+from cadmu.core import reporting
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+
+@dataclass(slots=True)
+class IndexedCommand:
+    label: str | None
+    command: str
+    offset: int
+    length: int
+    digest: str | None = None
+    # Set for delta reports: where the full output of an unchanged command lives.
+    source_report: str | None = None
+    source_offset: int | None = None
+    source_length: int | None = None
+
+    def resolved_source(self, report: str) -> tuple[str, int, int]:
+        if self.source_report is not None and self.source_offset is not None and self.source_length is not None:
+            return self.source_report, self.source_offset, self.source_length
+        return report, self.offset, self.length
+
+
+@dataclass(slots=True)
+class IndexedSection:
+    title: str
+    offset: int
+    length: int
+    commands: List[IndexedCommand] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ReportIndex:
+    report: str
+    compression: str | None
+    size: int
+    sections: List[IndexedSection]
+
+    def find_section(self, title: str) -> IndexedSection | None:
+        wanted = title.casefold()
+        for section in self.sections:
+            if section.title.casefold() == wanted:
+                return section
+        return None
+
+
+class IndexRecorder:
+    """Collects section/command byte ranges and writes them as a sidecar on close.
+
+    Sections span from their ``=====`` marker to the next marker (or the end of the
+    report), so a reader can jump to any block without scanning the text.
+    """
+
+    def __init__(self, report: Path) -> None:
+        self.report = report
+        self.path = index_path(report)
+        self._report: Dict[str, Any] = {}
+        self._sections: List[Dict[str, Any]] = []
+        self._size = 0
+
+    def record(self, record: Dict[str, Any]) -> None:
+        kind = record.get("type")
+        if kind == "report":
+            self._report = record
+        elif kind == "section":
+            if self._sections:
+                self._sections[-1]["length"] = record["offset"] - self._sections[-1]["offset"]
+            self._sections.append({"title": record["title"], "offset": record["offset"], "length": 0, "commands": []})
+        elif kind == "command" and self._sections:
+            self._sections[-1]["commands"].append(
+                {
+                    "label": record["label"],
+                    "command": record["command"],
+                    "offset": record["offset"],
+                    "length": record["length"],
+                    "digest": record.get("digest"),
+                    "source_report": record.get("source_report"),
+                    "source_offset": record.get("source_offset"),
+                    "source_length": record.get("source_length"),
+                }
+            )
+        elif kind == "end":
+            self._size = record["offset"]
+
+    def close(self) -> None:
+        if self._sections:
+            self._sections[-1]["length"] = self._size - self._sections[-1]["offset"]
+        payload = {
+            "version": INDEX_VERSION,
+            "report": self.report.name,
+            "compression": self._report.get("compression"),
+            "size": self._size,
+            "sections": self._sections,
+        }
+        self.path.write_text(json.dumps(payload, indent=1), encoding="utf-8")
+
+
+def index_path(report: Path) -> Path:
+    return reporting.sidecar_path(report, INDEX_SUFFIX)
+
+
+def load_index(report: Path) -> ReportIndex | None:
+    path = index_path(report)
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    sections = [
+        IndexedSection(
+            title=section["title"],
+            offset=section["offset"],
+            length=section["length"],
+            commands=[IndexedCommand(**command) for command in section.get("commands", [])],
+        )
+        for section in data.get("sections", [])
+    ]
+    return ReportIndex(
+        report=data.get("report") or report.name,
+        compression=data.get("compression"),
+        size=data.get("size", 0),
+        sections=sections,
+    )
+
+
+def read_range(report: Path, offset: int, length: int) -> bytes:
+    """Return ``length`` bytes of uncompressed report text starting at ``offset``.
+
+    Plain reports are memory-mapped so only the requested pages are touched; compressed
+    reports have to be decompressed up to ``offset`` but nothing past the block is read.
+    """
+    if length <= 0:
+        return b""
+    if reporting.codec_for(report) is None:
+        with report.open("rb") as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[offset : offset + length]
+    with reporting.open_report(report) as stream:
+        stream.seek(offset)
+        return stream.read(length)
+
+
+def scan_section(report: Path, title: str) -> bytes | None:
+    """Fallback for reports written without an index: stream lines until the marker."""
+    marker = f"===== {title} =====".casefold()
+    collected: List[bytes] = []
+    with reporting.open_report(report) as stream:
+        for line in stream:
+            if line.startswith(b"===== "):
+                if collected:
+                    break
+                if line.decode("utf-8", errors="replace").strip().casefold() == marker:
+                    collected.append(line)
+                continue
+            if collected:
+                collected.append(line)
+    return b"".join(collected) if collected else None
+
+
+def read_section(report: Path, index: ReportIndex, section: IndexedSection) -> bytes:
+    """Read a section, splicing in the full output of blocks a delta report only references."""
+    data = read_range(report, section.offset, section.length)
+    pieces: List[bytes] = []
+    cursor = 0
+    for command in section.commands:
+        if command.source_report is None:
+            continue
+        start = command.offset - section.offset
+        pieces.append(data[cursor:start])
+        pieces.append(read_command(report, index, command))
+        cursor = start + command.length
+    pieces.append(data[cursor:])
+    return b"".join(pieces)
+
+
+def read_command(report: Path, index: ReportIndex, command: IndexedCommand) -> bytes:
+    source, offset, length = command.resolved_source(index.report)
+    target = report if source == index.report else report.with_name(source)
+    if not target.exists():
+        return read_range(report, command.offset, command.length)
+    return read_range(target, offset, length)
+
+
+def baseline_key(section: str | None, command: str) -> str:
+    return f"{section or ''}\0{command}"
+
+
+def load_baseline(directory: Path, *, exclude: Path | None = None) -> tuple[str, Dict[str, IndexedCommand]] | None:
+    """Return the newest report index in ``directory`` as ``(report name, {key: command})``.
+
+    Only commands with a recorded digest are included; keys come from :func:`baseline_key`.
+    """
+    excluded = index_path(exclude) if exclude is not None else None
+    candidates = [path for path in directory.glob(f"*{INDEX_SUFFIX}") if path != excluded]
+    for candidate in sorted(candidates, key=lambda path: path.stat().st_mtime, reverse=True):
+        try:
+            data = json.loads(candidate.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        report = data.get("report")
+        if not report or not (directory / report).exists():
+            continue
+        entries: Dict[str, IndexedCommand] = {}
+        for section in data.get("sections", []):
+            for command in section.get("commands", []):
+                if command.get("digest"):
+                    entries[baseline_key(section["title"], command["command"])] = IndexedCommand(**command)
+        return report, entries
+    return None
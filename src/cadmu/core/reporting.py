@@ -1,49 +1,227 @@
 from __future__ import annotations
 
+import codecs
+import gzip
+import json
+import locale
+import lzma
+import os
+import time
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Iterator, Sequence
+from typing import IO, Any, Iterable, Iterator, Protocol, Sequence
+
+from cadmu.core.runner import CommandResult, TextStripper
+from cadmu.core.snapshots import SnapshotSession
+
+try:  # Python 3.14+
+    from compression import zstd as _zstd_stdlib  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - depends on interpreter version
+    _zstd_stdlib = None
+try:
+    import zstandard as _zstandard  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - optional dependency
+    _zstandard = None
+
+
+FLUSH_POLICIES = ("write", "section", "close", "interval")
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "xz": ".xz", "zstd": ".zst"}
+DEFAULT_COMPRESSION_LEVELS = {"gzip": 6, "xz": 6, "zstd": 3}
+
+
+def available_codecs() -> list[str]:
+    codecs_found = ["gzip", "xz"]
+    if _zstd_stdlib is not None or _zstandard is not None:
+        codecs_found.append("zstd")
+    return codecs_found
+
+
+def compressed_path(path: Path, codec: str) -> Path:
+    return path.with_name(path.name + COMPRESSION_SUFFIXES[codec])
+
+
+def codec_for(path: Path) -> str | None:
+    for codec, suffix in COMPRESSION_SUFFIXES.items():
+        if path.name.endswith(suffix):
+            return codec
+    return None
+
+
+def open_report(path: Path) -> IO[bytes]:
+    """Open a report for binary reading, decompressing according to its suffix."""
+    codec = codec_for(path)
+    if codec is None:
+        return path.open("rb")
+    return open_compressed(path, codec)
+
+
+def open_compressed(path: Path, codec: str) -> IO[bytes]:
+    if codec == "gzip":
+        return gzip.open(path, "rb")  # type: ignore[return-value]
+    if codec == "xz":
+        return lzma.open(path, "rb")  # type: ignore[return-value]
+    if codec != "zstd":
+        raise ValueError(f"Unknown compression codec '{codec}'")
+    if _zstd_stdlib is not None:
+        return _zstd_stdlib.open(path, "rb")
+    if _zstandard is not None:
+        return _zstandard.open(path, "rb")
+    raise ValueError("zstd compressed files require Python 3.14+ or the 'zstandard' package")
+
+
+def _open_compressor(raw: IO[bytes], codec: str, level: int | None) -> IO[bytes]:
+    level = DEFAULT_COMPRESSION_LEVELS[codec] if level is None else level
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level)  # type: ignore[return-value]
+    if codec == "xz":
+        return lzma.LZMAFile(raw, mode="wb", preset=level)  # type: ignore[return-value]
+    if codec == "zstd":
+        if _zstd_stdlib is not None:
+            return _zstd_stdlib.ZstdFile(raw, mode="wb", level=level)
+        assert _zstandard is not None
+        return _zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=False)
+    raise ValueError(f"Unknown compression codec '{codec}'")
 
 
 class ReportWriter:
-    """Helper for structured diagnostic reports."""
+    """Helper for structured diagnostic reports.
 
-    def __init__(self, path: Path) -> None:
+    Output goes through a ``buffer_size`` user-space buffer that is flushed according to
+    ``flush_policy``: after every ``write``, at each ``section`` boundary, only on
+    ``close``, or once ``flush_interval`` seconds have passed (``interval``). With
+    ``fsync=True`` completed sections are also forced to stable storage.
+
+    ``compression`` (``gzip``, ``xz`` or ``zstd``) streams the report through a compressor
+    in a single pass; ``path`` is written as-is, see :func:`compressed_path` for naming.
+
+    With ``snapshots`` every command body is also stored once, by content hash, in a
+    :class:`~cadmu.core.snapshots.SnapshotStore`; the session's manifest is written on close.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        flush_policy: str = "section",
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        flush_interval: float = 5.0,
+        fsync: bool = False,
+        compression: str | None = None,
+        compression_level: int | None = None,
+        recorders: Sequence[ReportRecorder] = (),
+        snapshots: SnapshotSession | None = None,
+    ) -> None:
+        if flush_policy not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy '{flush_policy}' (expected one of {', '.join(FLUSH_POLICIES)})")
+        if compression is not None and compression not in available_codecs():
+            raise ValueError(f"Compression codec '{compression}' is not available (choose from {', '.join(available_codecs())})")
         self.path = path
-        self._fh = path.open("w", encoding="utf-8")
+        self.flush_policy = flush_policy
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.compression = compression
+        self.recorders = list(recorders)
+        self.snapshots = snapshots
+        # Byte offset into the uncompressed report text; recorded for every section/command.
+        self.offset = 0
+        self.current_section: str | None = None
+        self._raw: IO[bytes] = path.open("wb", buffering=buffer_size)
+        try:
+            self._fh = _open_compressor(self._raw, compression, compression_level) if compression else self._raw
+        except BaseException:
+            self._raw.close()
+            raise
+        self._last_flush = time.monotonic()
 
     def write_header(self, *, host: str, effective_user: str, owner: str) -> None:
+        generated = datetime.now().isoformat(timespec="seconds")
         lines = [
             "System Diagnostic Report",
-            f"Generated: {datetime.now().isoformat(timespec='seconds')}",
+            f"Generated: {generated}",
             f"Host: {host}",
             f"Effective user: {effective_user}",
             f"Report owner: {owner}",
             f"Output file: {self.path}",
             "",
         ]
-        self._fh.write("\n".join(lines))
+        self._record(
+            {
+                "type": "report",
+                "report": self.path.name,
+                "generated": generated,
+                "host": host,
+                "effective_user": effective_user,
+                "owner": owner,
+                "compression": self.compression,
+            }
+        )
+        self._write("\n".join(lines))
 
     def section(self, title: str) -> None:
-        self._fh.write(f"===== {title} =====\n\n")
-        self._fh.flush()
+        self._section_boundary()
+        self.current_section = title
+        self._record({"type": "section", "title": title, "offset": self.offset})
+        self._write(f"===== {title} =====\n\n")
 
     def subsection(self, title: str) -> None:
-        self._fh.write(f"--- {title} ---\n")
-        self._fh.flush()
+        self._write(f"--- {title} ---\n")
 
-    def write_command(self, command: Sequence[str] | str, output: str) -> None:
-        display = command if isinstance(command, str) else " ".join(command)
-        self._fh.write(f"# {display}\n{output}\n\n")
-        self._fh.flush()
+    def write_command(self, command: Sequence[str] | str, output: str, *, label: str | None = None) -> None:
+        with self.command_block(command, label=label) as block:
+            block._write_stdout(output)
+
+    def command_block(self, command: Sequence[str] | str, *, label: str | None = None) -> "CommandBlock":
+        """Open a ``# command`` block whose body is written incrementally."""
+        return CommandBlock(self, command, label=label)
 
     def note(self, message: str) -> None:
-        self._fh.write(f"{message}\n")
+        self._write(f"{message}\n")
+
+    def flush(self, *, sync: bool = False) -> None:
         self._fh.flush()
+        if sync:
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        self._last_flush = time.monotonic()
+
+    def _write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self._fh.write(data)
+        self.offset += len(data)
+        if self.flush_policy == "write":
+            self.flush()
+        elif self.flush_policy == "interval" and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _record(self, record: dict[str, Any]) -> None:
+        for recorder in self.recorders:
+            recorder.record(record)
+
+    def _section_boundary(self) -> None:
+        if self.fsync:
+            self.flush(sync=True)
+        elif self.flush_policy == "section":
+            self.flush()
 
     def close(self) -> None:
-        self._fh.close()
+        if self._raw.closed:
+            return
+        self._record({"type": "end", "offset": self.offset})
+        if self.fsync:
+            self.flush(sync=True)
+        if self._fh is not self._raw:
+            # Compressors write their trailer on close but do not own the underlying file.
+            self._fh.close()
+            if self.fsync:
+                self._raw.flush()
+                os.fsync(self._raw.fileno())
+        self._raw.close()
+        for recorder in self.recorders:
+            recorder.close()
+        if self.snapshots is not None:
+            self.snapshots.close()
 
     def __enter__(self) -> "ReportWriter":  # pragma: no cover - simple passthrough
         return self
@@ -52,9 +230,215 @@ class ReportWriter:
         self.close()
 
 
+class CommandBlock:
+    """One ``# command`` block streamed straight into the report.
+
+    The header is written on creation. ``write`` accepts raw subprocess bytes so the block
+    can be passed to ``CommandRunner.execute(stdout_sink=...)``; ``feed`` accepts text.
+    Both are stripped on the fly, matching the ``stdout.strip()`` of buffered results.
+    On close the block's byte ranges and ``record_result`` metadata go to the recorders.
+    """
+
+    def __init__(self, writer: ReportWriter, command: Sequence[str] | str, *, label: str | None = None) -> None:
+        self._writer = writer
+        self._stdout = TextStripper()
+        self._decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace")
+        self._stderr_started = False
+        self._closed = False
+        self.display = command if isinstance(command, str) else " ".join(command)
+        self.label = label
+        self.exit_code: int | None = None
+        self.skipped = False
+        self.reason: str | None = None
+        self.duration: float | None = None
+        self.digest: str | None = None
+        self.source_report: str | None = None
+        self.source_offset: int | None = None
+        self.source_length: int | None = None
+        self._blob = writer.snapshots.open_blob() if writer.snapshots is not None else None
+        self._to_report = True
+        self._to_blob = True
+        self.offset = writer.offset
+        writer._write(f"# {self.display}\n")
+        self.stdout_offset = writer.offset
+        self.stdout_length = 0
+        self.stderr_offset = writer.offset
+        self.stderr_length = 0
+
+    def record_result(self, result: CommandResult) -> None:
+        self.label = self.label or result.spec.label
+        self.exit_code = result.exit_code
+        self.skipped = result.skipped
+        self.reason = result.reason
+        self.duration = result.duration
+
+    def write(self, data: bytes) -> int:
+        self.feed(self._decoder.decode(data))
+        return len(data)
+
+    def feed(self, text: str) -> None:
+        body = self._stdout.feed(text)
+        if body:
+            self._write_stdout(body)
+
+    def write_stderr(self, chunks: Iterable[str]) -> None:
+        self._finish_stdout()
+        stripper = TextStripper()
+        for chunk in chunks:
+            body = stripper.feed(chunk)
+            if not body:
+                continue
+            if not self._stderr_started:
+                self._write_body("\n[stderr]\n" if self.stdout_length else "[stderr]\n")
+                self.stderr_offset = self._writer.offset
+                self._stderr_started = True
+            before = self._writer.offset
+            self._write_body(body)
+            self.stderr_length += self._writer.offset - before
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._finish_stdout()
+        if not self._stderr_started:
+            self.stderr_offset = self._writer.offset
+        self._writer._write("\n\n")
+        self._closed = True
+        if self._blob is not None and self._writer.snapshots is not None:
+            self._writer.snapshots.add(
+                self._blob,
+                section=self._writer.current_section,
+                label=self.label,
+                command=self.display,
+                exit_code=self.exit_code,
+                skipped=self.skipped,
+            )
+        self._writer._record(
+            {
+                "type": "command",
+                "section": self._writer.current_section,
+                "label": self.label,
+                "command": self.display,
+                "exit_code": self.exit_code,
+                "skipped": self.skipped,
+                "reason": self.reason,
+                "duration": None if self.duration is None else round(self.duration, 6),
+                "offset": self.offset,
+                "length": self._writer.offset - self.offset,
+                "stdout": {"offset": self.stdout_offset, "length": self.stdout_length},
+                "stderr": {"offset": self.stderr_offset, "length": self.stderr_length},
+                "digest": self.digest,
+                "source_report": self.source_report,
+                "source_offset": self.source_offset,
+                "source_length": self.source_length,
+            }
+        )
+
+    def _write_stdout(self, text: str) -> None:
+        before = self._writer.offset
+        self._write_body(text)
+        self.stdout_length += self._writer.offset - before
+
+    def _write_body(self, text: str) -> None:
+        if self._to_report:
+            self._writer._write(text)
+        if self._blob is not None and self._to_blob:
+            self._blob.write(text.encode("utf-8"))
+
+    @property
+    def snapshotting(self) -> bool:
+        return self._blob is not None
+
+    @contextmanager
+    def snapshot_only(self) -> Iterator[None]:
+        """Send the body written inside the block to the snapshot blob but not the report.
+
+        Delta mode uses this to snapshot the output a reference stands for. Whatever is
+        written afterwards (the reference note) goes to the report only.
+        """
+        self._to_report = False
+        try:
+            yield
+            self._finish_stdout()
+        finally:
+            self._to_report = True
+            self._to_blob = False
+            self._stdout = TextStripper()
+            self._stderr_started = False
+
+    def _finish_stdout(self) -> None:
+        tail = self._decoder.decode(b"", final=True)
+        if tail:
+            self.feed(tail)
+
+    def __enter__(self) -> "CommandBlock":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class ReportRecorder(Protocol):
+    """Receives one dict per report/section/command as the report is written."""
+
+    def record(self, record: dict[str, Any]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class JsonlRecorder:
+    """Writes recorder events as JSON Lines next to the text report.
+
+    Offsets and lengths are byte positions in the uncompressed report text, so consumers
+    can slice command output without scanning the ``===== Section =====`` markers.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._fh = path.open("w", encoding="utf-8")
+
+    def record(self, record: dict[str, Any]) -> None:
+        self._fh.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def sidecar_path(report: Path, suffix: str) -> Path:
+    """``report.txt.gz`` -> ``report<suffix>``."""
+    name = report.name
+    for codec_suffix in COMPRESSION_SUFFIXES.values():
+        if name.endswith(codec_suffix):
+            name = name[: -len(codec_suffix)]
+            break
+    if name.endswith(".txt"):
+        name = name[: -len(".txt")]
+    return report.with_name(name + suffix)
+
+
 @contextmanager
-def report_writer(path: Path, *, host: str, effective_user: str, owner: str) -> Iterator[ReportWriter]:
-    writer = ReportWriter(path)
+def report_writer(
+    path: Path,
+    *,
+    host: str,
+    effective_user: str,
+    owner: str,
+    flush_policy: str = "section",
+    fsync: bool = False,
+    compression: str | None = None,
+    compression_level: int | None = None,
+    recorders: Sequence[ReportRecorder] = (),
+    snapshots: SnapshotSession | None = None,
+) -> Iterator[ReportWriter]:
+    writer = ReportWriter(
+        path,
+        flush_policy=flush_policy,
+        fsync=fsync,
+        compression=compression,
+        compression_level=compression_level,
+        recorders=recorders,
+        snapshots=snapshots,
+    )
     try:
         writer.write_header(host=host, effective_user=effective_user, owner=owner)
         yield writer
@@ -1,10 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+import codecs
+import locale
+import os
+import selectors
 import shlex
 import shutil
 import subprocess
+import tempfile
+import time
 from dataclasses import dataclass
-from typing import Mapping, MutableMapping, Sequence
+from types import TracebackType
+from typing import IO, TYPE_CHECKING, Callable, Iterable, Iterator, List, Mapping, MutableMapping, Protocol, Sequence
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle, annotations only
+    from cadmu.core.collectors import CollectorSpec
+
+STREAM_LINE_LIMIT = 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+DEFAULT_CAPTURE_LIMIT = 1024 * 1024
+
+
+class OutputSink(Protocol):
+    def write(self, data: bytes, /) -> object: ...
 
 
 @dataclass(slots=True)
@@ -16,70 +35,129 @@ class CommandSpec:
     shell: bool = False
     sudo: bool = False
     env: Mapping[str, str] | None = None
-    timeout: int | None = None
+    timeout: float | None = None
     optional: bool = False
+    capture_limit: int | None = None
+
+
+class CapturedOutput:
+    """Command output kept in memory up to ``max_size`` bytes, then spilled to a temp file.
+
+    Runners hand these out instead of ``str`` when a spec sets ``capture_limit`` so that a
+    noisy command never has to be held in RAM as a whole.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self._memory = bytearray()
+        self._file: IO[bytes] | None = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def write(self, data: bytes) -> int:
+        if self._file is None and len(self._memory) + len(data) > self.max_size:
+            self._file = tempfile.TemporaryFile(prefix="cadmu-capture-")
+            self._file.write(self._memory)
+            self._memory = bytearray()
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._memory += data
+        self.size += len(data)
+        return len(data)
+
+    def iter_bytes(self, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+        if self._file is None:
+            view = memoryview(self._memory)
+            for start in range(0, len(view), chunk_size):
+                yield bytes(view[start : start + chunk_size])
+            return
+        self._file.flush()
+        self._file.seek(0)
+        while chunk := self._file.read(chunk_size):
+            yield chunk
+        self._file.seek(0, os.SEEK_END)
+
+    def iter_text(self, chunk_size: int = READ_CHUNK_SIZE, *, strip: bool = False) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace")
+        chunks = (decoder.decode(chunk) for chunk in self.iter_bytes(chunk_size))
+        text = _chain_final(chunks, lambda: decoder.decode(b"", final=True))
+        return strip_chunks(text) if strip else (chunk for chunk in text if chunk)
+
+    def read_text(self, *, strip: bool = False) -> str:
+        return "".join(self.iter_text(strip=strip))
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._memory = bytearray()
 
 
 @dataclass(slots=True)
 class CommandResult:
-    spec: CommandSpec
+    spec: CommandSpec | CollectorSpec
     stdout: str
     stderr: str
     exit_code: int
     skipped: bool = False
     reason: str | None = None
+    stdout_capture: CapturedOutput | None = None
+    stderr_capture: CapturedOutput | None = None
+    duration: float = 0.0
 
     @property
     def ok(self) -> bool:
         return self.skipped or self.exit_code == 0
 
+    def read_stdout(self) -> str:
+        """Return stripped stdout, loading it from the capture buffer when one is attached."""
+        if self.stdout_capture is not None:
+            return self.stdout_capture.read_text(strip=True)
+        return self.stdout
+
+    def read_stderr(self) -> str:
+        if self.stderr_capture is not None:
+            return self.stderr_capture.read_text(strip=True)
+        return self.stderr
+
+    def close(self) -> None:
+        for capture in (self.stdout_capture, self.stderr_capture):
+            if capture is not None:
+                capture.close()
+
 
 class CommandRunner:
     def __init__(self, *, use_sudo: bool = False) -> None:
         self.use_sudo = use_sudo
 
-    def execute(self, spec: CommandSpec) -> CommandResult:
-        command = spec.command
-        env: MutableMapping[str, str] | None = None
-        if spec.env:
-            env = {**spec.env}
-
-        if isinstance(command, Sequence) and not spec.shell:
-            executable = command[0]
-            if spec.sudo:
-                if not self.use_sudo:
-                    return CommandResult(
-                        spec=spec,
-                        stdout="",
-                        stderr="",
-                        exit_code=126,
-                        skipped=True,
-                        reason="sudo required but not enabled",
-                    )
-                command = ["sudo", *command]
-            if shutil.which(executable) is None:
-                if spec.allow_missing:
-                    return CommandResult(
-                        spec=spec,
-                        stdout="",
-                        stderr="",
-                        exit_code=127,
-                        skipped=True,
-                        reason=f"Command '{executable}' not found",
-                    )
-                raise FileNotFoundError(f"Command '{executable}' not found")
-        elif isinstance(command, str) and spec.sudo:
-            if not self.use_sudo:
-                return CommandResult(
-                    spec=spec,
-                    stdout="",
-                    stderr="",
-                    exit_code=126,
-                    skipped=True,
-                    reason="sudo required but not enabled",
-                )
-            command = f"sudo {command}"
+    def execute(self, spec: CommandSpec, *, stdout_sink: OutputSink | None = None) -> CommandResult:
+        """Run ``spec`` and collect its output.
+
+        With ``stdout_sink`` the raw stdout bytes are handed to the sink as they arrive and
+        the result carries only stderr (in a capture buffer).
+        """
+        prepared = _prepare(spec, use_sudo=self.use_sudo)
+        if isinstance(prepared, CommandResult):
+            return prepared
+        command, env = prepared
+        started = time.monotonic()
+        if spec.capture_limit is not None or stdout_sink is not None:
+            outcome = self._execute_captured(spec, command, env, stdout_sink=stdout_sink)
+        else:
+            outcome = self._execute_buffered(spec, command, env)
+        outcome.duration = time.monotonic() - started
+        return outcome
 
+    def _execute_buffered(
+        self,
+        spec: CommandSpec,
+        command: Sequence[str] | str,
+        env: MutableMapping[str, str] | None,
+    ) -> CommandResult:
         result = subprocess.run(
             command,
             shell=spec.shell or isinstance(command, str),
@@ -97,8 +175,336 @@ class CommandRunner:
             exit_code=result.returncode,
         )
 
+    def _execute_captured(
+        self,
+        spec: CommandSpec,
+        command: Sequence[str] | str,
+        env: MutableMapping[str, str] | None,
+        *,
+        stdout_sink: OutputSink | None,
+    ) -> CommandResult:
+        limit = spec.capture_limit if spec.capture_limit is not None else DEFAULT_CAPTURE_LIMIT
+        stdout = CapturedOutput(limit) if stdout_sink is None else None
+        stderr = CapturedOutput(limit)
+        with subprocess.Popen(
+            command,
+            shell=spec.shell or isinstance(command, str),
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        ) as process:
+            assert process.stdout is not None and process.stderr is not None
+            sinks: dict[IO[bytes], OutputSink] = {
+                process.stdout: stdout if stdout is not None else stdout_sink,  # type: ignore[dict-item]
+                process.stderr: stderr,
+            }
+            try:
+                _pump(process, sinks, timeout=spec.timeout)
+            except subprocess.TimeoutExpired:
+                _close_captures(stdout, stderr)
+                raise
+            returncode = process.wait()
+        if spec.check and returncode != 0:
+            _close_captures(stdout, stderr)
+            raise subprocess.CalledProcessError(returncode, command)
+        return CommandResult(
+            spec=spec,
+            stdout="",
+            stderr="",
+            exit_code=returncode,
+            stdout_capture=stdout,
+            stderr_capture=stderr,
+        )
+
     @staticmethod
     def format_command(command: Sequence[str] | str) -> str:
         if isinstance(command, str):
             return command
         return " ".join(shlex.quote(part) for part in command)
+
+
+class AsyncCommandRunner:
+    """asyncio counterpart of :class:`CommandRunner` using the same spec/result contract."""
+
+    def __init__(self, *, use_sudo: bool = False) -> None:
+        self.use_sudo = use_sudo
+
+    async def execute(self, spec: CommandSpec) -> CommandResult:
+        prepared = _prepare(spec, use_sudo=self.use_sudo)
+        if isinstance(prepared, CommandResult):
+            return prepared
+        started = time.monotonic()
+        process = await _spawn(spec, *prepared)
+        if spec.capture_limit is not None:
+            outcome = await self._execute_captured(spec, process)
+        else:
+            outcome = await self._execute_buffered(spec, process)
+        outcome.duration = time.monotonic() - started
+        return outcome
+
+    async def _execute_buffered(self, spec: CommandSpec, process: asyncio.subprocess.Process) -> CommandResult:
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=spec.timeout)
+        except asyncio.TimeoutError:
+            await _kill(process)
+            raise subprocess.TimeoutExpired(CommandRunner.format_command(spec.command), spec.timeout or 0) from None
+        return _completed(spec, process.returncode or 0, _decode(stdout).strip(), _decode(stderr).strip())
+
+    async def _execute_captured(self, spec: CommandSpec, process: asyncio.subprocess.Process) -> CommandResult:
+        assert spec.capture_limit is not None
+        assert process.stdout is not None and process.stderr is not None
+        stdout = CapturedOutput(spec.capture_limit)
+        stderr = CapturedOutput(spec.capture_limit)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(_drain(process.stdout, stdout), _drain(process.stderr, stderr), process.wait()),
+                timeout=spec.timeout,
+            )
+        except asyncio.TimeoutError:
+            stdout.close()
+            stderr.close()
+            await _kill(process)
+            raise subprocess.TimeoutExpired(CommandRunner.format_command(spec.command), spec.timeout or 0) from None
+        returncode = process.returncode or 0
+        if spec.check and returncode != 0:
+            stdout.close()
+            stderr.close()
+            raise subprocess.CalledProcessError(returncode, CommandRunner.format_command(spec.command))
+        return CommandResult(
+            spec=spec,
+            stdout="",
+            stderr="",
+            exit_code=returncode,
+            stdout_capture=stdout,
+            stderr_capture=stderr,
+        )
+
+    async def execute_many(self, specs: Iterable[CommandSpec], *, limit: int | None = None) -> List[CommandResult]:
+        """Run ``specs`` concurrently on the current loop, returning results in input order."""
+        semaphore = asyncio.Semaphore(limit) if limit else None
+
+        async def _run(spec: CommandSpec) -> CommandResult:
+            if semaphore is None:
+                return await self.execute(spec)
+            async with semaphore:
+                return await self.execute(spec)
+
+        return list(await asyncio.gather(*(_run(spec) for spec in specs)))
+
+    def stream(self, spec: CommandSpec) -> "CommandStream":
+        return CommandStream(spec, use_sudo=self.use_sudo)
+
+
+class CommandStream:
+    """Async iterator over a command's stdout lines.
+
+    Use as ``async with runner.stream(spec) as stream: async for line in stream: ...``.
+    ``result`` is populated on exit with the exit code and stderr; ``stdout`` is left empty
+    because the lines were handed to the caller. Leaving the block before stdout is
+    exhausted terminates the process.
+    """
+
+    def __init__(self, spec: CommandSpec, *, use_sudo: bool) -> None:
+        self.spec = spec
+        self.use_sudo = use_sudo
+        self.result: CommandResult | None = None
+        self._process: asyncio.subprocess.Process | None = None
+        self._stderr_task: asyncio.Task[bytes] | None = None
+        self._deadline: float | None = None
+        self._started = 0.0
+        self._exhausted = False
+
+    async def __aenter__(self) -> "CommandStream":
+        prepared = _prepare(self.spec, use_sudo=self.use_sudo)
+        if isinstance(prepared, CommandResult):
+            self.result = prepared
+            self._exhausted = True
+            return self
+        self._started = time.monotonic()
+        self._process = await _spawn(self.spec, *prepared)
+        assert self._process.stderr is not None
+        self._stderr_task = asyncio.ensure_future(self._process.stderr.read())
+        if self.spec.timeout is not None:
+            self._deadline = asyncio.get_running_loop().time() + self.spec.timeout
+        return self
+
+    def __aiter__(self) -> "CommandStream":
+        return self
+
+    async def __anext__(self) -> str:
+        if self._exhausted or self._process is None or self._process.stdout is None:
+            raise StopAsyncIteration
+        try:
+            line = await asyncio.wait_for(self._process.stdout.readline(), timeout=self._remaining())
+        except asyncio.TimeoutError:
+            await _kill(self._process)
+            self._exhausted = True
+            raise subprocess.TimeoutExpired(CommandRunner.format_command(self.spec.command), self.spec.timeout or 0) from None
+        if not line:
+            self._exhausted = True
+            raise StopAsyncIteration
+        return _decode(line).rstrip("\r\n")
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        process = self._process
+        if process is None:
+            return
+        stderr_task = self._stderr_task
+        if not self._exhausted or exc_type is not None:
+            # Children of a killed shell may keep stderr open; do not wait for them.
+            await _kill(process)
+            if stderr_task is not None:
+                stderr_task.cancel()
+            return
+        returncode = await process.wait()
+        stderr = await stderr_task if stderr_task is not None else b""
+        self.result = _completed(self.spec, returncode, "", _decode(stderr).strip())
+        self.result.duration = time.monotonic() - self._started
+
+    def _remaining(self) -> float | None:
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - asyncio.get_running_loop().time())
+
+
+async def _spawn(spec: CommandSpec, command: Sequence[str] | str, env: MutableMapping[str, str] | None) -> asyncio.subprocess.Process:
+    pipes = {
+        "stdout": asyncio.subprocess.PIPE,
+        "stderr": asyncio.subprocess.PIPE,
+        "stdin": asyncio.subprocess.DEVNULL,
+        "env": env,
+        "limit": STREAM_LINE_LIMIT,
+    }
+    if spec.shell or isinstance(command, str):
+        return await asyncio.create_subprocess_shell(CommandRunner.format_command(command), **pipes)  # type: ignore[arg-type]
+    return await asyncio.create_subprocess_exec(*command, **pipes)  # type: ignore[arg-type]
+
+
+async def _drain(stream: asyncio.StreamReader, sink: CapturedOutput) -> None:
+    while chunk := await stream.read(READ_CHUNK_SIZE):
+        sink.write(chunk)
+
+
+async def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:  # pragma: no cover - exited between the check and the kill
+            pass
+    await process.wait()
+
+
+def _decode(data: bytes) -> str:
+    return data.decode(locale.getpreferredencoding(False), errors="replace")
+
+
+def _completed(spec: CommandSpec, returncode: int, stdout: str, stderr: str) -> CommandResult:
+    if spec.check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, CommandRunner.format_command(spec.command), stdout, stderr)
+    return CommandResult(spec=spec, stdout=stdout, stderr=stderr, exit_code=returncode)
+
+
+def _prepare(spec: CommandSpec, *, use_sudo: bool) -> CommandResult | tuple[Sequence[str] | str, MutableMapping[str, str] | None]:
+    """Apply sudo and availability rules shared by the sync and async runners.
+
+    Returns a skipped ``CommandResult`` when the command must not run, otherwise the final
+    command and environment to hand to the subprocess layer.
+    """
+    command = spec.command
+    env: MutableMapping[str, str] | None = None
+    if spec.env:
+        env = {**spec.env}
+
+    if isinstance(command, Sequence) and not spec.shell:
+        executable = command[0]
+        if spec.sudo:
+            if not use_sudo:
+                return _skipped(spec, 126, "sudo required but not enabled")
+            command = ["sudo", *command]
+        if shutil.which(executable) is None:
+            if spec.allow_missing:
+                return _skipped(spec, 127, f"Command '{executable}' not found")
+            raise FileNotFoundError(f"Command '{executable}' not found")
+    elif isinstance(command, str) and spec.sudo:
+        if not use_sudo:
+            return _skipped(spec, 126, "sudo required but not enabled")
+        command = f"sudo {command}"
+    return command, env
+
+
+def _skipped(spec: CommandSpec, exit_code: int, reason: str) -> CommandResult:
+    return CommandResult(spec=spec, stdout="", stderr="", exit_code=exit_code, skipped=True, reason=reason)
+
+
+def _close_captures(*captures: CapturedOutput | None) -> None:
+    for capture in captures:
+        if capture is not None:
+            capture.close()
+
+
+def _pump(process: subprocess.Popen[bytes], sinks: Mapping[IO[bytes], OutputSink], *, timeout: float | None) -> None:
+    """Copy each pipe into its sink until EOF, enforcing ``timeout`` over the whole run."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with selectors.DefaultSelector() as selector:
+        for pipe, sink in sinks.items():
+            selector.register(pipe, selectors.EVENT_READ, sink)
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                process.kill()
+                raise subprocess.TimeoutExpired(process.args, timeout or 0)
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, READ_CHUNK_SIZE)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                key.data.write(chunk)
+
+
+def _chain_final(chunks: Iterable[str], final: Callable[[], str]) -> Iterator[str]:
+    yield from chunks
+    yield final()
+
+
+def strip_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    """Streaming equivalent of ``"".join(chunks).strip()``."""
+    stripper = TextStripper()
+    for chunk in chunks:
+        text = stripper.feed(chunk)
+        if text:
+            yield text
+
+
+class TextStripper:
+    """Push-style ``str.strip`` for text that arrives in pieces.
+
+    Leading whitespace is dropped and trailing whitespace is held back until more content
+    arrives, so only a whitespace run (never the whole output) is buffered.
+    """
+
+    def __init__(self) -> None:
+        self._leading = True
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        if self._leading:
+            chunk = chunk.lstrip()
+            if not chunk:
+                return ""
+            self._leading = False
+        body = chunk.rstrip()
+        if not body:
+            self._pending += chunk
+            return ""
+        text = self._pending + body
+        self._pending = chunk[len(body) :]
+        return text
+
+    @property
+    def started(self) -> bool:
+        return not self._leading
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, IO, List
+
+MANIFEST_TIME_FORMAT = "%Y%m%dT%H%M%S"
+# A running ``diag --snapshot`` has blobs that no manifest lists yet (the manifest is
+# written on close) and temp files still being written; gc leaves anything this recent.
+GC_GRACE = timedelta(hours=6)
+
+
+@dataclass(slots=True)
+class SnapshotEntry:
+    section: str | None
+    label: str | None
+    command: str
+    blob: str | None
+    size: int = 0
+    exit_code: int | None = None
+    skipped: bool = False
+
+
+@dataclass(slots=True)
+class Manifest:
+    path: Path
+    created: datetime
+    report: str | None
+    host: str | None
+    entries: List[SnapshotEntry] = field(default_factory=list)
+
+    def find(self, query: str) -> SnapshotEntry | None:
+        for entry in self.entries:
+            if query in (entry.label, entry.command):
+                return entry
+        return None
+
+
+@dataclass(slots=True)
+class GcStats:
+    manifests_removed: int = 0
+    blobs_removed: int = 0
+    bytes_freed: int = 0
+
+
+class BlobWriter:
+    """Streams one blob into the store, hashing the uncompressed bytes as they arrive."""
+
+    def __init__(self, store: "SnapshotStore") -> None:
+        self._store = store
+        self._hash = hashlib.sha256()
+        self.size = 0
+        handle, name = tempfile.mkstemp(prefix="blob-", dir=store.tmp_dir)
+        self._tmp = Path(name)
+        self._raw: IO[bytes] = os.fdopen(handle, "wb")
+        self._fh = gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0)
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        self._fh.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def commit(self) -> str:
+        self._close_files()
+        digest = self._hash.hexdigest()
+        target = self._store.blob_path(digest)
+        if target.exists():
+            self._tmp.unlink()
+            # Mark the blob as in use so a concurrent gc keeps it until our manifest lands.
+            os.utime(target)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._tmp, target)
+        return digest
+
+    def discard(self) -> None:
+        self._close_files()
+        self._tmp.unlink(missing_ok=True)
+
+    def _close_files(self) -> None:
+        if not self._raw.closed:
+            self._fh.close()
+            self._raw.close()
+
+
+class SnapshotStore:
+    """Content-addressed store of diagnostic outputs.
+
+    ``objects/ab/cdef...`` holds each distinct command output once (gzip, keyed by the
+    SHA-256 of the uncompressed bytes) and ``manifests/<timestamp>-<report>.json``
+    (``<timestamp>~01-<report>.json`` and so on for more runs of that report within
+    the second) describes one diagnostic run as a list of references. Manifest names sort by time,
+    so point-in-time lookups are a binary search over the directory listing.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.manifests_dir = root / "manifests"
+        self.tmp_dir = root / "tmp"
+        for directory in (self.objects_dir, self.manifests_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def open_blob(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def read_blob(self, digest: str) -> bytes:
+        return gzip.decompress(self.blob_path(digest).read_bytes())
+
+    def manifest_paths(self) -> List[Path]:
+        return sorted(self.manifests_dir.glob("*.json"))
+
+    def load_manifest(self, path: Path) -> Manifest:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return Manifest(
+            path=path,
+            created=datetime.fromisoformat(data["created"]),
+            report=data.get("report"),
+            host=data.get("host"),
+            entries=[SnapshotEntry(**entry) for entry in data.get("entries", [])],
+        )
+
+    def write_manifest(self, *, created: datetime, report: str | None, host: str | None, entries: List[SnapshotEntry]) -> Path:
+        stem = Path(report).name.split(".")[0] if report else "snapshot"
+        stamp = created.strftime(MANIFEST_TIME_FORMAT)
+        payload = {
+            "created": created.isoformat(timespec="seconds"),
+            "report": report,
+            "host": host,
+            "entries": [
+                {
+                    "section": entry.section,
+                    "label": entry.label,
+                    "command": entry.command,
+                    "blob": entry.blob,
+                    "size": entry.size,
+                    "exit_code": entry.exit_code,
+                    "skipped": entry.skipped,
+                }
+                for entry in entries
+            ],
+        }
+        handle, tmp = tempfile.mkstemp(prefix=f"{stamp}-{stem}.", suffix=".tmp", dir=self.tmp_dir)
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as fh:
+                fh.write(json.dumps(payload, indent=1))
+            # link() never replaces an existing name, so a second report with the same
+            # stem in the same second gets the next "~NN" name instead of overwriting.
+            # "~" sorts after "-", keeping later manifests later in the listing.
+            attempt = 0
+            while True:
+                name = f"{stamp}-{stem}.json" if attempt == 0 else f"{stamp}~{attempt:02d}-{stem}.json"
+                path = self.manifests_dir / name
+                try:
+                    os.link(tmp, path)
+                    return path
+                except FileExistsError:
+                    attempt += 1
+        finally:
+            os.unlink(tmp)
+
+    def manifest_at(self, when: datetime | None = None) -> Manifest | None:
+        """Newest manifest created at or before ``when`` (or the newest overall)."""
+        paths = self.manifest_paths()
+        if when is not None:
+            # Names start with the timestamp, so a string bisect finds the cut-off.
+            cutoff = when.strftime(MANIFEST_TIME_FORMAT) + "￿"
+            paths = paths[: bisect.bisect_right([path.name for path in paths], cutoff)]
+        if not paths:
+            return None
+        return self.load_manifest(paths[-1])
+
+    def history(self, query: str) -> List[tuple[Manifest, SnapshotEntry]]:
+        """Every recorded output of the command with label or command line ``query``, oldest first."""
+        found: List[tuple[Manifest, SnapshotEntry]] = []
+        for path in self.manifest_paths():
+            manifest = self.load_manifest(path)
+            entry = manifest.find(query)
+            if entry is not None:
+                found.append((manifest, entry))
+        return found
+
+    def gc(
+        self,
+        *,
+        keep: int | None = None,
+        max_age: timedelta | None = None,
+        now: datetime | None = None,
+        grace: timedelta = GC_GRACE,
+    ) -> GcStats:
+        """Drop manifests beyond ``keep``/older than ``max_age`` and sweep unreferenced blobs.
+
+        Unreferenced blobs and temp files modified within ``grace`` may belong to a
+        snapshot still being written and are kept.
+        """
+        stats = GcStats()
+        paths = self.manifest_paths()
+        doomed: set[Path] = set()
+        if keep is not None:
+            doomed.update(paths[: max(0, len(paths) - keep)])
+        if max_age is not None:
+            cutoff = ((now or datetime.now()) - max_age).strftime(MANIFEST_TIME_FORMAT)
+            doomed.update(path for path in paths if path.name < cutoff)
+        for path in doomed:
+            path.unlink()
+            stats.manifests_removed += 1
+
+        live: set[str] = set()
+        for path in self.manifest_paths():
+            live.update(entry.blob for entry in self.load_manifest(path).entries if entry.blob)
+        settled = time.time() - grace.total_seconds()
+        for blob in self.objects_dir.glob("*/*"):
+            if blob.parent.name + blob.name in live:
+                continue
+            try:
+                info = blob.stat()
+                if info.st_mtime >= settled:
+                    continue
+                blob.unlink()
+            except FileNotFoundError:
+                continue
+            stats.bytes_freed += info.st_size
+            stats.blobs_removed += 1
+        for leftover in self.tmp_dir.iterdir():
+            try:
+                if leftover.stat().st_mtime < settled:
+                    leftover.unlink()
+            except FileNotFoundError:
+                continue  # committed or discarded meanwhile
+        return stats
+
+
+class SnapshotSession:
+    """Collects the blobs written during one report and commits a manifest on close.
+
+    Blocks that a delta report only references still write their real output to the
+    blob (see ``CommandBlock.snapshot_only``), so the manifest always points at the
+    output of this run; an unchanged output is deduplicated by its hash as usual.
+    """
+
+    def __init__(self, store: SnapshotStore, *, report: str | None = None, host: str | None = None) -> None:
+        self.store = store
+        self.report = report
+        self.host = host
+        self.created = datetime.now().replace(microsecond=0)
+        self.entries: List[SnapshotEntry] = []
+        self.manifest_path: Path | None = None
+
+    def open_blob(self) -> BlobWriter:
+        return self.store.open_blob()
+
+    def add(self, blob: BlobWriter, **details: Any) -> None:
+        entry = SnapshotEntry(blob=None, **details)
+        entry.size = blob.size
+        entry.blob = blob.commit()
+        self.entries.append(entry)
+
+    def close(self) -> Path:
+        self.manifest_path = self.store.write_manifest(
+            created=self.created, report=self.report, host=self.host, entries=self.entries
+        )
+        return self.manifest_path
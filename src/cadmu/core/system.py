@@ -59,3 +59,7 @@ def default_report_path(home: Path, prefix: str) -> Path:
     directory = home / "diagnostic_reports"
     directory.mkdir(parents=True, exist_ok=True)
     return directory / prefix
+
+
+def snapshot_store_path(home: Path) -> Path:
+    return default_report_path(home, "store")
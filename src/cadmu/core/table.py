@@ -1,47 +1,159 @@
 from __future__ import annotations
 
+import os
+import shlex
+import shutil
+import subprocess
+import sys
 import textwrap
-from typing import Dict, List, Sequence
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, TextIO
 
+# Columns narrowed to fit the terminal never go below this (or their header).
+MIN_COLUMN_WIDTH = 8
+DEFAULT_PAGER = "less -FRX"
 
-def render_table(headers: Sequence[str], rows: Sequence[Sequence[str]], *, max_widths: Dict[str, int] | None = None) -> str:
+
+class ColumnRows:
+    """Re-iterable rows over parallel columns, without building a list of row lists."""
+
+    def __init__(self, columns: Sequence[Sequence[str]]) -> None:
+        self.columns = columns
+
+    def __iter__(self) -> Iterator[Sequence[str]]:
+        return zip(*self.columns)
+
+    def __len__(self) -> int:
+        return min((len(column) for column in self.columns), default=0)
+
+
+def render_table(
+    headers: Sequence[str],
+    rows: Iterable[Sequence[str]],
+    *,
+    max_widths: Dict[str, int] | None = None,
+    width: int | None = None,
+) -> str:
+    return "\n".join(iter_table(headers, rows, max_widths=max_widths, width=width))
+
+
+def iter_table(
+    headers: Sequence[str],
+    rows: Iterable[Sequence[str]],
+    *,
+    max_widths: Dict[str, int] | None = None,
+    width: int | None = None,
+) -> Iterator[str]:
+    """Yield the table one line at a time.
+
+    A first pass only measures cells to size the columns; rows are then wrapped and
+    emitted one by one, so at most one wrapped row is held at a time. ``rows`` is read
+    twice and must be re-iterable (a one-shot iterator is buffered). With ``width`` the
+    widest columns are narrowed, down to ``MIN_COLUMN_WIDTH``, until the table fits.
+    """
     if not headers:
-        return ""
+        return
+    if iter(rows) is rows:
+        rows = list(rows)
     max_widths = max_widths or {}
-    wrapped_rows: List[List[List[str]]] = []
     col_widths = {header: len(header) for header in headers}
+    for row in rows:
+        for header, cell in zip(headers, row, strict=False):
+            measured = _measure(cell or "", max_widths.get(header))
+            if measured > col_widths[header]:
+                col_widths[header] = measured
+    narrowed = _fit(headers, col_widths, width) if width else set()
 
+    separator = "+" + "+".join("-" * (col_widths[header] + 2) for header in headers) + "+"
+    yield separator
+    yield "|" + "|".join(f" {header.ljust(col_widths[header])} " for header in headers) + "|"
+    yield separator
     for row in rows:
         wrapped_row: List[List[str]] = []
         for header, cell in zip(headers, row, strict=False):
-            cell_text = cell or ""
-            width = max_widths.get(header)
-            if width:
-                wrapped = textwrap.wrap(cell_text, width=width, break_long_words=False, drop_whitespace=False) or [""]
+            if header in narrowed:
+                wrapped_row.append(_hard_wrap(cell or "", col_widths[header], wrap_newlines=header in max_widths))
             else:
-                wrapped = cell_text.splitlines() or [""]
-            wrapped_row.append(wrapped)
-            longest_line = max(len(line) for line in wrapped)
-            if longest_line > col_widths[header]:
-                col_widths[header] = longest_line
-        wrapped_rows.append(wrapped_row)
-
-    # Build horizontal separator
-    sep_parts = ["+" + "-" * (col_widths[header] + 2) for header in headers]
-    separator = "+".join(part for part in sep_parts) + "+"
-
-    lines: List[str] = [separator]
-    header_cells = [f" {header.ljust(col_widths[header])} " for header in headers]
-    lines.append("|" + "|".join(header_cells) + "|")
-    lines.append(separator)
-
-    for wrapped_row in wrapped_rows:
-        max_lines = max(len(col) for col in wrapped_row)
-        for i in range(max_lines):
+                wrapped_row.append(_cell_lines(cell or "", max_widths.get(header)))
+        for i in range(max(len(column) for column in wrapped_row)):
             line_cells = []
             for header, column in zip(headers, wrapped_row, strict=False):
                 text = column[i] if i < len(column) else ""
                 line_cells.append(f" {text.ljust(col_widths[header])} ")
-            lines.append("|" + "|".join(line_cells) + "|")
-        lines.append(separator)
-    return "\n".join(lines)
+            yield "|" + "|".join(line_cells) + "|"
+        yield separator
+
+
+def _cell_lines(text: str, limit: int | None) -> List[str]:
+    if limit:
+        return textwrap.wrap(text, width=limit, break_long_words=False, drop_whitespace=False) or [""]
+    return text.splitlines() or [""]
+
+
+def _hard_wrap(text: str, limit: int, *, wrap_newlines: bool) -> List[str]:
+    # Columns narrowed for the terminal must fit, so long words are broken as well.
+    pieces = [text] if wrap_newlines else text.splitlines() or [""]
+    lines: List[str] = []
+    for piece in pieces:
+        lines.extend(textwrap.wrap(piece, width=limit, drop_whitespace=False) or [""])
+    return lines
+
+
+def _measure(text: str, limit: int | None) -> int:
+    if limit and len(text) <= limit and "\t" not in text:
+        # Short cells come back from textwrap as a single line of the same length.
+        return len(text)
+    if not limit and "\n" not in text:
+        return len(text)
+    return max(len(line) for line in _cell_lines(text, limit))
+
+
+def _fit(headers: Sequence[str], col_widths: Dict[str, int], width: int) -> Set[str]:
+    narrowed: Set[str] = set()
+    # Every column costs its width plus " | "; the table adds one closing border.
+    excess = sum(col_widths[header] + 3 for header in headers) + 1 - width
+    while excess > 0:
+        shrinkable = [header for header in headers if col_widths[header] > max(MIN_COLUMN_WIDTH, len(header))]
+        if not shrinkable:
+            break
+        widest = max(shrinkable, key=col_widths.__getitem__)
+        col_widths[widest] -= 1
+        narrowed.add(widest)
+        excess -= 1
+    return narrowed
+
+
+def terminal_width(stream: TextIO | None = None) -> int | None:
+    """Columns of the terminal behind ``stream`` (stdout by default), or ``None`` when not a terminal."""
+    stream = stream or sys.stdout
+    if not stream.isatty():
+        return None
+    return shutil.get_terminal_size().columns
+
+
+def page(lines: Iterable[str], *, stream: TextIO | None = None, use_pager: bool = True) -> None:
+    """Write ``lines`` as they are produced, through ``$PAGER`` when ``stream`` is a terminal.
+
+    ``less -FRX`` is the default pager; it exits straight away when the output fits on one
+    screen. An empty ``$PAGER`` or a missing pager binary falls back to writing directly.
+    """
+    stream = stream or sys.stdout
+    argv = shlex.split(os.environ.get("PAGER", DEFAULT_PAGER)) if use_pager and stream.isatty() else []
+    if not argv or shutil.which(argv[0]) is None:
+        for line in lines:
+            stream.write(line + "\n")
+        stream.flush()
+        return
+    stream.flush()
+    pager = subprocess.Popen(argv, stdin=subprocess.PIPE, text=True)
+    assert pager.stdin is not None
+    try:
+        for line in lines:
+            pager.stdin.write(line + "\n")
+    except BrokenPipeError:
+        pass  # the pager was quit before reading everything
+    finally:
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+METRICS_NAME = "audit-metrics.sqlite"
+# At one sample per five minutes a series holds a week before it wraps.
+SERIES_CAPACITY = 2016
+SAMPLE_INTERVAL = 300.0
+METRICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    series TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    at REAL NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series, slot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS heads (
+    series TEXT PRIMARY KEY,
+    next INTEGER NOT NULL,
+    last_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class MetricStore:
+    """Fixed-size ring buffer of ``(time, value)`` samples per named series, kept in SQLite.
+
+    A series holds at most ``capacity`` samples: once full, each new sample overwrites the
+    oldest slot, so the file stops growing. Samples arriving less than ``interval`` seconds
+    after a series' previous one are dropped, which keeps a one-second ``--watch`` loop and
+    a daily cron job on the same time scale. SQLite serialises concurrent writers.
+    """
+
+    def __init__(self, path: Path, *, capacity: int = SERIES_CAPACITY, interval: float = SAMPLE_INTERVAL) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.interval = interval
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript(METRICS_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "MetricStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def record(self, samples: Dict[str, float], *, at: float | None = None) -> List[str]:
+        """Append one sample per series at ``at`` (now by default); return the series written."""
+        at = time.time() if at is None else at
+        written: List[str] = []
+        with self._db:
+            for name, value in samples.items():
+                head = self._db.execute("SELECT next, last_at FROM heads WHERE series = ?", (name,)).fetchone()
+                position = 0 if head is None else head[0]
+                if head is not None and at - head[1] < self.interval:
+                    continue
+                self._db.execute(
+                    "INSERT OR REPLACE INTO samples (series, slot, at, value) VALUES (?, ?, ?, ?)",
+                    (name, position % self.capacity, at, value),
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO heads (series, next, last_at) VALUES (?, ?, ?)",
+                    (name, position + 1, at),
+                )
+                written.append(name)
+        return written
+
+    def series(self, name: str, *, since: float | None = None) -> List[Tuple[float, float]]:
+        """Samples of ``name`` in time order, optionally only those taken at or after ``since``."""
+        rows = self._db.execute(
+            "SELECT at, value FROM samples WHERE series = ? AND at >= ? ORDER BY at",
+            (name, float("-inf") if since is None else since),
+        )
+        return [(at, value) for at, value in rows]
+
+    def names(self) -> List[str]:
+        return [name for (name,) in self._db.execute("SELECT series FROM heads ORDER BY series")]
+
+
+@dataclass(slots=True)
+class Trend:
+    """Least-squares line through a series, evaluated at its newest sample."""
+
+    at: float
+    value: float
+    slope: float  # value units per second
+    r_squared: float
+    samples: int
+    span: float  # seconds between the oldest and newest sample
+
+    def time_to(self, limit: float) -> float | None:
+        """Seconds after ``at`` until the line reaches ``limit``; ``None`` if it never does."""
+        if self.slope == 0:
+            return None
+        seconds = (limit - self.value) / self.slope
+        return seconds if seconds > 0 else None
+
+
+def linear_fit(samples: Sequence[Tuple[float, float]]) -> Trend | None:
+    """Fit ``value = a + b * time`` to ``samples``; ``None`` with fewer than two distinct times."""
+    count = len(samples)
+    if count < 2:
+        return None
+    # Centre both axes so epoch-sized timestamps do not swamp the sums.
+    mean_t = sum(at for at, _ in samples) / count
+    mean_v = sum(value for _, value in samples) / count
+    s_tt = sum((at - mean_t) ** 2 for at, _ in samples)
+    if s_tt == 0:
+        return None
+    s_tv = sum((at - mean_t) * (value - mean_v) for at, value in samples)
+    s_vv = sum((value - mean_v) ** 2 for _, value in samples)
+    slope = s_tv / s_tt
+    r_squared = s_tv * s_tv / (s_tt * s_vv) if s_vv else 1.0
+    first, last = min(at for at, _ in samples), max(at for at, _ in samples)
+    return Trend(last, mean_v + slope * (last - mean_t), slope, r_squared, count, last - first)
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from cadmu.core.diskusage import DEFAULT_SCAN_JOBS, DiskUsage, allocated_size
+
+USAGE_INDEX_NAME = "disk-usage.sqlite"
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS links (
+    dir TEXT NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_dir ON links(dir);
+"""
+
+
+@dataclass(slots=True)
+class _CachedDir:
+    parent: str | None
+    mtime_ns: int
+    size: int
+
+
+@dataclass(slots=True)
+class IndexScanStats:
+    directories_read: int = 0
+    directories_reused: int = 0
+    directories_removed: int = 0
+
+
+class UsageIndex:
+    """SQLite cache of per-directory sizes that makes repeat scans incremental.
+
+    Each row stores a directory's own size (the directory plus its non-directory entries)
+    and the ``st_mtime_ns`` it was read at. A directory whose mtime is unchanged is not
+    listed again: its cached size is reused and only its cached subdirectories are
+    ``stat``-ed to look for changes further down. A repeat scan therefore costs one
+    ``stat`` per directory plus a full read of the directories that changed, instead of
+    one ``stat`` per file.
+
+    Directory mtimes change when entries are created, removed or renamed, but not when an
+    existing file is rewritten in place; pass ``full=True`` to :meth:`scan` periodically to
+    pick up such growth.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript(INDEX_SCHEMA)
+        self.stats = IndexScanStats()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "UsageIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def scan(
+        self, root: Path, *, one_file_system: bool = True, full: bool = False, jobs: int = DEFAULT_SCAN_JOBS
+    ) -> DiskUsage:
+        """Walk ``root``, one thread-pool task per top-level subtree like :func:`scan_usage`.
+
+        Workers only read the cache loaded up front; their results are merged in subtree
+        order, and the index is updated from this thread once the walk is done.
+        """
+        self.stats = IndexScanStats()
+        root_key = str(root)
+        root_stat = root.stat()
+        root_device = root_stat.st_dev
+        device = root_device if one_file_system else None
+        cache = self._load(root_key)
+
+        top = _walk_indexed(root_key, root_stat, cache, device, full, is_root=True, root_device=root_device)
+
+        def subtree(item: Tuple[str, os.stat_result]) -> _IndexedWalk:
+            path, st = item
+            return _walk_indexed(
+                path, st, cache, device, full, is_root=False, root_device=root_device, local=st.st_dev == root_device
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="cadmu-du") as pool:
+            walks = [top] + list(pool.map(subtree, top.subdirs))
+
+        usage = DiskUsage(root=root)
+        usage.entries = top.entries
+        order: List[str] = []
+        parents: Dict[str, str] = {}
+        own: Dict[str, int] = {}
+        dir_links: Dict[str, List[Tuple[int, int, int]]] = {}
+        updates: List[Tuple[str, str, int, int]] = []
+        for walk in walks:
+            order.extend(walk.order)
+            parents.update(walk.parents)
+            own.update(walk.own)
+            dir_links.update(walk.dir_links)
+            updates.extend(walk.updates)
+            usage.mount_points.extend(walk.mount_points)
+            usage.errors += walk.errors
+            self.stats.directories_read += walk.read
+            self.stats.directories_reused += walk.reused
+
+        totals = _fold(order, parents, own, dir_links)
+        usage.directories = totals
+        for path in usage.entries:
+            if path in totals:
+                usage.entries[path] = totals[path]
+        self._store(cache[0], set(order), updates, dir_links)
+        return usage
+
+    def _load(self, root: str) -> _Cache:
+        cached: Dict[str, _CachedDir] = {}
+        children: Dict[str, List[str]] = {}
+        prefix = root.rstrip(os.sep) + os.sep
+        pattern = _like_prefix(prefix)
+        rows = self._db.execute(
+            "SELECT path, parent, mtime_ns, size FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+            (root, pattern),
+        )
+        for path, parent, mtime_ns, size in rows:
+            cached[path] = _CachedDir(parent, mtime_ns, size)
+            if parent is not None:
+                children.setdefault(parent, []).append(path)
+        links: Dict[str, List[Tuple[int, int, int]]] = {}
+        rows = self._db.execute(
+            "SELECT dir, dev, ino, size FROM links WHERE dir = ? OR dir LIKE ? ESCAPE '\\'", (root, pattern)
+        )
+        for directory, dev, ino, size in rows:
+            links.setdefault(directory, []).append((dev, ino, size))
+        return cached, children, links
+
+    def _store(
+        self,
+        cached: Dict[str, _CachedDir],
+        visited: Set[str],
+        updates: List[Tuple[str, str, int, int]],
+        dir_links: Dict[str, List[Tuple[int, int, int]]],
+    ) -> None:
+        removed = [(path,) for path in cached.keys() - visited]
+        self.stats.directories_removed = len(removed)
+        changed = [(path,) for path, *_ in updates]
+        with self._db:
+            self._db.executemany("DELETE FROM dirs WHERE path = ?", removed)
+            self._db.executemany("DELETE FROM links WHERE dir = ?", removed + changed)
+            self._db.executemany("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns, size) VALUES (?, ?, ?, ?)", updates)
+            self._db.executemany(
+                "INSERT INTO links (dir, dev, ino, size) VALUES (?, ?, ?, ?)",
+                [(path, *link) for (path,) in changed for link in dir_links.get(path, [])],
+            )
+
+
+@dataclass(slots=True)
+class _IndexedWalk:
+    order: List[str] = field(default_factory=list)
+    parents: Dict[str, str] = field(default_factory=dict)
+    own: Dict[str, int] = field(default_factory=dict)
+    dir_links: Dict[str, List[Tuple[int, int, int]]] = field(default_factory=dict)
+    updates: List[Tuple[str, str, int, int]] = field(default_factory=list)
+    # Only for the root: its subdirectories (walked as separate tasks) and direct entries.
+    subdirs: List[Tuple[str, os.stat_result]] = field(default_factory=list)
+    entries: Dict[str, int] = field(default_factory=dict)
+    mount_points: List[str] = field(default_factory=list)
+    errors: int = 0
+    read: int = 0
+    reused: int = 0
+
+
+_Cache = Tuple[Dict[str, _CachedDir], Dict[str, List[str]], Dict[str, List[Tuple[int, int, int]]]]
+
+
+def _walk_indexed(
+    top: str,
+    top_stat: os.stat_result,
+    cache: _Cache,
+    device: int | None,
+    full: bool,
+    *,
+    is_root: bool,
+    root_device: int,
+    local: bool = True,
+) -> _IndexedWalk:
+    """Walk one subtree, reusing cached sizes of directories whose mtime is unchanged.
+
+    With ``is_root`` only ``top`` itself is listed (always, so its file entries can be
+    reported individually) and its subdirectories are returned for separate walks.
+    ``local`` says whether ``top`` is still on ``root_device``; directories where the walk
+    leaves it are collected in ``mount_points``.
+    """
+    cached, children, links = cache
+    walk = _IndexedWalk()
+    stack: List[Tuple[str, os.stat_result, bool]] = [(top, top_stat, local)]
+    while stack:
+        path, st, local = stack.pop()
+        walk.order.append(path)
+        entry = cached.get(path)
+        if not full and not is_root and entry is not None and entry.mtime_ns == st.st_mtime_ns:
+            walk.reused += 1
+            walk.own[path] = entry.size
+            walk.dir_links[path] = links.get(path, [])
+            for child in children.get(path, []):
+                try:
+                    child_stat = os.stat(child, follow_symlinks=False)
+                except OSError:
+                    walk.errors += 1
+                    continue
+                if stat.S_ISDIR(child_stat.st_mode) and (device is None or child_stat.st_dev == device):
+                    walk.parents[child] = path
+                    stack.append((child, child_stat, _descend(walk, child, child_stat, local, root_device)))
+            continue
+
+        walk.read += 1
+        size = allocated_size(st)
+        linked: List[Tuple[int, int, int]] = []
+        try:
+            with os.scandir(path) as listing:
+                for item in listing:
+                    try:
+                        item_stat = item.stat(follow_symlinks=False)
+                    except OSError:
+                        walk.errors += 1
+                        continue
+                    if device is not None and item_stat.st_dev != device:
+                        continue
+                    if stat.S_ISDIR(item_stat.st_mode):
+                        walk.parents[item.path] = path
+                        child_local = _descend(walk, item.path, item_stat, local, root_device)
+                        if is_root:
+                            walk.subdirs.append((item.path, item_stat))
+                            walk.entries[item.path] = 0
+                        else:
+                            stack.append((item.path, item_stat, child_local))
+                    elif item_stat.st_nlink > 1:
+                        linked.append((item_stat.st_dev, item_stat.st_ino, allocated_size(item_stat)))
+                        if is_root:
+                            walk.entries[item.path] = allocated_size(item_stat)
+                    else:
+                        size += allocated_size(item_stat)
+                        if is_root:
+                            walk.entries[item.path] = allocated_size(item_stat)
+        except OSError:
+            walk.errors += 1
+        walk.own[path] = size
+        walk.dir_links[path] = linked
+        walk.updates.append((path, os.path.dirname(path), st.st_mtime_ns, size))
+    return walk
+
+
+def _descend(walk: _IndexedWalk, path: str, st: os.stat_result, local: bool, root_device: int) -> bool:
+    """Whether subdirectory ``path`` is still on the root's device, noting a crossing."""
+    child_local = local and st.st_dev == root_device
+    if local and not child_local:
+        walk.mount_points.append(path)
+    return child_local
+
+
+def _fold(
+    order: List[str],
+    parents: Dict[str, str],
+    own: Dict[str, int],
+    dir_links: Dict[str, List[Tuple[int, int, int]]],
+) -> Dict[str, int]:
+    """Cumulative sizes, counting each hard-linked inode once in walk order."""
+    seen: Set[Tuple[int, int]] = set()
+    totals: Dict[str, int] = {}
+    for path in order:
+        size = own[path]
+        for dev, ino, link_size in dir_links.get(path, []):
+            if (dev, ino) not in seen:
+                seen.add((dev, ino))
+                size += link_size
+        totals[path] = size
+    for path in reversed(order):
+        parent = parents.get(path)
+        if parent is not None:
+            totals[parent] += totals[path]
+    return totals
+
+
+def _like_prefix(prefix: str) -> str:
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def scan_indexed(
+    root: Path, index: Path, *, one_file_system: bool = True, full: bool = False, jobs: int = DEFAULT_SCAN_JOBS
+) -> DiskUsage:
+    with UsageIndex(index) as usage_index:
+        return usage_index.scan(root, one_file_system=one_file_system, full=full, jobs=jobs)
@@ -1,5 +1,5 @@
 """Arch-specific tooling for CADMU."""
 
-from . import pacman  # noqa: F401
+from . import depgraph, pacman, pacman_db  # noqa: F401
 
-__all__ = ["pacman"]
+__all__ = ["depgraph", "pacman", "pacman_db"]
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+from cadmu.modules.arch import pacman_db
+
+
+def _csr(adjacency: List[List[int]]) -> Tuple[array, array]:
+    """Pack per-node neighbour lists into ``offsets``/``targets`` arrays (CSR layout)."""
+    offsets = array("i", [0])
+    targets = array("i")
+    for neighbours in adjacency:
+        targets.extend(neighbours)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+class DependencyGraph:
+    """Installed-package dependency graph with integer package ids.
+
+    Names are interned once; edges live in flat ``array`` buffers so every query below
+    touches each package and edge at most once. ``%DEPENDS%`` entries are hard edges and
+    ``%OPTDEPENDS%`` entries optional ones; a dependency resolves to every installed
+    package satisfying it (:func:`pacman_db.satisfiers`), and anything not installed is
+    dropped.
+    """
+
+    def __init__(self, names: List[str], explicit: Iterable[bool], depends: List[List[int]], optional: List[List[int]]) -> None:
+        self.names = names
+        self.ids: Dict[str, int] = {name: index for index, name in enumerate(names)}
+        self.explicit = bytearray(explicit)
+        self._dep_offsets, self._deps = _csr(depends)
+        self._opt_offsets, self._opts = _csr(optional)
+        reverse: List[List[int]] = [[] for _ in names]
+        for package, targets in enumerate(depends):
+            for target in targets:
+                reverse[target].append(package)
+        self._rev_offsets, self._rev = _csr(reverse)
+        self._opt_required = bytearray(len(names))
+        for target in self._opts:
+            self._opt_required[target] = 1
+
+    @classmethod
+    def from_local_db(cls, packages: Dict[str, pacman_db.DescRecord]) -> "DependencyGraph":
+        names = sorted(packages)
+        ids = {name: index for index, name in enumerate(names)}
+        providers = pacman_db.provider_index(packages)
+
+        def resolve(entries: List[str], source: int) -> List[int]:
+            resolved: List[int] = []
+            for entry in entries:
+                for target in pacman_db.satisfiers(pacman_db.dependency_name(entry), packages, providers):
+                    index = ids[target]
+                    if index != source and index not in resolved:
+                        resolved.append(index)
+            return resolved
+
+        depends = [resolve(packages[name].get("DEPENDS", []), ids[name]) for name in names]
+        optional = [resolve(packages[name].get("OPTDEPENDS", []), ids[name]) for name in names]
+        explicit = (pacman_db.field(packages[name], "REASON") in ("", "0") for name in names)
+        return cls(names, explicit, depends, optional)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def dependencies(self, name: str) -> List[str]:
+        index = self.ids[name]
+        return [self.names[target] for target in self._deps[self._dep_offsets[index] : self._dep_offsets[index + 1]]]
+
+    def dependents(self, name: str) -> List[str]:
+        index = self.ids[name]
+        return [self.names[source] for source in self._rev[self._rev_offsets[index] : self._rev_offsets[index + 1]]]
+
+    def reverse_dependency_count(self, name: str) -> int:
+        index = self.ids[name]
+        return self._rev_offsets[index + 1] - self._rev_offsets[index]
+
+    def dependency_closure_size(self, name: str) -> int:
+        """Number of packages ``name`` pulls in transitively (itself excluded)."""
+        return self._reach(self.ids[name], self._dep_offsets, self._deps)
+
+    def dependent_closure_size(self, name: str) -> int:
+        """Number of packages that would break, transitively, if ``name`` disappeared."""
+        return self._reach(self.ids[name], self._rev_offsets, self._rev)
+
+    def dependent_closure_sizes(self) -> array:
+        """:meth:`dependent_closure_size` of every package, indexed by package id, in one pass.
+
+        Tarjan's algorithm finds the strongly connected components of the reverse graph
+        dependents-last, so each component's dependents are the union of its successors'
+        sets, kept as integer bitsets. One traversal replaces a search per package.
+        """
+        offsets, targets = self._rev_offsets, self._rev
+        count = len(self.names)
+        order = [-1] * count
+        low = [0] * count
+        component = [-1] * count
+        on_stack = bytearray(count)
+        stack: List[int] = []
+        # Component id -> bitset of its members and everything depending on them.
+        reach: List[int] = []
+        visited = 0
+        for root in range(count):
+            if order[root] >= 0:
+                continue
+            order[root] = low[root] = visited
+            visited += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, offsets[root])]
+            while work:
+                node, edge = work[-1]
+                if edge < offsets[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    target = targets[edge]
+                    if order[target] < 0:
+                        order[target] = low[target] = visited
+                        visited += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, offsets[target]))
+                    elif on_stack[target]:
+                        low[node] = min(low[node], order[target])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] != order[node]:
+                    continue
+                current = len(reach)
+                members: List[int] = []
+                bits = 0
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component[member] = current
+                    members.append(member)
+                    bits |= 1 << member
+                    if member == node:
+                        break
+                # Every dependent outside this component belongs to one finished earlier.
+                for member in members:
+                    for target in targets[offsets[member] : offsets[member + 1]]:
+                        if component[target] != current:
+                            bits |= reach[component[target]]
+                reach.append(bits)
+        # A package's own bit is always set; it is not its own dependent.
+        return array("q", (reach[component[node]].bit_count() - 1 for node in range(count)))
+
+    def removal_set(self, name: str) -> List[str]:
+        """What ``pacman -Rs name`` would take with it: dependency installs nothing else needs."""
+        return sorted(self.names[package] for package in self._removal(self.ids[name]))
+
+    def _removal(self, start: int) -> List[int]:
+        # Outstanding dependents per touched package; a dependency joins the removal set
+        # once every package that requires it is being removed too.
+        remaining: Dict[int, int] = {}
+        removed = [start]
+        seen = {start}
+        position = 0
+        while position < len(removed):
+            package = removed[position]
+            position += 1
+            for target in self._deps[self._dep_offsets[package] : self._dep_offsets[package + 1]]:
+                if target in seen or self.explicit[target]:
+                    continue
+                left = remaining.get(target, self._rev_offsets[target + 1] - self._rev_offsets[target]) - 1
+                remaining[target] = left
+                if left == 0:
+                    seen.add(target)
+                    removed.append(target)
+        return removed[1:]
+
+    def blast_radius(self, name: str) -> int:
+        """Packages affected by removing ``name``: broken dependents plus dependencies removed with it."""
+        return self.dependent_closure_size(name) + len(self._removal(self.ids[name]))
+
+    def blast_radii(self) -> Dict[str, int]:
+        """:meth:`blast_radius` of every package, sharing one dependent-closure pass."""
+        dependents = self.dependent_closure_sizes()
+        return {name: dependents[index] + len(self._removal(index)) for index, name in enumerate(self.names)}
+
+    def unrequired(self, *, explicit: bool) -> List[str]:
+        """``pacman -Qet`` (``explicit=True``) or ``pacman -Qdt`` (``explicit=False``).
+
+        A single ``-t`` counts optional dependencies as requirements too.
+        """
+        names: List[str] = []
+        for index, name in enumerate(self.names):
+            if bool(self.explicit[index]) != explicit or self._opt_required[index]:
+                continue
+            if self._rev_offsets[index + 1] == self._rev_offsets[index]:
+                names.append(name)
+        return names
+
+    def orphans(self) -> List[str]:
+        return self.unrequired(explicit=False)
+
+    def _reach(self, start: int, offsets: array, targets: array) -> int:
+        seen = bytearray(len(self.names))
+        seen[start] = 1
+        stack = [start]
+        count = 0
+        while stack:
+            node = stack.pop()
+            for target in targets[offsets[node] : offsets[node + 1]]:
+                if not seen[target]:
+                    seen[target] = 1
+                    count += 1
+                    stack.append(target)
+        return count
@@ -1,14 +1,36 @@
 from __future__ import annotations
 
+import heapq
+import json
 import math
-from dataclasses import dataclass
+import os
+import sys
+import tempfile
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Dict, Iterable, List, Sequence
-
-from cadmu.core.runner import CommandRunner, CommandSpec
-from cadmu.core.table import render_table
-
-CHUNK_SIZE = 40
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from cadmu.core.runner import CommandResult, CommandRunner, CommandSpec
+from cadmu.core.table import ColumnRows, iter_table
+from cadmu.modules.arch import pacman_db
+from cadmu.modules.arch.depgraph import DependencyGraph
+
+# Each pacman process reloads its databases, so chunks are never made smaller than this.
+MIN_CHUNK_SIZE = 25
+QUERY_JOBS = 4
+# POSIX minimum for ARG_MAX, used when sysconf cannot report it.
+FALLBACK_ARG_MAX = 4096 * 32
+PACMAN_CACHE_NAME = "pacman-cache.json"
+CACHE_VERSION = 5
+NO_EXPLICIT_PACKAGES = "No explicitly installed packages found."
+NO_INSTALLED_PACKAGES = "No installed packages found."
+# Fields PackageTable.top can order by.
+SORT_FIELDS = ("name", "age", "dependencies", "impact", "size")
+_SIZE_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024**2, "GiB": 1024**3, "TiB": 1024**4}
 
 
 @dataclass(slots=True)
@@ -21,6 +43,10 @@ class PackageInfo:
     optional_deps: List[str]
     repo: str | None
     is_foreign: bool
+    # Packages affected by removing this one (see DependencyGraph.blast_radius); only
+    # known when the local database was read directly.
+    blast_radius: int | None = None
+    installed_size: int | None = None
 
     @property
     def dependency_count(self) -> int:
@@ -38,13 +64,169 @@ class PacmanDataError(RuntimeError):
     pass
 
 
-def get_explicit_packages(runner: CommandRunner) -> List[str]:
-    spec = CommandSpec(label="pacman -Qet", command=["pacman", "-Qet"], allow_missing=False)
+@dataclass(slots=True)
+class PacmanSnapshot:
+    """Every installed package parsed once, plus the ``-Qet``/``-Qdt`` name lists.
+
+    Packages are kept as one :class:`PackageTable` in name order, whose ``weights`` are
+    blast radii, with the dependency lists alongside as two more columns.
+    ``PackageInfo`` objects are only built for the rows :meth:`infos` is asked for.
+    """
+
+    signature: Tuple[Tuple[str, int], ...]
+    table: PackageTable = field(default_factory=lambda: PackageTable())
+    depends: List[List[str]] = field(default_factory=list)
+    optional_deps: List[List[str]] = field(default_factory=list)
+    explicit: List[str] = field(default_factory=list)
+    orphans: List[str] = field(default_factory=list)
+    cache_version: int = CACHE_VERSION
+
+    def infos(self, names: Iterable[str]) -> List[PackageInfo]:
+        rows = {name: row for row, name in enumerate(self.table.names)}
+        return [self._info(rows[name]) for name in names if name in rows]
+
+    def _info(self, row: int) -> PackageInfo:
+        table = self.table
+        installed, size = table.installed[row], table.sizes[row]
+        return PackageInfo(
+            name=table.names[row],
+            version=table.versions[row],
+            description=table.descriptions[row],
+            install_date=None if installed < 0 else datetime.fromtimestamp(installed, timezone.utc),
+            depends=list(self.depends[row]),
+            optional_deps=list(self.optional_deps[row]),
+            repo=table.repos[row] or None,
+            is_foreign=bool(table.foreign[row]),
+            blast_radius=table.weights[row],
+            installed_size=None if size < 0 else size,
+        )
+
+
+def load_snapshot(
+    runner: CommandRunner, *, db_path: Path | None = None, cache_path: Path | None = None
+) -> PacmanSnapshot | None:
+    """Return the parsed local database, reusing ``cache_path`` while the databases are unchanged.
+
+    The cache is invalidated by the mtimes in :func:`pacman_db.database_signature`. Returns
+    ``None`` when there is no local database to read (callers fall back to ``pacman``).
+    """
+    if not pacman_db.has_local_db(db_path):
+        return None
+    signature = pacman_db.database_signature(db_path)
+    if cache_path is not None:
+        cached = _read_snapshot(cache_path)
+        if cached is not None and cached.signature == signature:
+            return cached
+    local = pacman_db.load_local_db(db_path)
+    graph = DependencyGraph.from_local_db(local)
+    repo_map, foreign_packages = _repositories(runner, graph.names, db_path=db_path)
+    radii = graph.blast_radii()
+    # Columns straight from the desc records: no PackageInfo per installed package.
+    snapshot = PacmanSnapshot(signature=signature, explicit=graph.unrequired(explicit=True), orphans=graph.orphans())
+    for name in graph.names:
+        record = local[name]
+        installed = pacman_db.field(record, "INSTALLDATE")
+        size = pacman_db.field(record, "SIZE")
+        depends = record.get("DEPENDS", [])
+        snapshot.table.append_row(
+            name,
+            pacman_db.field(record, "VERSION"),
+            pacman_db.field(record, "DESC"),
+            repo=repo_map.get(name),
+            foreign=name in foreign_packages,
+            installed=int(installed) if installed.isdigit() else -1,
+            weight=radii[name],
+            dependency_count=len(depends),
+            size=int(size) if size.isdigit() else -1,
+        )
+        snapshot.depends.append(depends)
+        snapshot.optional_deps.append(record.get("OPTDEPENDS", []))
+    if cache_path is not None:
+        _write_snapshot(cache_path, snapshot)
+    return snapshot
+
+
+# PackageTable columns in the cache file, besides the two dependency-list columns.
+_CACHED_COLUMNS = ("names", "versions", "descriptions", "repos", "foreign", "installed", "weights", "dependency_counts", "sizes")
+
+
+def _read_snapshot(path: Path) -> PacmanSnapshot | None:
+    """The cached snapshot at ``path``, or ``None`` if it is missing, stale or not ours.
+
+    ``cadmu arch --sudo`` reads the cache as root, so a file written by anyone but the
+    current effective user is ignored rather than trusted.
+    """
+    try:
+        with path.open("rb") as fh:
+            if os.fstat(fh.fileno()).st_uid != os.geteuid():
+                return None
+            data = json.load(fh)
+        if data["version"] != CACHE_VERSION:
+            return None
+        columns = data["columns"]
+        table = PackageTable(
+            names=[sys.intern(str(name)) for name in columns["names"]],
+            versions=[str(version) for version in columns["versions"]],
+            descriptions=[str(description) for description in columns["descriptions"]],
+            repos=[sys.intern(str(repo)) for repo in columns["repos"]],
+            foreign=bytearray(columns["foreign"]),
+            installed=array("q", columns["installed"]),
+            weights=array("q", columns["weights"]),
+            dependency_counts=array("q", columns["dependency_counts"]),
+            sizes=array("q", columns["sizes"]),
+        )
+        depends = [[str(entry) for entry in entries] for entries in columns["depends"]]
+        optional_deps = [[str(entry) for entry in entries] for entries in columns["optional_deps"]]
+        lengths = {len(getattr(table, name)) for name in _CACHED_COLUMNS} | {len(depends), len(optional_deps)}
+        if len(lengths) > 1:
+            return None
+        return PacmanSnapshot(
+            signature=tuple((str(name), int(mtime)) for name, mtime in data["signature"]),
+            table=table,
+            depends=depends,
+            optional_deps=optional_deps,
+            explicit=[str(name) for name in data["explicit"]],
+            orphans=[str(name) for name in data["orphans"]],
+        )
+    except (OSError, KeyError, TypeError, ValueError, OverflowError):
+        return None
+
+
+def _write_snapshot(path: Path, snapshot: PacmanSnapshot) -> None:
+    columns: Dict[str, object] = {name: list(getattr(snapshot.table, name)) for name in _CACHED_COLUMNS}
+    columns["depends"] = snapshot.depends
+    columns["optional_deps"] = snapshot.optional_deps
+    payload = {
+        "version": snapshot.cache_version,
+        "signature": snapshot.signature,
+        "explicit": snapshot.explicit,
+        "orphans": snapshot.orphans,
+        "columns": columns,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, tmp = tempfile.mkstemp(prefix=path.name, dir=path.parent)
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh, separators=(",", ":"))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def get_explicit_packages(runner: CommandRunner, *, db_path: Path | None = None) -> List[str]:
+    if pacman_db.has_local_db(db_path):
+        return DependencyGraph.from_local_db(pacman_db.load_local_db(db_path)).unrequired(explicit=True)
+    return _list_packages(runner, "-Qet")
+
+
+def _list_packages(runner: CommandRunner, query: str) -> List[str]:
+    spec = CommandSpec(label=f"pacman {query}", command=["pacman", query], allow_missing=False)
     result = runner.execute(spec)
     if result.skipped:
         raise PacmanDataError(f"pacman unavailable: {result.reason}")
     if result.exit_code != 0:
-        raise PacmanDataError(result.stderr or "pacman -Qet failed")
+        raise PacmanDataError(result.stderr or f"pacman {query} failed")
     packages = []
     for line in result.stdout.splitlines():
         if not line.strip():
@@ -59,6 +241,30 @@ def _chunked(seq: Sequence[str], size: int) -> Iterable[List[str]]:
         yield list(seq[i : i + size])
 
 
+def chunk_size(packages: Sequence[str], *, jobs: int = QUERY_JOBS, arg_max: int | None = None) -> int:
+    """Packages per ``pacman`` invocation: an even split across ``jobs``, within the argv limit."""
+    if not packages:
+        return MIN_CHUNK_SIZE
+    # Every argument costs its bytes, a NUL terminator and an argv pointer.
+    per_package = max(len(name.encode()) for name in packages) + 1 + 8
+    fitting = max(1, _argument_budget(arg_max) // per_package)
+    even = math.ceil(len(packages) / max(1, jobs))
+    return min(fitting, max(MIN_CHUNK_SIZE, even))
+
+
+def _argument_budget(arg_max: int | None) -> int:
+    if arg_max is None:
+        try:
+            arg_max = os.sysconf("SC_ARG_MAX")
+        except (ValueError, OSError):
+            arg_max = FALLBACK_ARG_MAX
+    if arg_max <= 0:
+        arg_max = FALLBACK_ARG_MAX
+    environment = sum(len(key) + len(value) + 2 + 8 for key, value in os.environ.items())
+    # Keep half of what is left in reserve, as xargs does, for the command name and growth.
+    return max(2048, (arg_max - environment) // 2)
+
+
 def _parse_pacman_query(output: str) -> List[Dict[str, str]]:
     records: List[Dict[str, str]] = []
     current: Dict[str, str] = {}
@@ -101,6 +307,17 @@ def _parse_date(value: str | None) -> datetime | None:
     return None
 
 
+def _parse_size(value: str | None) -> int | None:
+    """``Installed Size`` from ``pacman -Qi``, e.g. ``1.50 MiB``, in bytes."""
+    if not value:
+        return None
+    number, _, unit = value.replace(",", ".").partition(" ")
+    try:
+        return int(float(number) * _SIZE_UNITS[unit.strip()])
+    except (KeyError, ValueError):
+        return None
+
+
 def _split_list(value: str | None) -> List[str]:
     if not value or value.lower() == "none":
         return []
@@ -113,13 +330,25 @@ def _split_list(value: str | None) -> List[str]:
     return [item for item in (p.replace("\n", " ") for p in items) if item and item.lower() != "none"]
 
 
-def get_package_infos(runner: CommandRunner, packages: Sequence[str]) -> List[PackageInfo]:
+def get_package_infos(
+    runner: CommandRunner, packages: Sequence[str], *, db_path: Path | None = None, jobs: int = QUERY_JOBS
+) -> List[PackageInfo]:
+    if pacman_db.has_local_db(db_path):
+        return _infos_from_local_db(runner, pacman_db.load_local_db(db_path), packages, db_path=db_path, jobs=jobs)
     infos: List[PackageInfo] = []
-    repo_map = _get_repository_map(runner, packages)
-    foreign_packages = set(_get_foreign_packages(runner))
-    for chunk in _chunked(list(packages), CHUNK_SIZE):
-        spec = CommandSpec(label="pacman -Qi", command=["pacman", "-Qi", *chunk], allow_missing=False)
-        result = runner.execute(spec)
+    chunks = list(_chunked(list(packages), chunk_size(packages, jobs=jobs)))
+    # The -Qi, -Si and -Qm queries are independent, so all of them share one pool.
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="cadmu-pacman") as pool:
+        info_results = [
+            pool.submit(runner.execute, CommandSpec(label="pacman -Qi", command=["pacman", "-Qi", *chunk], allow_missing=False))
+            for chunk in chunks
+        ]
+        repo_results = _submit_repository_queries(pool, runner, chunks)
+        foreign_result = pool.submit(_get_foreign_packages, runner)
+        repo_map = _repository_map(future.result() for future in repo_results)
+        foreign_packages = set(foreign_result.result())
+        results = [future.result() for future in info_results]
+    for chunk, result in zip(chunks, results):
         if result.skipped or result.exit_code != 0:
             raise PacmanDataError(result.stderr or f"pacman -Qi failed for chunk {chunk}")
         for record in _parse_pacman_query(result.stdout):
@@ -134,18 +363,88 @@ def get_package_infos(runner: CommandRunner, packages: Sequence[str]) -> List[Pa
                     optional_deps=_split_list(record.get("Optional Deps")),
                     repo=repo_map.get(name),
                     is_foreign=name in foreign_packages,
+                    installed_size=_parse_size(record.get("Installed Size")),
                 )
             )
     infos.sort(key=lambda info: info.name)
     return infos
 
 
-def _get_repository_map(runner: CommandRunner, packages: Sequence[str]) -> Dict[str, str]:
+def _infos_from_local_db(
+    runner: CommandRunner,
+    local: Dict[str, pacman_db.DescRecord],
+    packages: Sequence[str],
+    *,
+    db_path: Path | None = None,
+    graph: DependencyGraph | None = None,
+    radii: Dict[str, int] | None = None,
+    jobs: int = QUERY_JOBS,
+) -> List[PackageInfo]:
+    """``PackageInfo`` for ``packages`` from the parsed local database.
+
+    Blast radii come from ``radii`` when given, which :func:`load_snapshot` computes for
+    every package in one pass, and otherwise from ``graph`` one package at a time.
+    """
+    if radii is None:
+        graph = graph if graph is not None else DependencyGraph.from_local_db(local)
+        radii = {name: graph.blast_radius(name) for name in packages if name in graph.ids}
+    repo_map, foreign_packages = _repositories(runner, packages, db_path=db_path, jobs=jobs)
+    infos = [_info_from_desc(record, repo_map, foreign_packages) for record in pacman_db.select(local, packages)]
+    for info in infos:
+        info.blast_radius = radii[info.name]
+    infos.sort(key=lambda info: info.name)
+    return infos
+
+
+def _repositories(
+    runner: CommandRunner, packages: Sequence[str], *, db_path: Path | None = None, jobs: int = QUERY_JOBS
+) -> Tuple[Dict[str, str], set[str]]:
+    """Repository of each of ``packages`` and the set of foreign ones."""
+    if pacman_db.has_sync_db(db_path):
+        # pacman -Qm lists installed packages that no sync database knows about.
+        repo_map = pacman_db.repository_index(db_path)
+        return repo_map, {name for name in packages if name not in repo_map}
+    chunks = list(_chunked(list(packages), chunk_size(packages, jobs=jobs)))
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="cadmu-pacman") as pool:
+        repo_results = _submit_repository_queries(pool, runner, chunks)
+        foreign_result = pool.submit(_get_foreign_packages, runner)
+        repo_map = _repository_map(future.result() for future in repo_results)
+        foreign_packages = set(foreign_result.result())
+    return repo_map, foreign_packages
+
+
+def _info_from_desc(record: pacman_db.DescRecord, repo_map: Dict[str, str], foreign_packages: set[str]) -> PackageInfo:
+    name = pacman_db.field(record, "NAME")
+    installed = pacman_db.field(record, "INSTALLDATE")
+    size = pacman_db.field(record, "SIZE")
+    return PackageInfo(
+        name=name,
+        version=pacman_db.field(record, "VERSION"),
+        description=pacman_db.field(record, "DESC"),
+        install_date=datetime.fromtimestamp(int(installed), timezone.utc) if installed.isdigit() else None,
+        depends=list(record.get("DEPENDS", [])),
+        optional_deps=list(record.get("OPTDEPENDS", [])),
+        repo=repo_map.get(name),
+        is_foreign=name in foreign_packages,
+        installed_size=int(size) if size.isdigit() else None,
+    )
+
+
+def _submit_repository_queries(
+    pool: ThreadPoolExecutor, runner: CommandRunner, chunks: List[List[str]]
+) -> List[Future[CommandResult]]:
+    return [
+        pool.submit(runner.execute, CommandSpec(label="pacman -Si", command=["pacman", "-Si", *chunk], allow_missing=True))
+        for chunk in chunks
+    ]
+
+
+def _repository_map(results: Iterable[CommandResult]) -> Dict[str, str]:
     repo_map: Dict[str, str] = {}
-    for chunk in _chunked(list(packages), CHUNK_SIZE):
-        spec = CommandSpec(label="pacman -Si", command=["pacman", "-Si", *chunk], allow_missing=True)
-        result = runner.execute(spec)
-        if result.skipped or result.exit_code != 0:
+    for result in results:
+        # pacman -Si exits 1 when any name in the chunk is in no repository (an AUR
+        # package, say) but still prints every package it found.
+        if result.skipped:
             continue
         for record in _parse_pacman_query(result.stdout):
             name = record.get("Name")
@@ -168,9 +467,14 @@ def _get_foreign_packages(runner: CommandRunner) -> List[str]:
 
 
 def classify_stability(info: PackageInfo) -> str:
-    if info.is_foreign:
+    return _stability(info.repo or "", info.is_foreign)
+
+
+@lru_cache(maxsize=None)
+def _stability(repo: str, is_foreign: bool) -> str:
+    if is_foreign:
         return "AUR/External"
-    repo = (info.repo or "").lower()
+    repo = repo.lower()
     if repo == "core":
         return "Tier-0 (Core)"
     if repo == "extra":
@@ -183,7 +487,10 @@ def classify_stability(info: PackageInfo) -> str:
 
 
 def classify_difficulty(info: PackageInfo) -> str:
-    deps = info.dependency_count
+    return _difficulty(info.blast_radius if info.blast_radius is not None else info.dependency_count)
+
+
+def _difficulty(deps: int) -> str:
     if deps <= 2:
         return "Easy to replace"
     if deps <= 6:
@@ -194,7 +501,10 @@ def classify_difficulty(info: PackageInfo) -> str:
 
 
 def general_recommendation(info: PackageInfo) -> str:
-    stability = classify_stability(info)
+    return _general_recommendation(classify_stability(info))
+
+
+def _general_recommendation(stability: str) -> str:
     if stability.startswith("Tier-0"):
         return "Retain (system critical)"
     if stability.startswith("Tier-1"):
@@ -207,7 +517,10 @@ def general_recommendation(info: PackageInfo) -> str:
 
 
 def difficulty_recommendation(info: PackageInfo) -> str:
-    difficulty = classify_difficulty(info)
+    return _difficulty_recommendation(classify_difficulty(info))
+
+
+def _difficulty_recommendation(difficulty: str) -> str:
     if difficulty == "Easy to replace":
         return "Low-risk removal"
     if difficulty == "Moderate complexity":
@@ -218,7 +531,10 @@ def difficulty_recommendation(info: PackageInfo) -> str:
 
 
 def age_label(info: PackageInfo) -> str:
-    days = info.age_days
+    return _age_label(info.age_days)
+
+
+def _age_label(days: int | None) -> str:
     if days is None:
         return "Unknown"
     if days < 30:
@@ -230,44 +546,239 @@ def age_label(info: PackageInfo) -> str:
     return f"Legacy ({math.floor(days / 365)}y)"
 
 
-def collect_explicit_infos(runner: CommandRunner) -> List[PackageInfo]:
+@dataclass(slots=True)
+class PackageTable:
+    """Column-oriented package listing for bulk classification.
+
+    Each attribute is one list or ``array`` instead of a ``PackageInfo`` per row: repository
+    names and package names are interned, install dates are epoch seconds (``-1`` when
+    unknown) and the difficulty input is a single integer per package. The bulk
+    classifiers evaluate each distinct repository once.
+    """
+
+    names: List[str] = field(default_factory=list)
+    versions: List[str] = field(default_factory=list)
+    descriptions: List[str] = field(default_factory=list)
+    repos: List[str] = field(default_factory=list)
+    foreign: bytearray = field(default_factory=bytearray)
+    installed: array = field(default_factory=lambda: array("q"))
+    # blast radius when known, otherwise the direct dependency count
+    weights: array = field(default_factory=lambda: array("q"))
+    dependency_counts: array = field(default_factory=lambda: array("q"))
+    sizes: array = field(default_factory=lambda: array("q"))
+
+    @classmethod
+    def from_infos(cls, infos: Iterable[PackageInfo]) -> "PackageTable":
+        table = cls()
+        for info in infos:
+            table.append(info)
+        return table
+
+    def append(self, info: PackageInfo) -> None:
+        self.append_row(
+            info.name,
+            info.version,
+            info.description,
+            repo=info.repo,
+            foreign=info.is_foreign,
+            installed=int(info.install_date.timestamp()) if info.install_date else -1,
+            weight=info.blast_radius if info.blast_radius is not None else info.dependency_count,
+            dependency_count=info.dependency_count,
+            size=info.installed_size if info.installed_size is not None else -1,
+        )
+
+    def append_row(
+        self,
+        name: str,
+        version: str,
+        description: str,
+        *,
+        repo: str | None,
+        foreign: bool,
+        installed: int,
+        weight: int,
+        dependency_count: int,
+        size: int,
+    ) -> None:
+        """Append one package from its column values; unknown dates and sizes are ``-1``."""
+        self.names.append(sys.intern(name))
+        self.versions.append(version)
+        self.descriptions.append(description)
+        self.repos.append(sys.intern(repo or ""))
+        self.foreign.append(foreign)
+        self.installed.append(installed)
+        self.weights.append(weight)
+        self.dependency_counts.append(dependency_count)
+        self.sizes.append(size)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def head(self, limit: int | None) -> "PackageTable":
+        if not limit or limit >= len(self):
+            return self
+        return self.take(range(limit))
+
+    def take(self, rows: Iterable[int]) -> "PackageTable":
+        rows = list(rows)
+        return PackageTable(
+            names=[self.names[row] for row in rows],
+            versions=[self.versions[row] for row in rows],
+            descriptions=[self.descriptions[row] for row in rows],
+            repos=[self.repos[row] for row in rows],
+            foreign=bytearray(self.foreign[row] for row in rows),
+            installed=array("q", (self.installed[row] for row in rows)),
+            weights=array("q", (self.weights[row] for row in rows)),
+            dependency_counts=array("q", (self.dependency_counts[row] for row in rows)),
+            sizes=array("q", (self.sizes[row] for row in rows)),
+        )
+
+    def stabilities(self) -> List[str]:
+        return [_stability(repo, bool(foreign)) for repo, foreign in zip(self.repos, self.foreign)]
+
+    def difficulties(self) -> List[str]:
+        return [_difficulty(weight) for weight in self.weights]
+
+    def age_days(self, now: datetime | None = None) -> List[int | None]:
+        current = int((now or datetime.now(timezone.utc)).timestamp())
+        return [None if stamp < 0 else max(0, (current - stamp) // 86400) for stamp in self.installed]
+
+    def age_labels(self, now: datetime | None = None) -> List[str]:
+        return [_age_label(days) for days in self.age_days(now)]
+
+    def oldest(self, limit: int = 5) -> List[int]:
+        """Row indices of the ``limit`` earliest installs, oldest first."""
+        return self.top("age", limit)
+
+    def top(self, field: str, limit: int | None = None) -> List[int]:
+        """Row indices ordered by ``field`` (one of :data:`SORT_FIELDS`).
+
+        ``name`` sorts ascending; the other fields put the largest value (oldest install,
+        most dependencies, biggest impact or size) first. With ``limit`` only that many
+        rows are selected, with a heap rather than a full sort, and rows with an unknown
+        value are left out; without it they follow the known rows in table order.
+        """
+        column, descending = self._sort_column(field)
+        if field == "name":
+            known, unknown = list(range(len(self))), []
+        else:
+            known = [row for row, value in enumerate(column) if value >= 0]
+            unknown = [row for row, value in enumerate(column) if value < 0]
+        if limit is not None:
+            select = heapq.nlargest if descending else heapq.nsmallest
+            return select(limit, known, key=column.__getitem__)
+        return sorted(known, key=column.__getitem__, reverse=descending) + unknown
+
+    def _sort_column(self, field: str) -> Tuple[Sequence, bool]:
+        if field == "name":
+            return self.names, False
+        if field == "age":
+            return self.installed, False
+        if field == "dependencies":
+            return self.dependency_counts, True
+        if field == "impact":
+            return self.weights, True
+        if field == "size":
+            return self.sizes, True
+        raise ValueError(f"Unknown sort field {field!r}; expected one of {', '.join(SORT_FIELDS)}")
+
+
+def collect_explicit_infos(
+    runner: CommandRunner, *, db_path: Path | None = None, cache_path: Path | None = None
+) -> List[PackageInfo]:
+    if cache_path is not None:
+        snapshot = load_snapshot(runner, db_path=db_path, cache_path=cache_path)
+        if snapshot is not None:
+            return snapshot.infos(snapshot.explicit)
+    elif pacman_db.has_local_db(db_path):
+        local = pacman_db.load_local_db(db_path)
+        graph = DependencyGraph.from_local_db(local)
+        return _infos_from_local_db(runner, local, graph.unrequired(explicit=True), db_path=db_path, graph=graph)
     packages = get_explicit_packages(runner)
     if not packages:
         return []
     return get_package_infos(runner, packages)
 
 
+def collect_installed_table(
+    runner: CommandRunner, *, db_path: Path | None = None, cache_path: Path | None = None
+) -> PackageTable:
+    """Every installed package, explicit or not, as a :class:`PackageTable`.
+
+    With a local database this is the snapshot's own table, not a copy of it.
+    """
+    snapshot = load_snapshot(runner, db_path=db_path, cache_path=cache_path)
+    if snapshot is not None:
+        return snapshot.table
+    packages = _list_packages(runner, "-Q")
+    return PackageTable.from_infos(get_package_infos(runner, packages) if packages else [])
+
+
 def build_explicit_package_table(
     runner: CommandRunner,
     *,
     include_recommendations: bool = False,
     limit: int | None = None,
     infos: List[PackageInfo] | None = None,
+    table: PackageTable | None = None,
+    empty_message: str = NO_EXPLICIT_PACKAGES,
 ) -> str:
-    infos = infos if infos is not None else collect_explicit_infos(runner)
-    if not infos:
-        return "No explicitly installed packages found."
-    if limit:
-        infos = infos[:limit]
+    return "\n".join(
+        iter_explicit_package_table(
+            runner,
+            include_recommendations=include_recommendations,
+            limit=limit,
+            infos=infos,
+            table=table,
+            empty_message=empty_message,
+        )
+    )
+
+
+def iter_explicit_package_table(
+    runner: CommandRunner,
+    *,
+    include_recommendations: bool = False,
+    limit: int | None = None,
+    infos: List[PackageInfo] | None = None,
+    table: PackageTable | None = None,
+    width: int | None = None,
+    empty_message: str = NO_EXPLICIT_PACKAGES,
+) -> Iterator[str]:
+    """Lines of the package table, produced lazily; ``width`` narrows it to fit a terminal.
+
+    ``empty_message`` is the only line when there are no packages to list.
+    """
+    if table is None:
+        table = PackageTable.from_infos(infos if infos is not None else collect_explicit_infos(runner))
+    if not len(table):
+        yield empty_message
+        return
+    table = table.head(limit)
 
     headers = ["Package", "Version", "Description"]
+    columns: List[Sequence[str]] = [
+        table.names,
+        table.versions,
+        [description or "(no description)" for description in table.descriptions],
+    ]
     if include_recommendations:
         headers.extend(["General", "Difficulty", "Stability", "Age"])
-    rows: List[List[str]] = []
-    for info in infos:
-        row = [info.name, info.version, info.description or "(no description)"]
-        if include_recommendations:
-            row.extend([
-                general_recommendation(info),
-                difficulty_recommendation(info),
-                classify_stability(info),
-                age_label(info),
-            ])
-        rows.append(row)
-    return render_table(headers, rows, max_widths={"Description": 50})
+        stabilities = table.stabilities()
+        difficulties = table.difficulties()
+        columns.extend([
+            [_general_recommendation(stability) for stability in stabilities],
+            [_difficulty_recommendation(difficulty) for difficulty in difficulties],
+            stabilities,
+            table.age_labels(),
+        ])
+    yield from iter_table(headers, ColumnRows(columns), max_widths={"Description": 50}, width=width)
 
 
 def top_oldest_packages(infos: Sequence[PackageInfo], *, limit: int = 5) -> List[PackageInfo]:
-    aged = [info for info in infos if info.age_days is not None]
-    aged.sort(key=lambda info: info.age_days or 0, reverse=True)
-    return aged[:limit]
+    return order_infos(infos, "age", limit=limit)
+
+
+def order_infos(infos: Sequence[PackageInfo], field: str, *, limit: int | None = None) -> List[PackageInfo]:
+    """``infos`` ordered by ``field`` (see :meth:`PackageTable.top`)."""
+    return [infos[row] for row in PackageTable.from_infos(infos).top(field, limit)]
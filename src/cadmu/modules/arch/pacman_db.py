@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import os
+import re
+import tarfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from cadmu.core import reporting
+
+# The local database is one directory per installed package holding a ``desc`` file of
+# ``%FIELD%`` headers followed by one value per line; reading it directly avoids spawning
+# pacman and parsing its localised, human-formatted output.
+PACMAN_DB_PATH = Path("/var/lib/pacman")
+PACMAN_CONF = Path("/etc/pacman.conf")
+
+# Strips a version constraint from a dependency such as ``glibc>=2.38`` or ``sh=5.2``.
+_CONSTRAINT = re.compile(r"[<>=].*$")
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+DescRecord = Dict[str, List[str]]
+
+# Sync database path -> (mtime_ns, package names); see read_sync_names.
+_SYNC_CACHE: Dict[Path, Tuple[int, List[str]]] = {}
+
+
+def resolve_db_path(db_path: Path | None = None) -> Path:
+    return db_path if db_path is not None else PACMAN_DB_PATH
+
+
+def has_local_db(db_path: Path | None = None) -> bool:
+    return (resolve_db_path(db_path) / "local").is_dir()
+
+
+def parse_desc(text: str) -> DescRecord:
+    record: DescRecord = {}
+    values: List[str] | None = None
+    for line in text.splitlines():
+        if not line:
+            values = None
+        elif len(line) > 2 and line[0] == "%" and line[-1] == "%":
+            values = record.setdefault(line[1:-1], [])
+        elif values is not None:
+            values.append(line)
+    return record
+
+
+def field(record: DescRecord, name: str) -> str:
+    values = record.get(name)
+    return values[0] if values else ""
+
+
+def load_local_db(db_path: Path | None = None) -> Dict[str, DescRecord]:
+    """Parse every ``local/*/desc`` file, keyed by package name."""
+    packages: Dict[str, DescRecord] = {}
+    local = resolve_db_path(db_path) / "local"
+    for entry in local.iterdir():
+        desc = entry / "desc"
+        try:
+            record = parse_desc(desc.read_text(encoding="utf-8", errors="replace"))
+        except (NotADirectoryError, FileNotFoundError):
+            continue
+        name = field(record, "NAME")
+        if name:
+            packages[name] = record
+    return packages
+
+
+def dependency_name(dependency: str) -> str:
+    return _CONSTRAINT.sub("", dependency.split(":", 1)[0]).strip()
+
+
+def provider_index(packages: Dict[str, DescRecord]) -> Dict[str, List[str]]:
+    """Every installed package providing each ``%PROVIDES%`` name."""
+    providers: Dict[str, List[str]] = {}
+    for name, record in packages.items():
+        for provided in record.get("PROVIDES", []):
+            names = providers.setdefault(dependency_name(provided), [])
+            if name not in names:
+                names.append(name)
+    return providers
+
+
+def satisfiers(target: str, packages: Dict[str, DescRecord], providers: Dict[str, List[str]]) -> List[str]:
+    """Installed packages satisfying a dependency on ``target``.
+
+    Like pacman, that is the package of that name and every package providing it.
+    """
+    found = [target] if target in packages else []
+    found.extend(name for name in providers.get(target, []) if name != target)
+    return found
+
+
+def select(packages: Dict[str, DescRecord], names: Iterable[str]) -> List[DescRecord]:
+    return [packages[name] for name in names if name in packages]
+
+
+def has_sync_db(db_path: Path | None = None) -> bool:
+    return bool(sync_db_files(db_path))
+
+
+def sync_db_files(db_path: Path | None = None, *, conf: Path | None = None) -> List[Path]:
+    """``sync/*.db`` files, in ``pacman.conf`` repository order when it can be read."""
+    sync = resolve_db_path(db_path) / "sync"
+    if not sync.is_dir():
+        return []
+    files = {path.name[: -len(".db")]: path for path in sync.glob("*.db") if path.is_file()}
+    order = [repo for repo in configured_repositories(conf) if repo in files]
+    return [files[repo] for repo in order] + [files[repo] for repo in sorted(files) if repo not in order]
+
+
+def configured_repositories(conf: Path | None = None) -> List[str]:
+    try:
+        text = (conf or PACMAN_CONF).read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return []
+    repos: List[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("[") and line.endswith("]") and line != "[options]":
+            repos.append(line[1:-1])
+    return repos
+
+
+def read_sync_names(path: Path) -> List[str]:
+    """Package names in one sync database, read in a single streaming pass.
+
+    Results are cached per file and reused until the database's mtime changes.
+    """
+    mtime = path.stat().st_mtime_ns
+    cached = _SYNC_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    names: List[str] = []
+    with _open_sync_db(path) as archive:
+        for member in archive:
+            directory, _, leaf = member.name.rpartition("/")
+            if leaf == "desc":
+                names.append(package_name(directory))
+    _SYNC_CACHE[path] = (mtime, names)
+    return names
+
+
+def repository_index(db_path: Path | None = None, *, conf: Path | None = None) -> Dict[str, str]:
+    """Map every package name in the sync databases to its repository (first repo wins)."""
+    index: Dict[str, str] = {}
+    for path in sync_db_files(db_path, conf=conf):
+        repo = path.name[: -len(".db")]
+        for name in read_sync_names(path):
+            index.setdefault(name, repo)
+    return index
+
+
+def package_name(entry: str) -> str:
+    """``python-3.12.1-1`` -> ``python`` (pkgver and pkgrel never contain ``-``)."""
+    return entry.rsplit("-", 2)[0]
+
+
+@contextmanager
+def _open_sync_db(path: Path) -> Iterator[tarfile.TarFile]:
+    with path.open("rb") as fh:
+        magic = fh.read(4)
+    if magic != _ZSTD_MAGIC:
+        with tarfile.open(path, mode="r|*") as archive:
+            yield archive
+        return
+    # tarfile only learned zstd in Python 3.14; reuse the report decompressors instead.
+    with reporting.open_compressed(path, "zstd") as stream, tarfile.open(fileobj=stream, mode="r|") as archive:
+        yield archive
+
+
+def database_signature(db_path: Path | None = None, *, conf: Path | None = None) -> Tuple[Tuple[str, int], ...]:
+    """``(path, mtime_ns)`` of everything parsed package data depends on.
+
+    Installing, upgrading or removing a package renames entries in ``local``, which bumps
+    the directory's mtime; ``pacman -Sy`` rewrites the sync databases. ``pacman -D
+    --asdeps``/``--asexplicit`` only rewrites one ``desc`` in place, so the newest ``desc``
+    mtime is part of the signature as well.
+    """
+    local = resolve_db_path(db_path) / "local"
+    paths = [local, conf or PACMAN_CONF, *sync_db_files(db_path, conf=conf)]
+    signature = []
+    for path in paths:
+        try:
+            signature.append((str(path), path.stat().st_mtime_ns))
+        except OSError:
+            signature.append((str(path), 0))
+    signature.insert(1, (str(local / "*" / "desc"), newest_desc_mtime(local)))
+    return tuple(signature)
+
+
+def newest_desc_mtime(local: Path) -> int:
+    """Largest ``mtime_ns`` among the ``desc`` files in ``local``, ``0`` when there are none."""
+    newest = 0
+    try:
+        entries = os.scandir(local)
+    except OSError:
+        return 0
+    with entries:
+        for entry in entries:
+            try:
+                newest = max(newest, os.stat(os.path.join(entry.path, "desc")).st_mtime_ns)
+            except OSError:
+                continue
+    return newest
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
 import re
-import shutil
-from dataclasses import dataclass
+import sqlite3
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Iterable, List
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
 
-from cadmu.core.runner import CommandRunner, CommandSpec
+from cadmu.core import mounts
+from cadmu.core.diskusage import DiskUsage, format_size
+from cadmu.core.runner import CommandResult, CommandRunner, CommandSpec
+from cadmu.core.timeseries import MetricStore, linear_fit
 from cadmu.core.system import is_arch, supports_systemd
+from cadmu.core.usage_index import scan_indexed
+from cadmu.modules.arch import pacman as arch_pacman
 
 
 @dataclass(slots=True)
@@ -17,58 +25,396 @@ class AuditFinding:
     summary: str
     remediation: str | None = None
     detail: str | None = None
+    # Identifies the condition across runs when the summary embeds changing numbers;
+    # see finding_key.
+    key: str | None = None
+
+
+def finding_key(finding: AuditFinding) -> str:
+    return finding.key or f"{finding.category}:{finding.summary}"
+
+
+@dataclass(slots=True)
+class MetricSample:
+    """A measurement a check yields alongside its findings, for trend forecasting.
+
+    Values are fractions; ``limit`` is where the resource runs out (1.0 for "full",
+    0.0 for "none left") and ``description`` completes "... in ~5 hours".
+    """
+
+    name: str
+    value: float
+    limit: float
+    description: str
+    remediation: str | None = None
 
 
 @dataclass(slots=True)
 class AuditOptions:
     home: Path
     os_release: dict[str, str]
+    # When set, a nearly full home gets its largest directories from this disk-usage index.
+    usage_index: Path | None = None
+    # When set, orphaned packages come from the cached local pacman database instead of ``pacman -Qdt``.
+    pacman_cache: Path | None = None
+    # Mount table to audit; /proc/self/mountinfo when unset.
+    mountinfo: Path | None = None
+    # When set, metric samples are appended to this time-series store and forecast.
+    metrics: Path | None = None
+
+
+DEFAULT_CHECK_TIMEOUT = 30.0
+# Budget for listing the largest home directories on a nearly full home; see
+# _largest_home_dirs. Well inside the storage check's own deadline.
+HOME_DETAIL_TIMEOUT = 10.0
+# How often `cadmu audit --watch` re-runs a check unless it sets its own interval.
+DEFAULT_CHECK_INTERVAL = 300.0
+# Forecasts fit a line through the last week of samples and are reported when the
+# resource runs out within three days (critical within one). Short or noisy histories
+# are ignored rather than extrapolated.
+FORECAST_WINDOW = 7 * 86400.0
+FORECAST_HORIZON = 72 * 3600.0
+FORECAST_CRITICAL = 24 * 3600.0
+FORECAST_MIN_SAMPLES = 5
+FORECAST_MIN_SPAN = 3600.0
+FORECAST_MIN_FIT = 0.5
+
+
+@dataclass(slots=True)
+class AuditCheck:
+    name: str
+    category: str
+    run: Callable[[CommandRunner, AuditOptions], Iterable[AuditFinding | MetricSample]]
+    timeout: float = DEFAULT_CHECK_TIMEOUT
+    # Skip the check unless this returns True for the audited system.
+    applies: Callable[[AuditOptions], bool] | None = None
+    interval: float = DEFAULT_CHECK_INTERVAL
+
+
+@dataclass(slots=True)
+class CheckTiming:
+    name: str
+    status: str  # "ok", "timeout" or "error"
+    duration: float
+
+
+@dataclass(slots=True)
+class AuditReport:
+    findings: List[AuditFinding] = field(default_factory=list)
+    timings: List[CheckTiming] = field(default_factory=list)
 
 
 def run_audit(runner: CommandRunner, options: AuditOptions) -> List[AuditFinding]:
+    return run_audit_checks(runner, options).findings
+
+
+def run_audit_checks(
+    runner: CommandRunner,
+    options: AuditOptions,
+    *,
+    checks: Sequence[AuditCheck] | None = None,
+    timeout: float | None = None,
+) -> AuditReport:
+    """Run every applicable check concurrently, each against its own deadline.
+
+    A check that raises, or is still running at its deadline, is reported as a warning
+    finding instead of failing or stalling the audit; commands it starts are capped at
+    the time left before the deadline. ``timeout`` overrides every check's own limit.
+    Findings and timings keep the order of ``checks``.
+    """
+    report = AuditReport()
+    for run in start_checks(runner, options, applicable_checks(options, checks), timeout=timeout):
+        findings, timing = run.result()
+        report.findings.extend(findings)
+        report.timings.append(timing)
+    return report
+
+
+def applicable_checks(options: AuditOptions, checks: Sequence[AuditCheck] | None = None) -> List[AuditCheck]:
+    return [
+        check
+        for check in (AUDIT_CHECKS if checks is None else checks)
+        if check.applies is None or check.applies(options)
+    ]
+
+
+def start_checks(
+    runner: CommandRunner,
+    options: AuditOptions,
+    checks: Sequence[AuditCheck],
+    *,
+    timeout: float | None = None,
+    on_done: Callable[[], None] | None = None,
+) -> List[CheckRun]:
+    """Start ``checks`` in the background; collect each with :meth:`CheckRun.result`.
+
+    ``on_done`` is called from each check's thread when it finishes.
+    """
+    return [
+        CheckRun(check, runner, options, timeout if timeout is not None else check.timeout, on_done=on_done)
+        for check in checks
+    ]
+
+
+class CheckRun:
+    """One check on a daemon thread, so a hung check can be abandoned at its deadline."""
+
+    def __init__(
+        self,
+        check: AuditCheck,
+        runner: CommandRunner,
+        options: AuditOptions,
+        timeout: float,
+        *,
+        on_done: Callable[[], None] | None = None,
+    ) -> None:
+        self.check = check
+        self.on_done = on_done
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.findings: List[AuditFinding] = []
+        self.error: Exception | None = None
+        self.finished: float | None = None
+        self.thread = threading.Thread(
+            target=self._run,
+            args=(_DeadlineRunner(runner, self.deadline), options),
+            name=f"cadmu-audit-{check.name}",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def _run(self, runner: CommandRunner, options: AuditOptions) -> None:
+        try:
+            results = list(self.check.run(runner, options))
+            self.findings = [result for result in results if isinstance(result, AuditFinding)]
+            samples = [result for result in results if isinstance(result, MetricSample)]
+            if samples and options.metrics is not None:
+                self.findings.extend(forecast_findings(options.metrics, samples, self.check.category))
+        except Exception as exc:  # reported as a finding below
+            self.error = exc
+        finally:
+            self.finished = time.monotonic()
+            if self.on_done is not None:
+                self.on_done()
+
+    @property
+    def running(self) -> bool:
+        return self.finished is None
+
+    def result(self) -> Tuple[List[AuditFinding], CheckTiming]:
+        self.thread.join(max(0.0, self.deadline - time.monotonic()))
+        name = self.check.name
+        if self.finished is None or isinstance(self.error, subprocess.TimeoutExpired):
+            timing = CheckTiming(name, "timeout", time.monotonic() - self.started)
+            return [self._finding(f"{name} check timed out after {self.timeout:g}s", "timeout")], timing
+        timing = CheckTiming(name, "ok" if self.error is None else "error", self.finished - self.started)
+        if self.error is not None:
+            return [self._finding(f"{name} check failed: {self.error}", "error")], timing
+        return self.findings, timing
+
+    def _finding(self, summary: str, status: str) -> AuditFinding:
+        return AuditFinding(
+            severity="warning",
+            category=self.check.category,
+            summary=summary,
+            remediation="Re-run `cadmu audit`; if it persists, run the underlying command by hand",
+            key=f"check:{self.check.name}:{status}",
+        )
+
+
+def forecast_findings(
+    path: Path, samples: Sequence[MetricSample], category: str, *, now: float | None = None
+) -> List[AuditFinding]:
+    """Record ``samples`` in the store at ``path`` and forecast when each runs out.
+
+    A store that cannot be opened or written only costs the forecasts, not the findings of
+    the check that produced the samples.
+    """
+    now = time.time() if now is None else now
     findings: List[AuditFinding] = []
-    findings.extend(_check_storage(options))
-    findings.extend(_check_memory())
-    findings.extend(_check_service_failures(runner))
-    if is_arch(options.os_release):
-        findings.extend(_check_arch_packages(runner))
-        findings.extend(_check_btrfs_usage(runner))
+    try:
+        with MetricStore(path) as store:
+            store.record({sample.name: sample.value for sample in samples}, at=now)
+            histories = [store.series(sample.name, since=now - FORECAST_WINDOW) for sample in samples]
+    except (OSError, sqlite3.Error):
+        return findings
+    for sample, history in zip(samples, histories):
+        trend = linear_fit(history)
+        if trend is None or trend.samples < FORECAST_MIN_SAMPLES or trend.span < FORECAST_MIN_SPAN:
+            continue
+        if trend.r_squared < FORECAST_MIN_FIT:
+            continue
+        seconds = trend.time_to(sample.limit)
+        if seconds is None or seconds > FORECAST_HORIZON:
+            continue
+        findings.append(
+            AuditFinding(
+                severity="critical" if seconds <= FORECAST_CRITICAL else "warning",
+                category=category,
+                summary=f"{sample.description} in ~{_format_duration(seconds)}",
+                key=f"forecast:{sample.name}",
+                remediation=sample.remediation,
+                detail=(
+                    f"now {trend.value:.0%}, changing {trend.slope * 3600:+.2%} per hour "
+                    f"(linear fit over {trend.samples} samples, {_format_duration(trend.span)})"
+                ),
+            )
+        )
     return findings
 
 
-def _check_storage(options: AuditOptions) -> Iterable[AuditFinding]:
-    issues: List[AuditFinding] = []
-    for mountpoint, label, warn, crit in [
-        (Path("/"), "root", 0.75, 0.90),
-        (Path("/boot"), "boot", 0.70, 0.85),
-        (options.home, "home", 0.80, 0.92),
-    ]:
-        if not mountpoint.exists():
-            continue
-        usage = shutil.disk_usage(mountpoint)
-        percent = usage.used / usage.total if usage.total else 0.0
-        if percent >= crit:
+def _format_duration(seconds: float) -> str:
+    if seconds < 2 * 3600:
+        return f"{max(1, round(seconds / 60))} minutes"
+    if seconds < 2 * 86400:
+        return f"{round(seconds / 3600)} hours"
+    return f"{round(seconds / 86400)} days"
+
+
+class _DeadlineRunner:
+    """Wraps a runner so no command outlives the deadline of the check that started it."""
+
+    def __init__(self, runner: CommandRunner, deadline: float) -> None:
+        self._runner = runner
+        self._deadline = deadline
+
+    def execute(self, spec: CommandSpec) -> CommandResult:
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(CommandRunner.format_command(spec.command), 0)
+        if spec.timeout is None or spec.timeout > remaining:
+            spec = replace(spec, timeout=remaining)
+        return self._runner.execute(spec)
+
+    def __getattr__(self, name: str):
+        return getattr(self._runner, name)
+
+
+# Mount point -> (label, warn, critical); every other disk mount uses the home thresholds.
+STORAGE_THRESHOLDS = {Path("/"): ("root", 0.75, 0.90), Path("/boot"): ("boot", 0.70, 0.85)}
+HOME_THRESHOLDS = (0.80, 0.92)
+INODE_THRESHOLDS = (0.85, 0.95)
+# Home path -> scan thread that has not returned yet; see _largest_home_dirs.
+_HOME_SCANS: Dict[str, threading.Thread] = {}
+_HOME_SCANS_LOCK = threading.Lock()
+
+
+def _check_storage(options: AuditOptions) -> Iterable[AuditFinding | MetricSample]:
+    table = mounts.read_mounts(options.mountinfo)
+    if not table:
+        # No /proc (or an unreadable override): fall back to the well-known mount points.
+        table = mounts.fallback_mounts([Path("/"), Path("/boot"), options.home])
+    home_mount = mounts.mount_for(options.home, table)
+    issues: List[AuditFinding | MetricSample] = []
+    home_full: AuditFinding | None = None
+    # / and home are always audited, whatever they are mounted as (overlay in a container).
+    keep = [Path("/")] + ([home_mount.mountpoint] if home_mount is not None else [])
+    for usage in mounts.statvfs_mounts(mounts.disk_mounts(table, keep=keep)):
+        mountpoint = usage.mount.mountpoint
+        holds_home = home_mount is not None and home_mount.device == usage.mount.device
+        label, warn, crit = STORAGE_THRESHOLDS.get(mountpoint, (str(mountpoint), *HOME_THRESHOLDS))
+        if holds_home and mountpoint not in STORAGE_THRESHOLDS:
+            label = "home"
+        if usage.error == "timed out":
             issues.append(
                 AuditFinding(
-                    severity="critical",
+                    severity="warning",
                     category="storage",
-                    summary=f"{label} filesystem {percent:.0%} full",
-                    remediation=f"Free space on {mountpoint} (remove caches, grow partition, or move data)",
+                    summary=f"{mountpoint} ({usage.mount.fstype}) is not responding",
+                    key=f"storage:{label}:stale",
+                    remediation=f"Check {usage.mount.source or mountpoint}, or detach it with `umount -l {mountpoint}`",
                 )
             )
+        if usage.error is not None:
+            continue
+        percent = usage.fraction_used
+        issues.append(
+            MetricSample(
+                f"disk:{label}",
+                percent,
+                1.0,
+                f"{label} filesystem will be full",
+                remediation=f"Free space on {mountpoint} before it fills up",
+            )
+        )
+        full: AuditFinding | None = None
+        if percent >= crit:
+            full = AuditFinding(
+                severity="critical",
+                category="storage",
+                summary=f"{label} filesystem {percent:.0%} full",
+                key=f"storage:{label}",
+                remediation=f"Free space on {mountpoint} (remove caches, grow partition, or move data)",
+            )
         elif percent >= warn:
+            full = AuditFinding(
+                severity="warning",
+                category="storage",
+                summary=f"{label} filesystem {percent:.0%} full",
+                key=f"storage:{label}",
+                remediation=f"Consider cleaning old files on {mountpoint}",
+            )
+        if full is not None:
+            issues.append(full)
+            if holds_home:
+                home_full = full
+        inodes = usage.inode_fraction_used
+        if inodes >= INODE_THRESHOLDS[0]:
             issues.append(
                 AuditFinding(
-                    severity="warning",
+                    severity="critical" if inodes >= INODE_THRESHOLDS[1] else "warning",
                     category="storage",
-                    summary=f"{label} filesystem {percent:.0%} full",
-                    remediation=f"Consider cleaning old files on {mountpoint}",
+                    summary=f"{label} filesystem has used {inodes:.0%} of its inodes",
+                    key=f"inodes:{label}",
+                    remediation=f"Remove small files on {mountpoint} (caches, mail spools, build trees); "
+                    "free space does not help once inodes run out",
                 )
             )
+    # The findings are complete at this point; the detail is a bonus within its own budget.
+    if home_full is not None:
+        home_full.detail = _largest_home_dirs(options)
     return issues
 
 
-def _check_memory() -> Iterable[AuditFinding]:
+def _largest_home_dirs(options: AuditOptions, limit: int = 5) -> str | None:
+    """The biggest directories under home, or ``None`` if not known within ``HOME_DETAIL_TIMEOUT``.
+
+    The scan runs on a daemon thread. One that outlives the budget is left to finish and
+    fill the usage index for the next audit, and no second scan is started meanwhile.
+    Any error reading home or the index (a locked database, say) just drops the detail.
+    """
+    if options.usage_index is None:
+        return None
+    key = str(options.home)
+    found: List[DiskUsage] = []
+    with _HOME_SCANS_LOCK:
+        if key in _HOME_SCANS:
+            return None
+        thread = threading.Thread(
+            target=_scan_home, args=(options.home, options.usage_index, found), name="cadmu-audit-home", daemon=True
+        )
+        _HOME_SCANS[key] = thread
+    thread.start()
+    thread.join(HOME_DETAIL_TIMEOUT)
+    if not found:
+        return None
+    usage = found[0]
+    largest = [(path, size) for path, size in usage.largest_directories(limit + 1) if path != key]
+    return "largest directories: " + ", ".join(f"{path} ({format_size(size)})" for path, size in largest[:limit])
+
+
+def _scan_home(home: Path, index: Path, found: List[DiskUsage]) -> None:
+    try:
+        found.append(scan_indexed(home, index))
+    except (OSError, sqlite3.Error):
+        pass
+    finally:
+        with _HOME_SCANS_LOCK:
+            _HOME_SCANS.pop(str(home), None)
+
+
+def _check_memory() -> Iterable[AuditFinding | MetricSample]:
     meminfo = Path("/proc/meminfo")
     if not meminfo.exists():
         return []
@@ -80,11 +426,31 @@ def _check_memory() -> Iterable[AuditFinding]:
             values[key] = int(rest)
         except ValueError:
             continue
-    findings: List[AuditFinding] = []
+    findings: List[AuditFinding | MetricSample] = []
     mem_total = values.get("MemTotal", 0)
     mem_available = values.get("MemAvailable", 0)
     swap_free = values.get("SwapFree", 0)
     swap_total = values.get("SwapTotal", 0)
+    if mem_total:
+        findings.append(
+            MetricSample(
+                "memory:available",
+                mem_available / mem_total,
+                0.0,
+                "available RAM will run out",
+                remediation="Look for a process whose memory keeps growing (`ps aux --sort=-rss`)",
+            )
+        )
+    if swap_total:
+        findings.append(
+            MetricSample(
+                "memory:swap",
+                1 - swap_free / swap_total,
+                1.0,
+                "swap will be full",
+                remediation="Look for a process whose memory keeps growing (`ps aux --sort=-rss`)",
+            )
+        )
     if mem_total and mem_available / mem_total < 0.20:
         findings.append(
             AuditFinding(
@@ -139,40 +505,46 @@ def _check_service_failures(runner: CommandRunner) -> Iterable[AuditFinding]:
     return []
 
 
-def _check_arch_packages(runner: CommandRunner) -> Iterable[AuditFinding]:
+def _check_arch_packages(runner: CommandRunner, options: AuditOptions) -> Iterable[AuditFinding]:
     findings: List[AuditFinding] = []
-    for label, command, summary in [
-        ("pacman -Qdt", ["pacman", "-Qdt"], "Orphaned packages present"),
-        ("pacman -Qu", ["pacman", "-Qu"], "Pending Arch updates"),
-    ]:
-        spec = CommandSpec(label=label, command=command, allow_missing=True)
-        result = runner.execute(spec)
-        if result.skipped:
-            continue
-        if label.endswith("-Qdt") and result.stdout.strip():
-            findings.append(
-                AuditFinding(
-                    severity="info",
-                    category="packages",
-                    summary=summary,
-                    remediation="Consider `sudo pacman -Rns $(pacman -Qdtq)` after reviewing the list",
-                    detail=result.stdout,
-                )
+    orphans = _orphaned_packages(runner, options)
+    if orphans.strip():
+        findings.append(
+            AuditFinding(
+                severity="info",
+                category="packages",
+                summary="Orphaned packages present",
+                remediation="Consider `sudo pacman -Rns $(pacman -Qdtq)` after reviewing the list",
+                detail=orphans,
             )
-        if label.endswith("-Qu") and result.stdout.strip():
-            count = len(result.stdout.splitlines())
-            findings.append(
-                AuditFinding(
-                    severity="info",
-                    category="packages",
-                    summary=f"{count} Arch package(s) can be updated",
-                    remediation="Run `sudo pacman -Syu` when ready",
-                )
+        )
+    # Pending updates need version comparison against the sync databases, so pacman stays in charge.
+    result = runner.execute(CommandSpec(label="pacman -Qu", command=["pacman", "-Qu"], allow_missing=True))
+    if not result.skipped and result.stdout.strip():
+        count = len(result.stdout.splitlines())
+        findings.append(
+            AuditFinding(
+                severity="info",
+                category="packages",
+                summary=f"{count} Arch package(s) can be updated",
+                key="packages:updates",
+                remediation="Run `sudo pacman -Syu` when ready",
             )
+        )
     return findings
 
 
-def _check_btrfs_usage(runner: CommandRunner) -> Iterable[AuditFinding]:
+def _orphaned_packages(runner: CommandRunner, options: AuditOptions) -> str:
+    """``pacman -Qdt`` output, read from the package cache when one is configured."""
+    if options.pacman_cache is not None:
+        snapshot = arch_pacman.load_snapshot(runner, cache_path=options.pacman_cache)
+        if snapshot is not None:
+            return "".join(f"{info.name} {info.version}\n" for info in snapshot.infos(snapshot.orphans))
+    result = runner.execute(CommandSpec(label="pacman -Qdt", command=["pacman", "-Qdt"], allow_missing=True))
+    return "" if result.skipped else result.stdout
+
+
+def _check_btrfs_usage(runner: CommandRunner) -> Iterable[AuditFinding | MetricSample]:
     spec = CommandSpec(label="btrfs usage", command=["btrfs", "filesystem", "usage", "/"], allow_missing=True, sudo=True)
     result = runner.execute(spec)
     if result.skipped or result.exit_code != 0 or not result.stdout:
@@ -181,18 +553,48 @@ def _check_btrfs_usage(runner: CommandRunner) -> Iterable[AuditFinding]:
     if not match:
         return []
     pct = float(match.group("pct")) / 100.0
+    sample = MetricSample(
+        "btrfs:data",
+        pct,
+        1.0,
+        "btrfs data allocation will be full",
+        remediation="Run `sudo btrfs balance start -dusage=75 /` before the data chunks run out",
+    )
     if pct >= 0.90:
         severity = "critical"
     elif pct >= 0.80:
         severity = "warning"
     else:
-        return []
+        return [sample]
     return [
+        sample,
         AuditFinding(
             severity=severity,
             category="storage",
             summary=f"Btrfs data allocation at {pct:.0%}",
+            key="storage:btrfs-data",
             remediation="Run `sudo btrfs balance start -dusage=75 -musage=50 /` to reclaim space",
             detail=result.stdout,
         )
     ]
+
+
+def _on_arch(options: AuditOptions) -> bool:
+    return is_arch(options.os_release)
+
+
+AUDIT_CHECKS: List[AuditCheck] = [
+    # statvfs and /proc/meminfo are cheap enough to sample every few seconds; the home
+    # scan for the storage detail has its own shorter budget (HOME_DETAIL_TIMEOUT).
+    AuditCheck("storage", "storage", lambda runner, options: _check_storage(options), interval=5.0),
+    AuditCheck("memory", "memory", lambda runner, options: _check_memory(), timeout=5.0, interval=1.0),
+    AuditCheck("services", "services", lambda runner, options: _check_service_failures(runner), interval=60.0),
+    AuditCheck("arch packages", "packages", _check_arch_packages, timeout=60.0, applies=_on_arch, interval=900.0),
+    AuditCheck("btrfs usage", "storage", lambda runner, options: _check_btrfs_usage(runner), applies=_on_arch),
+]
+
+
+def register_check(check: AuditCheck) -> AuditCheck:
+    """Add ``check`` to the checks every audit runs."""
+    AUDIT_CHECKS.append(check)
+    return check
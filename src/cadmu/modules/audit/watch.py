@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Sequence
+
+from cadmu.core.runner import CommandRunner
+from cadmu.modules.audit.base import (
+    AuditCheck,
+    AuditFinding,
+    AuditOptions,
+    CheckRun,
+    applicable_checks,
+    finding_key,
+    start_checks,
+)
+
+
+@dataclass(slots=True)
+class WatchEvent:
+    kind: str  # "raised", "changed" (severity moved) or "cleared"
+    check: str
+    finding: AuditFinding
+    at: datetime
+
+
+class AuditWatcher:
+    """Re-runs audit checks on their own cadences and reports only what changed.
+
+    A check is started again ``interval`` seconds after its previous run started, unless
+    that run (or one abandoned at its deadline) is still going, and is collected once it
+    finishes or its deadline passes, so a slow check never holds up the fast ones. The
+    findings of each check's latest run are kept in memory and compared by
+    :func:`finding_key`: a finding is emitted when it appears, when its severity changes
+    and when it disappears, but not while it persists. A run that times out or fails
+    leaves the previous findings standing and only raises its timeout or error finding.
+    """
+
+    def __init__(
+        self,
+        runner: CommandRunner,
+        options: AuditOptions,
+        *,
+        checks: Sequence[AuditCheck] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.runner = runner
+        self.options = options
+        self.checks = applicable_checks(options, checks)
+        self.clock = clock
+        self._due: Dict[str, float] = {check.name: 0.0 for check in self.checks}
+        self._state: Dict[str, Dict[str, AuditFinding]] = {check.name: {} for check in self.checks}
+        self._runs: Dict[str, CheckRun] = {}
+        self._collected: Dict[str, CheckRun] = {}
+        self._wake = threading.Event()
+
+    def poll(self, *, wait: bool = False) -> List[WatchEvent]:
+        """Start the checks that are due and return transitions from the runs that ended.
+
+        With ``wait`` every started run is collected, waiting up to its deadline.
+        """
+        now = self.clock()
+        due = [check for check in self.checks if self._due[check.name] <= now and not self._busy(check.name)]
+        for check in due:
+            self._due[check.name] = now + check.interval
+        for run in start_checks(self.runner, self.options, due, on_done=self._wake.set):
+            self._runs[run.check.name] = run
+        events: List[WatchEvent] = []
+        for name, run in list(self._runs.items()):
+            if not wait and run.running and time.monotonic() < run.deadline:
+                continue
+            findings, timing = run.result()
+            del self._runs[name]
+            self._collected[name] = run
+            events.extend(self._transitions(name, findings, timing.status))
+        return events
+
+    def seconds_until_due(self) -> float:
+        now = self.clock()
+        waits = [when - now for name, when in self._due.items() if not self._busy(name)]
+        # Check deadlines are on the monotonic clock (see CheckRun).
+        waits.extend(run.deadline - time.monotonic() for run in self._runs.values())
+        return max(0.0, min(waits, default=1.0))
+
+    def watch(self, emit: Callable[[WatchEvent], None], *, stop: threading.Event | None = None) -> None:
+        """Poll until ``stop`` is set, passing every transition to ``emit``."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self._wake.clear()
+            for event in self.poll():
+                emit(event)
+            self._wake.wait(self.seconds_until_due())
+
+    def _busy(self, name: str) -> bool:
+        # A run abandoned at its deadline may still be going; never stack a second one.
+        return name in self._runs or (name in self._collected and self._collected[name].running)
+
+    def _transitions(self, check: str, findings: List[AuditFinding], status: str = "ok") -> List[WatchEvent]:
+        at = datetime.now(timezone.utc)
+        previous = self._state[check]
+        current = {finding_key(finding): finding for finding in findings}
+        if status != "ok":
+            # A run that timed out or failed says nothing about the check's own findings:
+            # they stay as they were and only the check:<name>:<status> finding moves.
+            own = f"check:{check}:"
+            kept = {key: finding for key, finding in previous.items() if not key.startswith(own)}
+            current = {**kept, **current}
+        events: List[WatchEvent] = []
+        for key, finding in current.items():
+            before = previous.get(key)
+            if before is None:
+                events.append(WatchEvent("raised", check, finding, at))
+            elif before.severity != finding.severity:
+                events.append(WatchEvent("changed", check, finding, at))
+        for key, finding in previous.items():
+            if key not in current:
+                events.append(WatchEvent("cleared", check, finding, at))
+        self._state[check] = current
+        return events
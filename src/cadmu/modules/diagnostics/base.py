@@ -1,20 +1,39 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from functools import partial
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from typing import Iterable, List, Mapping, Sequence, Union
 
-from cadmu.core.runner import CommandRunner, CommandSpec
-from cadmu.core.reporting import ReportWriter
+from cadmu.core.collectors import CollectorSpec, file_collector, lsmod_collector, run_collector, uptime_collector
+from cadmu.core.diskusage import SharedUsageScan
+from cadmu.core.report_index import IndexedCommand, baseline_key
+from cadmu.core.usage_index import scan_indexed
+from cadmu.core.runner import CommandResult, CommandRunner, CommandSpec
+from cadmu.core.reporting import CommandBlock, ReportWriter
 from cadmu.core.system import supports_systemd
 from cadmu.modules.diagnostics import dependencies
 
+# Diagnostics mix subprocess commands with in-process file collectors.
+DiagnosticSpec = Union[CommandSpec, CollectorSpec]
+
 
 @dataclass(slots=True)
 class DiagnosticsOptions:
     home: Path
     include_optional: bool = True
     include_arch: bool = True
+    jobs: int = 1
+    capture_limit: int = 1024 * 1024
+    # Delta mode: digest every output and reference unchanged ones in ``baseline_report``.
+    delta: bool = False
+    baseline_report: str | None = None
+    baseline: Mapping[str, IndexedCommand] | None = None
+    # SQLite index that lets repeat $HOME disk-usage scans skip unchanged directories.
+    usage_index: Path | None = None
+    full_scan: bool = False
 
 
 def _cmd(
@@ -42,17 +61,24 @@ def _home_env(home: Path) -> dict[str, str]:
     return {"HOME": str(home)}
 
 
-def _baseline_sections(options: DiagnosticsOptions) -> List[tuple[str, Iterable[CommandSpec]]]:
-    env_home = _home_env(options.home)
-    sections: List[tuple[str, Iterable[CommandSpec]]] = [
+def _baseline_sections(options: DiagnosticsOptions) -> List[tuple[str, Iterable[DiagnosticSpec]]]:
+    # One walk of $HOME feeds all three disk-usage summaries. It crosses into mounts like
+    # the du -sh dot/home dirs listings did; the du -x listing leaves them out again.
+    scanner = (
+        partial(scan_indexed, index=options.usage_index, full=options.full_scan, one_file_system=False)
+        if options.usage_index
+        else None
+    )
+    home_usage = SharedUsageScan(options.home, one_file_system=False, scanner=scanner)
+    sections: List[tuple[str, Iterable[DiagnosticSpec]]] = [
         (
             "Operating System Basics",
             [
                 _cmd("uname", ["uname", "-a"]),
-                _cmd("os-release", ["cat", "/etc/os-release"]),
+                file_collector("os-release", "/etc/os-release"),
                 _cmd("hostnamectl", ["hostnamectl"], optional=True),
                 _cmd("timedatectl", ["timedatectl"], allow_missing=True, optional=True),
-                _cmd("uptime", ["uptime"]),
+                uptime_collector(),
                 _cmd("who", ["who", "-a"]),
                 _cmd("last", ["last", "-n", "20"], allow_missing=True),
             ],
@@ -75,15 +101,15 @@ def _baseline_sections(options: DiagnosticsOptions) -> List[tuple[str, Iterable[
                 _cmd("dmidecode", ["dmidecode"], sudo=True, allow_missing=True, optional=True),
                 _cmd("lsblk", ["lsblk", "-o", "NAME,FSTYPE,LABEL,UUID,SIZE,FSUSED,FSUSE%,MOUNTPOINT"]),
                 _cmd("lsmem", ["lsmem"], allow_missing=True),
-                _cmd("meminfo", ["cat", "/proc/meminfo"]),
+                file_collector("meminfo", "/proc/meminfo"),
                 _cmd("sensors", ["sensors"], allow_missing=True),
             ],
         ),
         (
             "Kernel & Modules",
             [
-                _cmd("cmdline", ["cat", "/proc/cmdline"]),
-                _cmd("lsmod", ["lsmod"]),
+                file_collector("cmdline", "/proc/cmdline"),
+                lsmod_collector(),
                 _cmd("dmesg tail", ["bash", "-lc", "dmesg | tail -n 200"], allow_missing=True, optional=True),
             ],
         ),
@@ -94,9 +120,24 @@ def _baseline_sections(options: DiagnosticsOptions) -> List[tuple[str, Iterable[
                 _cmd("df -i", ["df", "-i"]),
                 _cmd("mount", ["mount"]),
                 _cmd("findmnt", ["findmnt", "-A"], allow_missing=True),
-                _cmd("du home top", ["bash", "-lc", "du -xh $HOME | sort -h | tail"], allow_missing=True, env=env_home, optional=True),
-                _cmd("dot dirs", ["bash", "-lc", "du -sh $HOME/.* 2>/dev/null | sort -hr"], allow_missing=True, env=env_home, optional=True),
-                _cmd("home dirs", ["bash", "-lc", "du -sh $HOME/* 2>/dev/null | sort -hr"], allow_missing=True, env=env_home, optional=True),
+                CollectorSpec(
+                    "du home top",
+                    ["bash", "-lc", "du -xh $HOME | sort -h | tail"],
+                    home_usage.largest_directories_text,
+                    optional=True,
+                ),
+                CollectorSpec(
+                    "dot dirs",
+                    ["bash", "-lc", "du -sh $HOME/.* 2>/dev/null | sort -hr"],
+                    partial(home_usage.top_level_text, hidden=True),
+                    optional=True,
+                ),
+                CollectorSpec(
+                    "home dirs",
+                    ["bash", "-lc", "du -sh $HOME/* 2>/dev/null | sort -hr"],
+                    partial(home_usage.top_level_text, hidden=False),
+                    optional=True,
+                ),
             ],
         ),
         (
@@ -119,8 +160,8 @@ def _baseline_sections(options: DiagnosticsOptions) -> List[tuple[str, Iterable[
                 _cmd("resolvectl", ["resolvectl", "status"], allow_missing=True, optional=True),
                 _cmd("iptables", ["iptables", "-S"], sudo=True, allow_missing=True, optional=True),
                 _cmd("nft", ["nft", "list", "ruleset"], sudo=True, allow_missing=True, optional=True),
-                _cmd("hosts", ["cat", "/etc/hosts"]),
-                _cmd("resolv.conf", ["cat", "/etc/resolv.conf"]),
+                file_collector("hosts", "/etc/hosts"),
+                file_collector("resolv.conf", "/etc/resolv.conf"),
             ],
         ),
         (
@@ -172,7 +213,7 @@ def _baseline_sections(options: DiagnosticsOptions) -> List[tuple[str, Iterable[
     return sections
 
 
-def run_diagnostics(writer: ReportWriter, runner: CommandRunner, options: DiagnosticsOptions, *, arch_sections: Iterable[tuple[str, Iterable[CommandSpec]]] | None = None) -> None:
+def run_diagnostics(writer: ReportWriter, runner: CommandRunner, options: DiagnosticsOptions, *, arch_sections: Iterable[tuple[str, Iterable[DiagnosticSpec]]] | None = None) -> None:
     writer.section("Dependency Verification")
     writer.note(dependencies.summarise(dependencies.GENERAL_DEPENDENCIES))
     if options.include_arch:
@@ -180,35 +221,153 @@ def run_diagnostics(writer: ReportWriter, runner: CommandRunner, options: Diagno
         writer.note(dependencies.summarise(dependencies.ARCH_DEPENDENCIES))
     writer.note("")
 
-    for section, commands in _baseline_sections(options):
-        writer.section(section)
-        _run_commands(writer, runner, commands, include_optional=options.include_optional)
-
+    sections = list(_baseline_sections(options))
     if options.include_arch and arch_sections:
-        for section, commands in arch_sections:
+        sections.extend(arch_sections)
+    sections = [(section, [_with_capture_limit(spec, options) for spec in commands]) for section, commands in sections]
+
+    delta = _Delta(options.baseline_report, options.baseline or {}) if options.delta else None
+    if options.jobs > 1:
+        _run_sections_parallel(
+            writer, runner, sections, include_optional=options.include_optional, jobs=options.jobs, delta=delta
+        )
+    else:
+        for section, commands in sections:
             writer.section(section)
-            _run_commands(writer, runner, commands, include_optional=options.include_optional)
+            _run_commands(writer, runner, commands, include_optional=options.include_optional, delta=delta)
 
     writer.section("Custom Notes")
     writer.note("Add additional manual observations below as needed.")
 
 
+def _with_capture_limit(spec: DiagnosticSpec, options: DiagnosticsOptions) -> DiagnosticSpec:
+    if isinstance(spec, CollectorSpec) or spec.capture_limit is not None:
+        return spec
+    return replace(spec, capture_limit=options.capture_limit)
+
+
 def _run_commands(
     writer: ReportWriter,
     runner: CommandRunner,
-    commands: Iterable[CommandSpec],
+    commands: Iterable[DiagnosticSpec],
     *,
     include_optional: bool,
+    delta: _Delta | None = None,
 ) -> None:
     for spec in commands:
         if spec.optional and not include_optional:
-            writer.write_command(spec.command, "(skipped optional command)")
+            _write_optional_skip(writer, spec)
             continue
-        result = runner.execute(spec)
-        if result.skipped:
-            writer.write_command(spec.command, f"(skipped) {result.reason or ''}".strip())
+        if isinstance(spec, CollectorSpec):
+            _write_result(writer, spec, run_collector(spec), delta)
+            continue
+        if delta is not None:
+            # Output must be digested before deciding whether to write it.
+            _write_result(writer, spec, runner.execute(spec), delta)
             continue
-        output_blocks = [result.stdout]
-        if result.stderr:
-            output_blocks.append(f"[stderr]\n{result.stderr}")
-        writer.write_command(spec.command, "\n".join(block for block in output_blocks if block))
+        # stdout goes straight from the pipe into the report; only stderr is buffered.
+        with writer.command_block(spec.command, label=spec.label) as block:
+            _write_result_body(block, runner.execute(spec, stdout_sink=block))
+
+
+def _run_sections_parallel(
+    writer: ReportWriter,
+    runner: CommandRunner,
+    sections: Sequence[tuple[str, Iterable[DiagnosticSpec]]],
+    *,
+    include_optional: bool,
+    jobs: int,
+    delta: _Delta | None = None,
+) -> None:
+    """Execute every command on a bounded pool while writing results in declaration order.
+
+    All specs are submitted up front so slow commands overlap; the writer then waits on
+    each future in turn, which keeps the report layout identical to a sequential run.
+    """
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="cadmu-diag") as pool:
+        pending = [
+            (
+                section,
+                [(spec, pool.submit(_command_result, runner, spec, include_optional=include_optional)) for spec in commands],
+            )
+            for section, commands in sections
+        ]
+        for section, futures in pending:
+            writer.section(section)
+            for spec, future in futures:
+                _write_result(writer, spec, future.result(), delta)
+
+
+def _command_result(runner: CommandRunner, spec: DiagnosticSpec, *, include_optional: bool) -> CommandResult | None:
+    if spec.optional and not include_optional:
+        return None
+    if isinstance(spec, CollectorSpec):
+        return run_collector(spec)
+    return runner.execute(spec)
+
+
+@dataclass(slots=True)
+class _Delta:
+    report: str | None
+    entries: Mapping[str, IndexedCommand]
+
+
+def _write_result(writer: ReportWriter, spec: DiagnosticSpec, result: CommandResult | None, delta: _Delta | None = None) -> None:
+    if result is None:
+        _write_optional_skip(writer, spec)
+        return
+    with writer.command_block(spec.command, label=spec.label) as block:
+        if delta is not None and not result.skipped:
+            block.digest = _result_digest(result)
+            previous = delta.entries.get(baseline_key(writer.current_section, block.display))
+            if delta.report and previous is not None and previous.digest == block.digest:
+                if block.snapshotting:
+                    # The snapshot must hold this run's output, not whatever the newest
+                    # manifest happened to record.
+                    with block.snapshot_only():
+                        _write_result_body(block, result)
+                else:
+                    block.record_result(result)
+                    result.close()
+                block.source_report, block.source_offset, block.source_length = previous.resolved_source(delta.report)
+                block.feed(f"(unchanged since {block.source_report})")
+                return
+        _write_result_body(block, result)
+
+
+def _result_digest(result: CommandResult) -> str:
+    digest = hashlib.sha256(f"{result.exit_code}\0".encode())
+    for capture, text in ((result.stdout_capture, result.stdout), (result.stderr_capture, result.stderr)):
+        if capture is not None:
+            for chunk in capture.iter_bytes():
+                digest.update(chunk)
+        else:
+            digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _write_optional_skip(writer: ReportWriter, spec: DiagnosticSpec) -> None:
+    with writer.command_block(spec.command, label=spec.label) as block:
+        block.skipped = True
+        block.reason = "optional commands disabled"
+        block.feed("(skipped optional command)")
+
+
+def _write_result_body(block: CommandBlock, result: CommandResult) -> None:
+    block.record_result(result)
+    try:
+        if result.skipped:
+            block.feed(f"(skipped) {result.reason or ''}")
+            return
+        if result.stdout_capture is not None:
+            for chunk in result.stdout_capture.iter_text():
+                block.feed(chunk)
+        elif result.stdout:
+            block.feed(result.stdout)
+        if result.stderr_capture is not None:
+            block.write_stderr(result.stderr_capture.iter_text())
+        elif result.stderr:
+            block.write_stderr([result.stderr])
+    finally:
+        result.close()
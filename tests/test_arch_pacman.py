@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import io
+import os
+import tarfile
+import threading
+from datetime import datetime, timezone
+
 import pytest
 
 from cadmu.core.runner import CommandResult, CommandSpec
-from cadmu.modules.arch import pacman
+from cadmu.modules.arch import pacman, pacman_db
 
 
 class StubRunner:
@@ -27,6 +33,12 @@ class StubRunner:
         )
 
 
+@pytest.fixture(autouse=True)
+def no_host_pacman_db(tmp_path, monkeypatch):
+    # Keep the subprocess-parsing tests independent of the machine's /var/lib/pacman.
+    monkeypatch.setattr(pacman_db, "PACMAN_DB_PATH", tmp_path / "no-pacman-db")
+
+
 @pytest.fixture()
 def sample_runner():
     qi_output = """Name            : python\nVersion         : 3.12.1-1\nDescription     : High-level scripting language\nDepends On      : expat  bzip2  gdbm  util-linux\nOptional Deps   : sqlite: database support\nInstall Date    : Mon 01 Jan 2024 10:00:00 AM -0500\n\nName            : aurhelper\nVersion         : 1.0.0-1\nDescription     : Example AUR package\nDepends On      : base  git\nOptional Deps   : None\nInstall Date    : Mon 01 Jan 2023 09:00:00 AM -0500\n"""
@@ -71,3 +83,252 @@ def test_top_oldest_packages(sample_runner):
     assert oldest[0].name == "aurhelper"
     # Age label should treat aurhelper as legacy (>1 year)
     assert pacman.age_label(oldest[0]).startswith("Legacy")
+
+
+def _write_desc(local, name, version, fields):
+    entry = local / f"{name}-{version}"
+    entry.mkdir(parents=True)
+    lines = [f"%NAME%\n{name}\n", f"%VERSION%\n{version}\n"]
+    lines.extend(f"%{key}%\n" + "\n".join(values) + "\n" for key, values in fields.items())
+    (entry / "desc").write_text("\n".join(lines))
+
+
+@pytest.fixture()
+def local_db(tmp_path):
+    db = tmp_path / "pacman"
+    local = db / "local"
+    _write_desc(local, "python", "3.12.1-1", {
+        "DESC": ["High-level scripting language"],
+        "INSTALLDATE": ["1704121200"],
+        "SIZE": ["52428800"],
+        "DEPENDS": ["expat", "bzip2", "gdbm", "libxcrypt>=4.4"],
+        "OPTDEPENDS": ["sqlite: database support"],
+    })
+    _write_desc(local, "aurhelper", "1.0.0-1", {"DESC": ["Example AUR package"], "INSTALLDATE": ["1672581600"], "DEPENDS": ["sh"]})
+    _write_desc(local, "bash", "5.2-1", {"INSTALLDATE": ["1600000000"], "PROVIDES": ["sh=5.2"]})
+    _write_desc(local, "expat", "2.5-1", {"REASON": ["1"], "INSTALLDATE": ["1600000000"]})
+    _write_desc(local, "sqlite", "3.45-1", {"INSTALLDATE": ["1600000000"]})
+    (local / "ALPM_DB_VERSION").write_text("9\n")
+    return db
+
+
+def test_local_db_is_read_without_pacman_qi(local_db):
+    runner = StubRunner({
+        ("pacman", "-Si", "aurhelper", "python"): {"stdout": "Repository      : extra\nName            : python\n\n"},
+        ("pacman", "-Qm"): {"stdout": "aurhelper 1.0.0-1\n"},
+    })
+    # bash provides "sh" for aurhelper and sqlite is an optional dependency of python, so
+    # neither is "unrequired"; expat is a dependency install.
+    assert pacman.get_explicit_packages(runner, db_path=local_db) == ["aurhelper", "python"]  # type: ignore[arg-type]
+    infos = pacman.collect_explicit_infos(runner, db_path=local_db)  # type: ignore[arg-type]
+    python_info, aur_info = sorted(infos, key=lambda info: info.name, reverse=True)
+    assert python_info.name == "python"
+    assert python_info.repo == "extra"
+    assert python_info.depends == ["expat", "bzip2", "gdbm", "libxcrypt>=4.4"]
+    assert python_info.optional_deps == ["sqlite: database support"]
+    assert python_info.install_date is not None and python_info.install_date.isoformat() == "2024-01-01T15:00:00+00:00"
+    assert aur_info.is_foreign is True
+    assert pacman.top_oldest_packages(infos, limit=1)[0].name == "aurhelper"
+    # Removing python takes its dependency-only install expat with it.
+    assert python_info.blast_radius == 1
+    assert python_info.installed_size == 50 * 2**20
+    assert pacman.classify_difficulty(python_info) == "Easy to replace"
+
+
+def _write_sync_db(path, packages, compression="gz"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(path, f"w:{compression}" if compression else "w") as archive:
+        for entry in packages:
+            data = f"%NAME%\n{entry.rsplit('-', 2)[0]}\n".encode()
+            info = tarfile.TarInfo(f"{entry}/desc")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def test_sync_databases_map_repositories_without_pacman_si(local_db, tmp_path, monkeypatch):
+    conf = tmp_path / "pacman.conf"
+    conf.write_text("[options]\nHoldPkg = pacman\n\n[testing]\nInclude = x\n\n[extra]\n[core]\n")
+    monkeypatch.setattr(pacman_db, "PACMAN_CONF", conf)
+    _write_sync_db(local_db / "sync" / "core.db", ["bash-5.2-1", "python-3.11.0-1"])
+    _write_sync_db(local_db / "sync" / "extra.db", ["python-3.12.1-1", "lib32-gcc-libs-13.2.1-3"], compression=None)
+
+    index = pacman_db.repository_index(local_db)
+    # pacman.conf order decides which repository wins; "testing" has no database.
+    assert index == {"python": "extra", "lib32-gcc-libs": "extra", "bash": "core"}
+
+    runner = StubRunner({})  # any pacman subprocess call would come back skipped
+    infos = {info.name: info for info in pacman.collect_explicit_infos(runner, db_path=local_db)}  # type: ignore[arg-type]
+    assert infos["python"].repo == "extra"
+    assert infos["aurhelper"].is_foreign is True
+    assert infos["python"].is_foreign is False
+
+
+def test_sync_names_are_cached_until_the_database_changes(tmp_path, monkeypatch):
+    path = tmp_path / "sync" / "core.db"
+    _write_sync_db(path, ["bash-5.2-1"])
+    assert pacman_db.read_sync_names(path) == ["bash"]
+    with monkeypatch.context() as patched:
+        patched.setattr(pacman_db, "_open_sync_db", lambda path: pytest.fail("cache miss"))
+        assert pacman_db.read_sync_names(path) == ["bash"]
+    _write_sync_db(path, ["bash-5.2-1", "zsh-5.9-1"])
+    os.utime(path, ns=(1, 1))
+    assert pacman_db.read_sync_names(path) == ["bash", "zsh"]
+
+
+def test_snapshot_cache_is_reused_until_the_local_db_changes(local_db, tmp_path, monkeypatch):
+    _write_sync_db(local_db / "sync" / "extra.db", ["python-3.12.1-1", "sqlite-3.45-1", "bash-5.2-1", "expat-2.5-1"])
+    cache = tmp_path / "cache" / "pacman.json"
+    runner = StubRunner({})
+    infos = pacman.collect_explicit_infos(runner, db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert [info.name for info in infos] == ["aurhelper", "python"]
+    snapshot = pacman.load_snapshot(runner, db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert snapshot is not None and snapshot.orphans == []
+    assert snapshot.table.names == ["aurhelper", "bash", "expat", "python", "sqlite"]
+
+    with monkeypatch.context() as patched:
+        patched.setattr(pacman_db, "load_local_db", lambda db_path=None: pytest.fail("cache miss"))
+        assert pacman.collect_explicit_infos(runner, db_path=local_db, cache_path=cache) == infos  # type: ignore[arg-type]
+
+    # Removing python leaves expat as an orphaned dependency.
+    for entry in (local_db / "local" / "python-3.12.1-1").iterdir():
+        entry.unlink()
+    (local_db / "local" / "python-3.12.1-1").rmdir()
+    os.utime(local_db / "local", ns=(1, 1))
+    snapshot = pacman.load_snapshot(runner, db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert snapshot is not None and snapshot.explicit == ["aurhelper", "sqlite"]
+    assert snapshot.orphans == ["expat"]
+
+
+def test_snapshot_cache_notices_a_desc_rewritten_in_place(local_db, tmp_path):
+    cache = tmp_path / "pacman.json"
+    snapshot = pacman.load_snapshot(StubRunner({}), db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert snapshot is not None and snapshot.explicit == ["aurhelper", "python"]
+    local = local_db / "local"
+    before = os.stat(local).st_mtime_ns
+    # pacman -D --asdeps python: only python's desc changes, the directory does not.
+    desc = local / "python-3.12.1-1" / "desc"
+    desc.write_text(desc.read_text() + "%REASON%\n1\n\n")
+    os.utime(desc, ns=(before + 10**9, before + 10**9))
+    os.utime(local, ns=(before, before))
+    snapshot = pacman.load_snapshot(StubRunner({}), db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert snapshot is not None and snapshot.explicit == ["aurhelper"]
+
+
+def test_corrupt_snapshot_cache_is_rebuilt(local_db, tmp_path):
+    cache = tmp_path / "pacman.json"
+    cache.write_bytes(b"not json")
+    snapshot = pacman.load_snapshot(StubRunner({}), db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert snapshot is not None and snapshot.explicit == ["aurhelper", "python"]
+    assert pacman._read_snapshot(cache) == snapshot
+
+
+def test_snapshot_cache_owned_by_another_user_is_ignored(local_db, tmp_path, monkeypatch):
+    cache = tmp_path / "pacman.json"
+    snapshot = pacman.load_snapshot(StubRunner({}), db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert pacman._read_snapshot(cache) == snapshot
+    monkeypatch.setattr(pacman.os, "geteuid", lambda: os.stat(cache).st_uid + 1)
+    assert pacman._read_snapshot(cache) is None
+
+
+def test_repository_map_keeps_packages_found_in_a_failed_chunk(sample_runner):
+    sample_runner.responses[("pacman", "-Si", "python", "aurhelper")] = {
+        "stdout": "Repository      : extra\nName            : python\n\n",
+        "stderr": "error: package 'aurhelper' was not found\n",
+        "exit_code": 1,
+    }
+    infos = pacman.collect_explicit_infos(sample_runner)  # type: ignore[arg-type]
+    assert {info.name: info.repo for info in infos} == {"aurhelper": None, "python": "extra"}
+
+
+def test_chunk_size_spreads_packages_across_workers_within_arg_max():
+    names = [f"package-{index:03}" for index in range(200)]
+    assert pacman.chunk_size(names[:2], jobs=4) == pacman.MIN_CHUNK_SIZE
+    assert pacman.chunk_size(names, jobs=4, arg_max=2**21) == 50
+    # With no room left after the environment, chunks shrink to fit the 2 KiB floor.
+    assert pacman.chunk_size(["x" * 100] * 50, jobs=1, arg_max=1) == 2048 // 109
+
+
+class BarrierRunner(StubRunner):
+    """Blocks every call until the -Qi, -Si and -Qm queries are all in flight."""
+
+    def __init__(self, responses):
+        super().__init__(responses)
+        self.barrier = threading.Barrier(3, timeout=5)
+
+    def execute(self, spec: CommandSpec) -> CommandResult:
+        self.barrier.wait()
+        return super().execute(spec)
+
+
+def test_pacman_query_phases_run_concurrently(sample_runner):
+    runner = BarrierRunner(sample_runner.responses)
+    infos = pacman.get_package_infos(runner, ["python", "aurhelper"], jobs=3)  # type: ignore[arg-type]
+    assert [(info.name, info.repo, info.is_foreign) for info in infos] == [
+        ("aurhelper", None, True),
+        ("python", "extra", False),
+    ]
+
+
+def test_package_table_classifies_in_bulk(sample_runner):
+    infos = pacman.collect_explicit_infos(sample_runner)  # type: ignore[arg-type]
+    table = pacman.PackageTable.from_infos(infos)
+    assert table.names == [info.name for info in infos]
+    assert table.stabilities() == [pacman.classify_stability(info) for info in infos]
+    assert table.difficulties() == [pacman.classify_difficulty(info) for info in infos]
+    assert table.age_labels() == [pacman.age_label(info) for info in infos]
+    assert [table.names[index] for index in table.oldest(limit=1)] == ["aurhelper"]
+    assert table.head(1).names == ["aurhelper"]
+
+
+def test_installed_table_lists_dependency_installs(local_db, tmp_path):
+    cache = tmp_path / "pacman.json"
+    table = pacman.collect_installed_table(StubRunner({}), db_path=local_db, cache_path=cache)  # type: ignore[arg-type]
+    assert table.names == ["aurhelper", "bash", "expat", "python", "sqlite"]
+    assert "expat" in pacman.build_explicit_package_table(StubRunner({}), table=table)  # type: ignore[arg-type]
+    # Built from the desc records, the table matches one built from the PackageInfo view.
+    snapshot = pacman._read_snapshot(cache)
+    assert snapshot is not None and snapshot.table == table
+    assert pacman.PackageTable.from_infos(snapshot.infos(table.names)) == table
+    empty = pacman.build_explicit_package_table(
+        StubRunner({}), table=pacman.PackageTable(), empty_message=pacman.NO_INSTALLED_PACKAGES  # type: ignore[arg-type]
+    )
+    assert empty == "No installed packages found."
+
+
+def _info(name, *, year=None, depends=(), size=None):
+    return pacman.PackageInfo(
+        name=name,
+        version="1-1",
+        description="",
+        install_date=datetime(year, 1, 1, tzinfo=timezone.utc) if year else None,
+        depends=list(depends),
+        optional_deps=[],
+        repo="extra",
+        is_foreign=False,
+        installed_size=size,
+    )
+
+
+def test_package_table_top_n_by_field():
+    infos = [
+        _info("zsh", year=2021, depends=["glibc"], size=3 * 2**20),
+        _info("git", year=2019, depends=["curl", "expat", "perl"]),
+        _info("vim", depends=["gpm", "acl"], size=40 * 2**20),
+        _info("bash", year=2020, size=10 * 2**20),
+    ]
+    table = pacman.PackageTable.from_infos(infos)
+    name_of = lambda rows: [table.names[row] for row in rows]  # noqa: E731
+    assert name_of(table.top("age", 2)) == ["git", "bash"]
+    assert name_of(table.top("age")) == ["git", "bash", "zsh", "vim"]  # unknown install date last
+    assert name_of(table.top("size", 1)) == ["vim"]
+    assert name_of(table.top("dependencies")) == ["git", "vim", "zsh", "bash"]
+    assert name_of(table.top("name", 2)) == ["bash", "git"]
+    assert [info.name for info in pacman.order_infos(infos, "size", limit=5)] == ["vim", "bash", "zsh"]
+    with pytest.raises(ValueError):
+        table.top("colour")
+
+
+def test_installed_size_is_parsed_from_pacman_qi():
+    assert pacman._parse_size("1.50 MiB") == 1572864
+    assert pacman._parse_size("512,00 KiB") == 524288
+    assert pacman._parse_size("unknown") is None
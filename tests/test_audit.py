@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from cadmu.core import mounts
+from cadmu.core.runner import CommandRunner, CommandSpec
+from cadmu.core.timeseries import MetricStore
+from cadmu.modules.audit import base as audit_base
+from cadmu.modules.audit.base import (
+    AuditCheck,
+    AuditFinding,
+    AuditOptions,
+    MetricSample,
+    _check_storage,
+    forecast_findings,
+    run_audit_checks,
+)
+from cadmu.modules.audit.watch import AuditWatcher
+
+
+def _options(tmp_path: Path) -> AuditOptions:
+    return AuditOptions(home=tmp_path, os_release={"ID": "arch"})
+
+
+def _finding(summary: str) -> AuditFinding:
+    return AuditFinding(severity="info", category="test", summary=summary)
+
+
+def test_checks_run_concurrently_and_keep_declaration_order(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def waiting(name):
+        def run(runner, options):
+            barrier.wait()
+            return [_finding(name)]
+
+        return run
+
+    checks = [AuditCheck("first", "test", waiting("first")), AuditCheck("second", "test", waiting("second"))]
+    report = run_audit_checks(CommandRunner(), _options(tmp_path), checks=checks)
+    assert [finding.summary for finding in report.findings] == ["first", "second"]
+    assert [(timing.name, timing.status) for timing in report.timings] == [("first", "ok"), ("second", "ok")]
+
+
+def test_hung_and_failing_checks_become_findings(tmp_path):
+    release = threading.Event()
+
+    def hung(runner, options):
+        release.wait(10)
+        return [_finding("too late")]
+
+    def broken(runner, options):
+        raise RuntimeError("no such device")
+
+    checks = [
+        AuditCheck("hung", "storage", hung, timeout=0.2),
+        AuditCheck("broken", "services", broken),
+        AuditCheck("fine", "test", lambda runner, options: [_finding("fine")]),
+        AuditCheck("skipped", "test", lambda runner, options: [_finding("skipped")], applies=lambda options: False),
+    ]
+    report = run_audit_checks(CommandRunner(), _options(tmp_path), checks=checks)
+    release.set()
+    assert [(finding.category, finding.summary) for finding in report.findings] == [
+        ("storage", "hung check timed out after 0.2s"),
+        ("services", "broken check failed: no such device"),
+        ("test", "fine"),
+    ]
+    assert [timing.status for timing in report.timings] == ["timeout", "error", "ok"]
+    assert report.timings[0].duration < 5
+
+
+def test_commands_are_capped_at_the_check_deadline(tmp_path):
+    def sleeper(runner, options):
+        runner.execute(CommandSpec(label="sleep", command=[sys.executable, "-c", "import time; time.sleep(30)"]))
+        return []
+
+    report = run_audit_checks(CommandRunner(), _options(tmp_path), checks=[AuditCheck("sleep", "test", sleeper)], timeout=0.5)
+    assert report.timings[0].status == "timeout"
+    assert report.timings[0].duration < 5
+
+
+def test_watcher_emits_only_transitions_on_each_checks_cadence(tmp_path):
+    now = [0.0]
+    memory = [[_finding("low memory")]]
+    calls = {"memory": 0, "slow": 0}
+
+    def sample_memory(runner, options):
+        calls["memory"] += 1
+        return memory[0]
+
+    def slow(runner, options):
+        calls["slow"] += 1
+        return []
+
+    checks = [
+        AuditCheck("memory", "memory", sample_memory, interval=1.0),
+        AuditCheck("slow", "services", slow, interval=60.0),
+    ]
+    watcher = AuditWatcher(CommandRunner(), _options(tmp_path), checks=checks, clock=lambda: now[0])
+    assert [(event.kind, event.finding.summary) for event in watcher.poll(wait=True)] == [("raised", "low memory")]
+
+    now[0] = 0.5
+    assert watcher.poll(wait=True) == [] and calls == {"memory": 1, "slow": 1}
+    now[0] = 1.0
+    assert watcher.poll(wait=True) == [] and calls == {"memory": 2, "slow": 1}
+
+    memory[0] = [AuditFinding(severity="warning", category="test", summary="low memory")]
+    now[0] = 2.0
+    assert [event.kind for event in watcher.poll(wait=True)] == ["changed"]
+    memory[0] = []
+    now[0] = 3.0
+    assert [(event.kind, event.check) for event in watcher.poll(wait=True)] == [("cleared", "memory")]
+    assert calls == {"memory": 4, "slow": 1}
+    assert watcher.seconds_until_due() == 1.0
+
+
+def test_watcher_does_not_restart_a_check_that_is_still_running(tmp_path):
+    now = [0.0]
+    release = threading.Event()
+    calls = []
+
+    def hung(runner, options):
+        calls.append(1)
+        release.wait(10)
+        return []
+
+    check = AuditCheck("hung", "storage", hung, timeout=0.1, interval=1.0)
+    watcher = AuditWatcher(CommandRunner(), _options(tmp_path), checks=[check], clock=lambda: now[0])
+    assert [event.finding.key for event in watcher.poll(wait=True)] == ["check:hung:timeout"]
+    now[0] = 5.0
+    assert watcher.poll(wait=True) == [] and len(calls) == 1
+    release.set()
+    now[0] = 6.0
+    events, give_up = [], time.monotonic() + 5
+    while not events and time.monotonic() < give_up:
+        time.sleep(0.01)  # until the abandoned run has actually returned
+        events = watcher.poll(wait=True)
+    assert [event.kind for event in events] == ["cleared"] and len(calls) == 2
+
+
+def test_watcher_keeps_findings_across_a_failed_run(tmp_path):
+    now = [0.0]
+    outcome = [[_finding("low memory")]]
+
+    def sample_memory(runner, options):
+        if isinstance(outcome[0], Exception):
+            raise outcome[0]
+        return outcome[0]
+
+    check = AuditCheck("memory", "memory", sample_memory, interval=1.0)
+    watcher = AuditWatcher(CommandRunner(), _options(tmp_path), checks=[check], clock=lambda: now[0])
+    assert [event.kind for event in watcher.poll(wait=True)] == ["raised"]
+
+    # The failed run raises its error finding without clearing "low memory".
+    outcome[0] = OSError("no such device")
+    now[0] = 1.0
+    assert [(event.kind, event.finding.key) for event in watcher.poll(wait=True)] == [("raised", "check:memory:error")]
+    # The next good run clears the error; "low memory" persists and is not re-raised.
+    outcome[0] = [_finding("low memory")]
+    now[0] = 2.0
+    assert [(event.kind, event.finding.key) for event in watcher.poll(wait=True)] == [("cleared", "check:memory:error")]
+
+
+def test_storage_check_covers_every_mount_and_inode_exhaustion(tmp_path, monkeypatch):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(
+        "1 0 259:2 / / rw - ext4 /dev/nvme0n1p2 rw\n"
+        "2 1 0:25 / /run rw - tmpfs run rw\n"
+        "3 1 259:3 / /home rw - ext4 /dev/nvme0n1p3 rw\n"
+        "4 1 259:4 / /var rw - xfs /dev/nvme0n1p4 rw\n"
+        "5 1 259:4 /srv /srv rw - xfs /dev/nvme0n1p4 rw\n"
+    )
+    # path -> (fraction of blocks used, fraction of inodes used)
+    usage = {"/": (0.50, 0.10), "/home": (0.85, 0.20), "/var": (0.95, 0.97)}
+
+    def statvfs(path):
+        blocks, inodes = usage[path]
+        return SimpleNamespace(
+            f_blocks=1000, f_bfree=int(1000 * (1 - blocks)), f_bavail=0, f_frsize=4096,
+            f_files=1000, f_ffree=int(1000 * (1 - inodes)),
+        )
+
+    monkeypatch.setattr(mounts.os, "statvfs", statvfs)
+    options = AuditOptions(home=Path("/home/alice"), os_release={}, mountinfo=mountinfo)
+    results = list(_check_storage(options))
+    samples = {result.name: result.value for result in results if isinstance(result, MetricSample)}
+    assert samples == {"disk:root": 0.5, "disk:home": 0.85, "disk:/var": 0.95}
+    findings = [result for result in results if isinstance(result, AuditFinding)]
+    assert [(finding.severity, finding.key, finding.summary) for finding in findings] == [
+        ("warning", "storage:home", "home filesystem 85% full"),
+        ("critical", "storage:/var", "/var filesystem 95% full"),
+        ("critical", "inodes:/var", "/var filesystem has used 97% of its inodes"),
+    ]
+
+
+def test_storage_check_audits_an_overlay_root(tmp_path, monkeypatch):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(
+        "500 400 0:60 / / rw,relatime - overlay overlay rw,lowerdir=/l,upperdir=/u,workdir=/w\n"
+        "501 500 0:61 / /proc rw - proc proc rw\n"
+    )
+    monkeypatch.setattr(
+        mounts.os,
+        "statvfs",
+        lambda path: SimpleNamespace(f_blocks=1000, f_bfree=50, f_bavail=0, f_frsize=4096, f_files=0, f_ffree=0),
+    )
+    options = AuditOptions(home=Path("/root"), os_release={}, mountinfo=mountinfo)
+    findings = [result for result in _check_storage(options) if isinstance(result, AuditFinding)]
+    assert [(finding.severity, finding.key) for finding in findings] == [("critical", "storage:root")]
+
+
+def test_nearly_full_home_keeps_its_finding_when_the_detail_scan_fails_or_stalls(tmp_path, monkeypatch):
+    home = tmp_path / "alice"
+    (home / "videos").mkdir(parents=True)
+    (home / "videos" / "big").write_bytes(b"x" * 65536)
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(f"1 0 259:2 / / rw - ext4 /dev/a rw\n2 1 259:3 / {tmp_path} rw - ext4 /dev/b rw\n")
+    used = {"/": 0.50, str(tmp_path): 0.97}
+    monkeypatch.setattr(
+        mounts.os,
+        "statvfs",
+        lambda path: SimpleNamespace(
+            f_blocks=1000, f_bfree=int(1000 * (1 - used[path])), f_bavail=0, f_frsize=4096, f_files=0, f_ffree=0
+        ),
+    )
+    options = AuditOptions(home=home, os_release={}, mountinfo=mountinfo, usage_index=tmp_path / "index.sqlite")
+
+    def home_finding():
+        findings = [result for result in _check_storage(options) if isinstance(result, AuditFinding)]
+        assert [(finding.severity, finding.summary) for finding in findings] == [("critical", "home filesystem 97% full")]
+        return findings[0]
+
+    assert home_finding().detail.startswith(f"largest directories: {home / 'videos'} (")
+
+    def locked(root, index):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(audit_base, "scan_indexed", locked)
+    assert home_finding().detail is None
+
+    release = threading.Event()
+    monkeypatch.setattr(audit_base, "scan_indexed", lambda root, index: release.wait(10))
+    monkeypatch.setattr(audit_base, "HOME_DETAIL_TIMEOUT", 0.1)
+    try:
+        started = time.monotonic()
+        assert home_finding().detail is None
+        # The stalled scan is not started a second time.
+        assert home_finding().detail is None
+        assert time.monotonic() - started < 5
+    finally:
+        release.set()
+
+
+def _fill(path: Path, name: str, values, *, step: float = 600.0, start: float = 1_000_000.0) -> float:
+    at = start
+    for value in values:
+        forecast_findings(path, [MetricSample(name, value, 1.0, "root filesystem will be full")], "storage", now=at)
+        at += step
+    return at
+
+
+def test_forecast_reports_when_a_steady_trend_reaches_the_limit(tmp_path):
+    store = tmp_path / "metrics.sqlite"
+    # Every half hour for six hours: 50% -> 77.5%, i.e. +5 points per hour.
+    at = _fill(store, "disk:root", [0.50 + 0.025 * step for step in range(11)], step=1800.0)
+    sample = MetricSample("disk:root", 0.775, 1.0, "root filesystem will be full", remediation="clean up")
+    findings = forecast_findings(store, [sample], "storage", now=at)
+    assert [(finding.severity, finding.key, finding.summary) for finding in findings] == [
+        ("critical", "forecast:disk:root", "root filesystem will be full in ~4 hours"),
+    ]
+    assert findings[0].remediation == "clean up"
+    assert findings[0].detail.startswith("now 78%, changing +5.00% per hour")
+
+
+def test_forecast_ignores_short_flat_and_noisy_histories(tmp_path):
+    store = tmp_path / "metrics.sqlite"
+    # Too short: five samples ten minutes apart span under an hour.
+    short = _fill(store, "short", [0.5, 0.6, 0.7, 0.8])
+    assert forecast_findings(store, [MetricSample("short", 0.9, 1.0, "x")], "storage", now=short) == []
+    # Flat, and a saw-tooth whose fitted line is meaningless.
+    flat = _fill(store, "flat", [0.6] * 12)
+    assert forecast_findings(store, [MetricSample("flat", 0.6, 1.0, "x")], "storage", now=flat) == []
+    noisy = _fill(store, "noisy", [0.3, 0.9] * 6)
+    assert forecast_findings(store, [MetricSample("noisy", 0.3, 1.0, "x")], "storage", now=noisy) == []
+
+
+def test_check_samples_are_recorded_and_forecast_during_a_run(tmp_path):
+    store = tmp_path / "metrics.sqlite"
+    now = time.time()
+    with MetricStore(store) as metrics:
+        for hour in range(6):
+            metrics.record({"memory:available": 0.60 - 0.05 * hour}, at=now - (6 - hour) * 3600)
+
+    def memory(runner, options):
+        return [MetricSample("memory:available", 0.30, 0.0, "available RAM will run out")]
+
+    options = AuditOptions(home=tmp_path, os_release={}, metrics=store)
+    report = run_audit_checks(CommandRunner(), options, checks=[AuditCheck("memory", "memory", memory)])
+    assert [(finding.category, finding.key) for finding in report.findings] == [("memory", "forecast:memory:available")]
+    assert report.findings[0].severity == "critical"
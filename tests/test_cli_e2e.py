@@ -38,10 +38,10 @@ def test_cli_arch_command(monkeypatch, capsys):
     )
 
     monkeypatch.setattr("cadmu.cli.CommandRunner", lambda use_sudo=False: DummyRunner(use_sudo))
-    monkeypatch.setattr("cadmu.cli.arch_pacman.collect_explicit_infos", lambda runner: [pkg])
+    monkeypatch.setattr("cadmu.cli.arch_pacman.collect_explicit_infos", lambda runner, **kwargs: [pkg])
     monkeypatch.setattr(
-        "cadmu.cli.arch_pacman.build_explicit_package_table",
-        lambda runner, include_recommendations, limit, infos: "TABLE",  # noqa: ARG001
+        "cadmu.cli.arch_pacman.iter_explicit_package_table",
+        lambda runner, include_recommendations, limit, infos, width: iter(["TABLE"]),  # noqa: ARG001
     )
     monkeypatch.setattr("cadmu.cli.arch_pacman.top_oldest_packages", lambda infos, limit=5: infos)
 
@@ -55,6 +55,42 @@ def test_cli_arch_command(monkeypatch, capsys):
     assert "python" in output or "Oldest explicit installs" in output
 
 
+def test_cli_arch_all_installed(monkeypatch, capsys):
+    infos = [
+        arch_pacman.PackageInfo(
+            name=name,
+            version="1.0-1",
+            description="",
+            install_date=datetime(year, 1, 1, tzinfo=timezone.utc),
+            depends=[],
+            optional_deps=[],
+            repo="core",
+            is_foreign=False,
+        )
+        for name, year in [("glibc", 2019), ("zlib", 2020)]
+    ]
+    monkeypatch.setattr("cadmu.cli.CommandRunner", lambda use_sudo=False: DummyRunner(use_sudo))
+    monkeypatch.setattr(
+        "cadmu.cli.arch_pacman.collect_installed_table",
+        lambda runner, **kwargs: arch_pacman.PackageTable.from_infos(infos),
+    )
+    sys.argv = ["cadmu", "arch", "--pacman", "--all-installed", "--recommendations", "--limit", "1"]
+
+    from cadmu import cli
+
+    cli.main()
+    output = capsys.readouterr().out
+    assert "| glibc" in output and "| zlib" not in output
+    assert "Retain (system critical)" in output
+    assert "Oldest installs:\n - glibc (1.0-1) • Legacy" in output
+
+    sys.argv = ["cadmu", "arch", "--pacman", "--all-installed", "--sort", "name", "--top", "1"]
+    monkeypatch.setattr(infos[0], "name", "zzz-last")
+    cli.main()
+    output = capsys.readouterr().out
+    assert "| zlib" in output and "zzz-last" not in output
+
+
 def test_cli_clean_plan(monkeypatch, capsys):
     actions = [
         CleanupAction(identifier="pip-cache", description="Purge pip cache", command=["pip", "cache", "purge"]),
@@ -71,3 +107,29 @@ def test_cli_clean_plan(monkeypatch, capsys):
     assert "Cleanup plan" in output
     assert "pip cache" in output
     assert "Use --execute" in output
+
+
+def test_cli_report_show_section(monkeypatch, capsys, tmp_path):
+    from cadmu.core import report_index
+    from cadmu.core.reporting import ReportWriter
+
+    path = tmp_path / "report.txt"
+    writer = ReportWriter(path, recorders=[report_index.IndexRecorder(path)])
+    writer.section("Basics")
+    writer.write_command(["uname"], "Linux", label="uname")
+    writer.section("Networking")
+    writer.write_command(["ip", "route"], "default via 10.0.0.1", label="ip route")
+    writer.close()
+
+    monkeypatch.setattr("cadmu.cli.CommandRunner", lambda use_sudo=False: DummyRunner(use_sudo))
+    from cadmu import cli
+
+    sys.argv = ["cadmu", "report", "show", str(path), "--section", "Networking"]
+    cli.main()
+    output = capsys.readouterr().out
+    assert output.startswith("===== Networking =====")
+    assert "uname" not in output
+
+    sys.argv = ["cadmu", "report", "show", str(path)]
+    cli.main()
+    assert " - Basics (1 commands" in capsys.readouterr().out
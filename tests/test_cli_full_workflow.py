@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import gzip
 import os
 import sys
 from datetime import datetime, timezone
@@ -9,7 +10,7 @@ import pytest
 from cadmu.core.runner import CommandResult, CommandSpec
 from cadmu.core.system import HostIdentity
 from cadmu.modules.arch.pacman import PackageInfo
-from cadmu.modules.audit.base import AuditFinding
+from cadmu.modules.audit.base import AuditFinding, AuditReport
 from cadmu.modules.cleaning.base import CleanupAction
 from cadmu.modules.maintenance.base import MaintenanceTask
 from cadmu.modules.updating.base import UpdateStep
@@ -84,7 +85,7 @@ def test_cli_end_to_end_workflow(monkeypatch: pytest.MonkeyPatch, tmp_path, caps
             detail="root at 92% usage",
         )
     ]
-    monkeypatch.setattr(cli, "run_audit", lambda runner, options: audit_findings)
+    monkeypatch.setattr(cli, "run_audit_checks", lambda runner, options, timeout: AuditReport(findings=audit_findings))
 
     def fake_planned_actions(options):
         return [
@@ -171,11 +172,11 @@ def test_cli_end_to_end_workflow(monkeypatch: pytest.MonkeyPatch, tmp_path, caps
         repo="extra",
         is_foreign=False,
     )
-    monkeypatch.setattr(cli.arch_pacman, "collect_explicit_infos", lambda runner: [pkg])
+    monkeypatch.setattr(cli.arch_pacman, "collect_explicit_infos", lambda runner, **kwargs: [pkg])
     monkeypatch.setattr(
         cli.arch_pacman,
-        "build_explicit_package_table",
-        lambda runner, include_recommendations, limit, infos: "PACKAGE TABLE\npython",
+        "iter_explicit_package_table",
+        lambda runner, include_recommendations, limit, infos, width: iter(["PACKAGE TABLE", "python"]),
     )
     monkeypatch.setattr(cli.arch_pacman, "top_oldest_packages", lambda infos, limit=5: infos[:limit])
     monkeypatch.setattr(cli.arch_pacman, "age_label", lambda info: "450 days old")
@@ -188,10 +189,11 @@ def test_cli_end_to_end_workflow(monkeypatch: pytest.MonkeyPatch, tmp_path, caps
 
     diag_path = tmp_path / "diag.txt"
     diag_output = invoke(["cadmu", "diag", "--output", str(diag_path), "--compress"])
-    assert diag_path.exists()
-    assert diag_path.with_suffix(".tar.gz").exists()
-    assert "Diagnostic report written to" in diag_output
-    assert "Compressed archive created at" in diag_output
+    compressed = tmp_path / "diag.txt.gz"
+    assert compressed.exists()
+    assert not diag_path.exists()
+    assert "Diagnostics executed" in gzip.decompress(compressed.read_bytes()).decode()
+    assert f"Diagnostic report written to {compressed}" in diag_output
     assert diag_context["include_optional"] is True
     assert diag_context["include_arch"] is True
     assert diag_context["arch_sections"]
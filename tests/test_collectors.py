@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import struct
+import time
+
+from cadmu.core import collectors
+from cadmu.core.collectors import file_collector, run_collector
+from cadmu.core.reporting import ReportWriter
+from cadmu.core.runner import CommandSpec
+from cadmu.modules.diagnostics import base as diagnostics
+from cadmu.modules.diagnostics.base import DiagnosticsOptions, run_diagnostics
+
+
+def test_file_collector_matches_cat(tmp_path):
+    path = tmp_path / "hosts"
+    path.write_text("127.0.0.1 localhost\n\n")
+    result = run_collector(file_collector("hosts", path))
+    assert (result.stdout, result.stderr, result.exit_code, result.skipped) == ("127.0.0.1 localhost", "", 0, False)
+
+    missing = run_collector(file_collector("missing", tmp_path / "nope"))
+    assert missing.exit_code == 1
+    assert missing.stderr == f"{tmp_path / 'nope'}: No such file or directory"
+
+
+def test_format_modules_like_lsmod(tmp_path):
+    modules = tmp_path / "modules"
+    modules.write_text(
+        "snd_hda_intel 61440 3 - Live 0x0000000000000000\n"
+        "snd_pcm 180224 4 snd_hda_intel,snd_hda_codec, Live 0x0000000000000000\n"
+    )
+    assert collectors.format_modules(modules).splitlines() == [
+        "Module                  Size  Used by",
+        "snd_hda_intel          61440  3",
+        "snd_pcm               180224  4 snd_hda_intel,snd_hda_codec",
+    ]
+
+
+def test_format_uptime_like_procps(tmp_path):
+    (tmp_path / "uptime").write_text("269412.55 1000.00\n")
+    (tmp_path / "loadavg").write_text("0.52 0.58 0.59 1/612 12345\n")
+    record = bytearray(384)
+    struct.pack_into("<h", record, 0, 7)
+    record[44:49] = b"alice"
+    (tmp_path / "utmp").write_bytes(bytes(record) * 2)
+    now = time.struct_time((2025, 1, 1, 10, 4, 5, 2, 1, 0))
+    text = collectors.format_uptime(tmp_path / "uptime", tmp_path / "loadavg", tmp_path / "utmp", now)
+    assert text == " 10:04:05 up 3 days,  2:50,  2 users,  load average: 0.52, 0.58, 0.59"
+    # Nobody logged in is "0 users", as procps prints it.
+    (tmp_path / "utmp").write_bytes(b"")
+    text = collectors.format_uptime(tmp_path / "uptime", tmp_path / "loadavg", tmp_path / "utmp", now)
+    assert " 0 users," in text
+
+
+class NoSubprocessRunner:
+    def execute(self, spec: CommandSpec, stdout_sink=None):  # noqa: ARG002
+        raise AssertionError(f"collector should not reach the runner: {spec.label}")
+
+
+def test_collectors_run_in_process(tmp_path, monkeypatch):
+    (tmp_path / "os-release").write_text('NAME="Test"\n')
+    sections = [("Basics", [file_collector("os-release", tmp_path / "os-release")])]
+    monkeypatch.setattr(diagnostics, "_baseline_sections", lambda options: sections)
+    for jobs in (1, 2):
+        path = tmp_path / f"report{jobs}.txt"
+        writer = ReportWriter(path)
+        run_diagnostics(writer, NoSubprocessRunner(), DiagnosticsOptions(home=tmp_path, include_arch=False, jobs=jobs))  # type: ignore[arg-type]
+        writer.close()
+        assert f'# cat {tmp_path / "os-release"}\nNAME="Test"\n\n' in path.read_text()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from cadmu.modules.arch.depgraph import DependencyGraph
+
+
+def _pkg(depends=(), optional=(), provides=(), dependency=False):
+    record = {"DEPENDS": list(depends), "OPTDEPENDS": list(optional), "PROVIDES": list(provides)}
+    if dependency:
+        record["REASON"] = ["1"]
+    return record
+
+
+def _graph():
+    return DependencyGraph.from_local_db({
+        "glibc": _pkg(dependency=True),
+        "bash": _pkg(["glibc", "readline>=8"], provides=["sh=5.2"]),
+        "readline": _pkg(["glibc", "ncurses"], dependency=True),
+        "ncurses": _pkg(["glibc"], dependency=True),
+        "python": _pkg(["glibc", "expat", "mpdecimal"], optional=["sqlite: database support"]),
+        "expat": _pkg(["glibc"], dependency=True),
+        "mpdecimal": _pkg(dependency=True),
+        "sqlite": _pkg(["readline"], dependency=True),
+        "makepkg-helper": _pkg(["sh", "python", "missing-lib"]),
+        "leftover": _pkg(["ncurses"], dependency=True),
+    })
+
+
+def test_reverse_dependencies_resolve_provides():
+    graph = _graph()
+    assert graph.dependents("bash") == ["makepkg-helper"]
+    assert graph.dependencies("makepkg-helper") == ["bash", "python"]
+    assert graph.reverse_dependency_count("glibc") == 5
+    assert graph.dependency_closure_size("makepkg-helper") == 7
+    assert graph.dependent_closure_size("ncurses") == 5  # leftover, readline, bash, sqlite, makepkg-helper
+
+
+def test_removal_set_keeps_shared_and_explicit_dependencies():
+    graph = _graph()
+    # glibc is still needed elsewhere; bash and python are explicit installs.
+    assert graph.removal_set("python") == ["expat", "mpdecimal"]
+    assert graph.removal_set("makepkg-helper") == []
+    assert graph.blast_radius("python") == 3
+    assert graph.blast_radius("bash") == 1
+
+
+def test_unrequired_matches_pacman_qet_and_qdt():
+    graph = _graph()
+    assert graph.unrequired(explicit=True) == ["makepkg-helper"]
+    # sqlite is only an optional dependency, which a single -t still counts as required.
+    assert graph.orphans() == ["leftover"]
+
+
+def test_every_provider_of_a_virtual_dependency_counts_as_required():
+    graph = DependencyGraph.from_local_db({
+        "jack2": _pkg(provides=["jack"], dependency=True),
+        "pipewire-jack": _pkg(provides=["jack=1.0"], dependency=True),
+        "ardour": _pkg(["jack"]),
+    })
+    assert graph.dependencies("ardour") == ["jack2", "pipewire-jack"]
+    assert graph.orphans() == []
+    assert graph.unrequired(explicit=True) == ["ardour"]
+
+
+def test_bulk_closure_sizes_match_the_per_package_search():
+    graph = _graph()
+    sizes = graph.dependent_closure_sizes()
+    assert {name: sizes[index] for index, name in enumerate(graph.names)} == {
+        name: graph.dependent_closure_size(name) for name in graph.names
+    }
+    assert graph.blast_radii() == {name: graph.blast_radius(name) for name in graph.names}
+    # Packages depending on each other share their dependents but do not count themselves.
+    cyclic = DependencyGraph.from_local_db({
+        "a": _pkg(["b"], dependency=True),
+        "b": _pkg(["a"], dependency=True),
+        "c": _pkg(["a"]),
+    })
+    assert list(cyclic.dependent_closure_sizes()) == [2, 2, 0]
+    assert cyclic.dependent_closure_size("a") == 2
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from cadmu.core import report_index
+from cadmu.core.reporting import JsonlRecorder, ReportWriter
+from cadmu.core.runner import CommandResult, CommandRunner, CommandSpec
+from cadmu.core.snapshots import SnapshotSession, SnapshotStore
+from cadmu.modules.diagnostics import base as diagnostics
+from cadmu.modules.diagnostics.base import DiagnosticsOptions, run_diagnostics
+
+
+class SlowRunner:
+    """Returns the label as stdout after an optional per-label delay."""
+
+    def __init__(self, delays: dict[str, float] | None = None) -> None:
+        self.delays = delays or {}
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def execute(self, spec: CommandSpec, stdout_sink=None) -> CommandResult:  # noqa: ARG002
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delays.get(spec.label, 0.0))
+        with self._lock:
+            self.active -= 1
+        return CommandResult(spec=spec, stdout=f"{spec.label} output", stderr="", exit_code=0)
+
+
+@pytest.fixture()
+def small_sections(monkeypatch):
+    sections = [
+        (
+            "First",
+            [
+                CommandSpec(label="slow", command=["slow"]),
+                CommandSpec(label="fast", command=["fast"]),
+            ],
+        ),
+        (
+            "Second",
+            [
+                CommandSpec(label="optional", command=["optional"], optional=True),
+                CommandSpec(label="last", command=["last"]),
+            ],
+        ),
+    ]
+    monkeypatch.setattr(diagnostics, "_baseline_sections", lambda options: sections)
+    return sections
+
+
+def _render(tmp_path, name, runner, options) -> str:
+    path = tmp_path / name
+    writer = ReportWriter(path)
+    try:
+        run_diagnostics(writer, runner, options)  # type: ignore[arg-type]
+    finally:
+        writer.close()
+    return path.read_text()
+
+
+def test_parallel_report_matches_sequential_order(tmp_path, small_sections):
+    delays = {"slow": 0.2}
+    sequential = _render(
+        tmp_path, "seq.txt", SlowRunner(delays), DiagnosticsOptions(home=tmp_path, include_optional=False, include_arch=False)
+    )
+    runner = SlowRunner(delays)
+    parallel = _render(
+        tmp_path,
+        "par.txt",
+        runner,
+        DiagnosticsOptions(home=tmp_path, include_optional=False, include_arch=False, jobs=4),
+    )
+    assert parallel == sequential
+    assert parallel.index("# slow") < parallel.index("# fast") < parallel.index("===== Second =====")
+    assert "# optional\n(skipped optional command)" in parallel
+    assert runner.peak > 1
+
+
+def test_parallel_respects_job_limit(tmp_path, small_sections):
+    runner = SlowRunner({"slow": 0.05, "fast": 0.05, "optional": 0.05, "last": 0.05})
+    _render(tmp_path, "limited.txt", runner, DiagnosticsOptions(home=tmp_path, include_arch=False, jobs=2))
+    assert runner.peak <= 2
+
+
+def test_captured_output_is_streamed_into_report(tmp_path, monkeypatch):
+    sections = [
+        (
+            "Logs",
+            [
+                CommandSpec(label="big", command=["sh", "-c", "echo; seq 1 30000; echo problem >&2"]),
+                CommandSpec(label="stderr only", command=["sh", "-c", "echo only-err >&2"]),
+            ],
+        )
+    ]
+    monkeypatch.setattr(diagnostics, "_baseline_sections", lambda options: sections)
+    options = DiagnosticsOptions(home=tmp_path, include_arch=False, capture_limit=2048)
+    report = _render(tmp_path, "captured.txt", CommandRunner(), options)
+    numbers = "\n".join(str(i) for i in range(1, 30001))
+    assert f"# sh -c echo; seq 1 30000; echo problem >&2\n{numbers}\n[stderr]\nproblem\n\n" in report
+    assert "# sh -c echo only-err >&2\n[stderr]\nonly-err\n\n" in report
+
+
+def test_streamed_and_captured_reports_are_identical(tmp_path, monkeypatch):
+    sections = [
+        (
+            "Mixed",
+            [
+                CommandSpec(label="seq", command=["sh", "-c", "printf '\\n\\n'; seq 1 5000; printf '  \\n'"]),
+                CommandSpec(label="both", command=["sh", "-c", "echo out; echo err >&2"]),
+                CommandSpec(label="empty", command=["true"]),
+                CommandSpec(label="missing", command=["cadmu-missing-binary"]),
+            ],
+        )
+    ]
+    monkeypatch.setattr(diagnostics, "_baseline_sections", lambda options: sections)
+    streamed = _render(tmp_path, "streamed.txt", CommandRunner(), DiagnosticsOptions(home=tmp_path, include_arch=False))
+    captured = _render(
+        tmp_path,
+        "captured.txt",
+        CommandRunner(),
+        DiagnosticsOptions(home=tmp_path, include_arch=False, jobs=3, capture_limit=512),
+    )
+    assert streamed == captured
+    assert "# echo out\n" not in streamed
+    assert "out\n[stderr]\nerr\n\n" in streamed
+    assert "# true\n\n\n" in streamed
+    assert "# cadmu-missing-binary\n(skipped) Command 'cadmu-missing-binary' not found\n\n" in streamed
+
+
+def test_jsonl_recorder_captures_result_metadata(tmp_path, small_sections):
+    records_path = tmp_path / "report.jsonl"
+    writer = ReportWriter(tmp_path / "report.txt", recorders=[JsonlRecorder(records_path)])
+    try:
+        run_diagnostics(writer, SlowRunner(), DiagnosticsOptions(home=tmp_path, include_optional=False, include_arch=False))  # type: ignore[arg-type]
+    finally:
+        writer.close()
+    commands = {
+        record["label"]: record
+        for record in map(json.loads, records_path.read_text().splitlines())
+        if record["type"] == "command"
+    }
+    assert commands["slow"]["section"] == "First"
+    assert commands["slow"]["exit_code"] == 0
+    assert commands["slow"]["skipped"] is False
+    assert commands["optional"]["skipped"] is True
+    assert commands["optional"]["exit_code"] is None
+
+
+class ScriptedRunner:
+    def __init__(self, outputs: dict[str, str]) -> None:
+        self.outputs = outputs
+
+    def execute(self, spec: CommandSpec, stdout_sink=None) -> CommandResult:  # noqa: ARG002
+        return CommandResult(spec=spec, stdout=self.outputs[spec.label], stderr="", exit_code=0)
+
+
+def _delta_run(tmp_path, name, outputs, jobs=1, store=None):
+    path = tmp_path / name
+    options = DiagnosticsOptions(home=tmp_path, include_arch=False, delta=True, jobs=jobs)
+    baseline = report_index.load_baseline(tmp_path, exclude=path)
+    if baseline is not None:
+        options.baseline_report, options.baseline = baseline
+    snapshots = SnapshotSession(store, report=name) if store is not None else None
+    writer = ReportWriter(path, recorders=[report_index.IndexRecorder(path)], snapshots=snapshots)
+    try:
+        run_diagnostics(writer, ScriptedRunner(outputs), options)  # type: ignore[arg-type]
+    finally:
+        writer.close()
+    return path
+
+
+def test_delta_reports_reference_unchanged_output(tmp_path, small_sections):
+    first = _delta_run(tmp_path, "r1.txt", {"slow": "cpu info", "fast": "routes v1", "optional": "x", "last": "same"})
+    os.utime(report_index.index_path(first), (1, 1))
+    second = _delta_run(tmp_path, "r2.txt", {"slow": "cpu info", "fast": "routes v2", "optional": "x", "last": "same"}, jobs=2)
+    os.utime(report_index.index_path(second), (2, 2))
+    third = _delta_run(tmp_path, "r3.txt", {"slow": "cpu info", "fast": "routes v2", "optional": "x", "last": "new"})
+
+    second_text = second.read_text()
+    assert "# slow\n(unchanged since r1.txt)\n\n" in second_text
+    assert "# fast\nroutes v2\n\n" in second_text
+    third_text = third.read_text()
+    # References always point at the report holding the full output, never at another reference.
+    assert "# slow\n(unchanged since r1.txt)\n\n" in third_text
+    assert "# fast\n(unchanged since r2.txt)\n\n" in third_text
+    assert "# last\nnew\n\n" in third_text
+
+    index = report_index.load_index(third)
+    assert index is not None
+    section = index.find_section("First")
+    assert section is not None
+    resolved = report_index.read_section(third, index, section).decode()
+    assert resolved == "===== First =====\n\n# slow\ncpu info\n\n# fast\nroutes v2\n\n"
+
+
+def test_snapshots_of_delta_reports_keep_full_output(tmp_path, small_sections):
+    store = SnapshotStore(tmp_path / "store")
+    outputs = {"slow": "cpu info", "fast": "routes", "optional": "x", "last": "same"}
+    first = _delta_run(tmp_path, "r1.txt", outputs, store=store)
+    os.utime(report_index.index_path(first), (1, 1))
+    second = _delta_run(tmp_path, "r2.txt", outputs, store=store)
+    assert "(unchanged since r1.txt)" in second.read_text()
+
+    first_manifest, second_manifest = (store.load_manifest(path) for path in store.manifest_paths())
+    assert [entry.blob for entry in second_manifest.entries] == [entry.blob for entry in first_manifest.entries]
+    entry = second_manifest.find("slow")
+    assert entry is not None and entry.blob is not None
+    assert store.read_blob(entry.blob) == b"cpu info"
+
+
+def test_snapshot_of_a_reference_stores_the_referenced_output(tmp_path, small_sections):
+    # Run 2 is not snapshotted, so the newest manifest still holds run 1's output.
+    store = SnapshotStore(tmp_path / "store")
+    first = _delta_run(tmp_path, "r1.txt", {"slow": "cpu", "fast": "routes v1", "optional": "x", "last": "a"}, store=store)
+    os.utime(report_index.index_path(first), (1, 1))
+    second = _delta_run(tmp_path, "r2.txt", {"slow": "cpu", "fast": "routes v2", "optional": "x", "last": "a"})
+    os.utime(report_index.index_path(second), (2, 2))
+    third = _delta_run(tmp_path, "r3.txt", {"slow": "cpu", "fast": "routes v2", "optional": "x", "last": "a"}, store=store)
+    assert "# fast\n(unchanged since r2.txt)\n\n" in third.read_text()
+
+    manifest = store.load_manifest(store.manifest_paths()[-1])
+    assert manifest.report == "r3.txt"
+    entry = manifest.find("fast")
+    assert entry is not None and entry.blob is not None
+    assert store.read_blob(entry.blob) == b"routes v2"
+    assert entry.size == len(b"routes v2")
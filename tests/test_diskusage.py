@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from cadmu.core import diskusage
+from cadmu.core.usage_index import scan_indexed
+from cadmu.core.diskusage import SharedUsageScan, format_size, scan_usage
+
+
+def _tree(root):
+    (root / "docs" / "deep" / "deeper").mkdir(parents=True)
+    (root / ".cache" / "pip").mkdir(parents=True)
+    (root / "docs" / "deep" / "deeper" / "big.bin").write_bytes(b"x" * 64 * 1024)
+    (root / "docs" / "small.txt").write_bytes(b"y" * 100)
+    (root / ".cache" / "pip" / "wheel").write_bytes(b"z" * 16 * 1024)
+    (root / ".bashrc").write_text("alias ll='ls -l'\n")
+    os.link(root / "docs" / "deep" / "deeper" / "big.bin", root / ".cache" / "big-link.bin")
+
+
+def _allocated(path):
+    return os.lstat(path).st_blocks * 512
+
+
+def test_single_walk_produces_all_summaries(tmp_path):
+    _tree(tmp_path)
+    usage = scan_usage(tmp_path, jobs=2)
+
+    pip = tmp_path / ".cache" / "pip"
+    assert usage.directories[str(pip)] == _allocated(pip) + _allocated(pip / "wheel")
+    # The hard link is counted once, under whichever subtree reached it first.
+    every_path = [tmp_path, *tmp_path.rglob("*")]
+    unique = sum(_allocated(path) for path in every_path if path.name != "big-link.bin")
+    assert usage.total == unique
+    subtrees = usage.directories[str(tmp_path / "docs")] + usage.directories[str(tmp_path / ".cache")]
+    assert subtrees == unique - _allocated(tmp_path) - _allocated(tmp_path / ".bashrc")
+
+    assert [os.path.basename(path) for path, _ in usage.top_level(hidden=False)] == ["docs"]
+    assert {os.path.basename(path) for path, _ in usage.top_level(hidden=True)} == {".cache", ".bashrc"}
+    assert usage.largest_directories(1) == [(str(tmp_path), usage.total)]
+
+
+def test_shared_scan_walks_once(tmp_path, monkeypatch):
+    _tree(tmp_path)
+    calls = []
+    original = diskusage.scan_usage
+
+    def counting_scan(root, **kwargs):
+        calls.append(root)
+        return original(root, **kwargs)
+
+    monkeypatch.setattr(diskusage, "scan_usage", counting_scan)
+    shared = SharedUsageScan(tmp_path)
+    top = shared.largest_directories_text(limit=3)
+    shared.top_level_text(hidden=True)
+    shared.top_level_text(hidden=False)
+    assert len(calls) == 1
+    assert top.splitlines()[-1].endswith(f"\t{tmp_path}")
+
+
+class _MountedEntry:
+    """A directory entry that reports another device, as if ``docs/deep`` were mounted."""
+
+    def __init__(self, entry, mount):
+        self._entry, self._mount = entry, mount
+        self.path, self.name = entry.path, entry.name
+
+    def stat(self, follow_symlinks=True):
+        st = self._entry.stat(follow_symlinks=follow_symlinks)
+        if self.path != self._mount and not self.path.startswith(self._mount + os.sep):
+            return st
+        fields = ("st_mode", "st_ino", "st_nlink", "st_size", "st_blocks", "st_mtime_ns")
+        return SimpleNamespace(st_dev=st.st_dev + 1, **{name: getattr(st, name) for name in fields})
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_crossing_walk_serves_du_x_and_plain_du(tmp_path, monkeypatch, indexed):
+    home = tmp_path / "home"
+    _tree(home)
+    mount = str(home / "docs" / "deep")
+    real_scandir = os.scandir
+
+    class FakeScandir:
+        def __init__(self, path):
+            self._listing = real_scandir(path)
+
+        def __iter__(self):
+            return (_MountedEntry(entry, mount) for entry in self._listing)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self._listing.close()
+
+    monkeypatch.setattr(os, "scandir", FakeScandir)
+    if indexed:
+        usage = scan_indexed(home, tmp_path / "index.sqlite", one_file_system=False)
+    else:
+        usage = scan_usage(home, jobs=2, one_file_system=False)
+    assert usage.mount_points == [mount]
+    docs = str(home / "docs")
+    # Like du -sh $HOME/*, the top-level totals include the mounted subtree...
+    assert usage.entries[docs] == usage.directories[docs] == _allocated(home / "docs") + _allocated(
+        home / "docs" / "small.txt"
+    ) + usage.directories[mount]
+    # ...while the du -x listing neither lists it nor counts it.
+    local = dict(usage.largest_directories(10))
+    assert local[docs] == usage.directories[docs] - usage.directories[mount]
+    assert not any(path.startswith(mount) for path in local)
+    assert local[str(home)] == usage.total - usage.directories[mount]
+    # Staying on one filesystem never descends into it at all.
+    narrow = scan_usage(home, jobs=2)
+    assert narrow.mount_points == [] and mount not in narrow.directories
+
+
+def test_format_size_rounds_up_like_du():
+    assert format_size(0) == "0"
+    assert format_size(4096) == "4.0K"
+    assert format_size(4097) == "4.1K"
+    assert format_size(10 * 1024) == "10K"
+    assert format_size(10 * 1024 + 1) == "11K"
+    assert format_size(1023 * 1024 + 1) == "1.0M"
+    assert format_size(int(1.5 * 1024**3)) == "1.5G"
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+from cadmu.core import mounts
+
+MOUNTINFO = """\
+22 1 0:21 / /proc rw,nosuid,nodev,noexec,relatime shared:5 - proc proc rw
+25 1 0:23 / /run rw,nosuid,nodev shared:12 - tmpfs run rw,mode=755
+1 0 259:2 / / rw,relatime shared:1 - ext4 /dev/nvme0n1p2 rw
+30 1 259:1 / /boot rw,relatime shared:2 - vfat /dev/nvme0n1p1 rw,fmask=0022
+31 1 0:35 /@home /home rw,relatime shared:3 - btrfs /dev/sda1 rw,subvol=/@home
+32 1 0:35 / /mnt/pool rw,relatime shared:4 - btrfs /dev/sda1 rw,subvol=/
+33 1 0:35 /@data /srv/my\\040data rw,relatime shared:6 - btrfs /dev/sda1 rw,subvol=/@data
+40 1 7:0 / /var/lib/snapd/snap/core/1 ro,nodev,relatime shared:7 - squashfs /dev/loop0 ro
+41 1 8:33 / /media/backup ro,relatime shared:8 - ext4 /dev/sdc1 ro
+50 1 0:50 / /mnt/nfs rw,relatime shared:9 - nfs4 fileserver:/export rw,vers=4.2
+broken line
+"""
+
+
+def test_parse_mountinfo_unescapes_and_reads_the_optional_fields():
+    parsed = mounts.parse_mountinfo(MOUNTINFO)
+    assert len(parsed) == 10
+    data = parsed[6]
+    assert data.mountpoint == Path("/srv/my data")
+    assert (data.device, data.root, data.fstype, data.source) == ("0:35", "/@data", "btrfs", "/dev/sda1")
+    assert parsed[8].read_only and not parsed[2].read_only
+
+
+def test_disk_mounts_drops_pseudo_and_read_only_and_deduplicates_devices():
+    kept = mounts.disk_mounts(mounts.parse_mountinfo(MOUNTINFO))
+    # The btrfs filesystem is audited once, through the mount of its top-level subvolume.
+    assert [str(mount.mountpoint) for mount in kept] == ["/", "/boot", "/mnt/pool", "/mnt/nfs"]
+
+
+def test_disk_mounts_keeps_an_overlay_root_when_asked():
+    container = mounts.parse_mountinfo(
+        "500 400 0:60 / / rw,relatime - overlay overlay rw,lowerdir=/l,upperdir=/u,workdir=/w\n"
+        "501 500 0:61 / /proc rw - proc proc rw\n"
+        "502 500 0:62 / /home/alice rw - tmpfs tmpfs rw\n"
+        "503 500 259:2 /srv/data /data rw,relatime - ext4 /dev/nvme0n1p2 rw\n"
+    )
+    assert [str(mount.mountpoint) for mount in mounts.disk_mounts(container)] == ["/data"]
+    kept = mounts.disk_mounts(container, keep=[Path("/"), Path("/home/alice")])
+    assert [str(mount.mountpoint) for mount in kept] == ["/", "/home/alice", "/data"]
+
+
+def test_mount_for_picks_the_deepest_mount_point():
+    parsed = mounts.parse_mountinfo(MOUNTINFO)
+    assert mounts.mount_for(Path("/home/alice"), parsed).mountpoint == Path("/home")
+    assert mounts.mount_for(Path("/homework"), parsed).mountpoint == Path("/")
+
+
+def test_statvfs_mounts_abandons_hung_mounts_without_stacking_threads(monkeypatch):
+    release = threading.Event()
+    calls = []
+    real_statvfs = os.statvfs
+
+    def statvfs(path):
+        calls.append(path)
+        if path == "/mnt/nfs":
+            release.wait(10)
+        return real_statvfs("/")
+
+    monkeypatch.setattr(mounts.os, "statvfs", statvfs)
+    table = [mounts.Mount("1:1", "/", Path("/"), "ext4", "/dev/a"), mounts.Mount("2:2", "/", Path("/mnt/nfs"), "nfs4", "srv:/")]
+    try:
+        first = mounts.statvfs_mounts(table, timeout=0.2)
+        assert [usage.error for usage in first] == [None, "timed out"]
+        assert first[0].total > 0 and 0.0 < first[0].fraction_used < 1.0
+        # The first call is still blocked, so the second does not start another one.
+        second = mounts.statvfs_mounts(table, timeout=0.2)
+        assert [usage.error for usage in second] == [None, "timed out"]
+        assert calls.count("/mnt/nfs") == 1
+    finally:
+        release.set()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import gzip
+import json
+import lzma
+import zlib
+
+import pytest
+
+from cadmu.core import report_index, reporting
+from cadmu.core.reporting import ReportWriter
+
+
+def test_write_policy_flushes_every_write(tmp_path):
+    path = tmp_path / "report.txt"
+    writer = ReportWriter(path, flush_policy="write")
+    writer.note("hello")
+    assert path.read_text() == "hello\n"
+    writer.close()
+
+
+def test_close_policy_buffers_until_close(tmp_path):
+    path = tmp_path / "report.txt"
+    writer = ReportWriter(path, flush_policy="close")
+    writer.section("One")
+    writer.write_command(["echo", "hi"], "hi")
+    writer.section("Two")
+    assert path.read_text() == ""
+    writer.close()
+    assert path.read_text() == "===== One =====\n\n# echo hi\nhi\n\n===== Two =====\n\n"
+
+
+def test_section_policy_flushes_completed_sections(tmp_path):
+    path = tmp_path / "report.txt"
+    writer = ReportWriter(path)
+    writer.section("One")
+    writer.note("first")
+    assert path.read_text() == ""
+    writer.section("Two")
+    assert path.read_text() == "===== One =====\n\nfirst\n"
+    writer.close()
+
+
+def test_interval_policy_flushes_after_deadline(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(reporting.time, "monotonic", lambda: now[0])
+    path = tmp_path / "report.txt"
+    writer = ReportWriter(path, flush_policy="interval", flush_interval=5.0)
+    now[0] = 1.0
+    writer.note("early")
+    assert path.read_text() == ""
+    now[0] = 10.0
+    writer.note("late")
+    assert path.read_text() == "early\nlate\n"
+    writer.close()
+
+
+def test_fsync_only_at_section_boundaries(tmp_path, monkeypatch):
+    synced: list[int] = []
+    monkeypatch.setattr(reporting.os, "fsync", lambda fd: synced.append(fd))
+    writer = ReportWriter(tmp_path / "report.txt", flush_policy="close", fsync=True)
+    writer.section("One")
+    writer.note("a")
+    writer.note("b")
+    writer.section("Two")
+    writer.close()
+    assert len(synced) == 3  # two section boundaries plus close
+
+
+def test_unknown_flush_policy_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ReportWriter(tmp_path / "report.txt", flush_policy="sometimes")
+
+
+@pytest.mark.parametrize(
+    ("codec", "opener"),
+    [("gzip", gzip.open), ("xz", lzma.open)],
+)
+def test_compressed_report_is_written_in_one_pass(tmp_path, codec, opener):
+    path = reporting.compressed_path(tmp_path / "report.txt", codec)
+    assert path.name == "report.txt" + reporting.COMPRESSION_SUFFIXES[codec]
+    writer = ReportWriter(path, compression=codec, compression_level=1)
+    writer.section("One")
+    with writer.command_block(["seq"]) as block:
+        block.write(b"1\n2\n3\n")
+    writer.close()
+    assert not (tmp_path / "report.txt").exists()
+    with opener(path, "rt", encoding="utf-8") as fh:
+        assert fh.read() == "===== One =====\n\n# seq\n1\n2\n3\n\n"
+
+
+def test_section_flush_keeps_gzip_stream_readable(tmp_path):
+    path = tmp_path / "report.txt.gz"
+    writer = ReportWriter(path, compression="gzip")
+    writer.section("One")
+    writer.note("visible")
+    writer.section("Two")
+    partial = zlib.decompressobj(wbits=31).decompress(path.read_bytes())
+    assert b"visible" in partial
+    writer.close()
+
+
+def test_unknown_codec_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ReportWriter(tmp_path / "report.txt.bz2", compression="bzip2")
+    assert not (tmp_path / "report.txt.bz2").exists()
+
+
+def test_jsonl_records_point_at_command_output(tmp_path):
+    path = tmp_path / "report.txt.gz"
+    records_path = reporting.sidecar_path(path, ".jsonl")
+    assert records_path.name == "report.jsonl"
+    writer = ReportWriter(path, compression="gzip", recorders=[reporting.JsonlRecorder(records_path)])
+    writer.write_header(host="box", effective_user="me", owner="me")
+    writer.section("Networking")
+    with writer.command_block(["ip", "route"], label="ip route") as block:
+        block.write("default via 10.0.0.1 ✓\n".encode())
+        block.write_stderr(["warn\n"])
+    writer.write_command("hosts", "(skipped optional command)")
+    writer.close()
+
+    text = gzip.decompress(path.read_bytes())
+    records = [json.loads(line) for line in records_path.read_text().splitlines()]
+    assert [record["type"] for record in records] == ["report", "section", "command", "command", "end"]
+    assert records[-1]["offset"] == len(text)
+    assert records[0]["compression"] == "gzip"
+    section = records[1]
+    assert text[section["offset"] :].startswith(b"===== Networking =====")
+    command = records[2]
+    assert command["section"] == "Networking"
+    assert command["label"] == "ip route"
+    stdout, stderr = command["stdout"], command["stderr"]
+    assert text[stdout["offset"] : stdout["offset"] + stdout["length"]].decode() == "default via 10.0.0.1 ✓"
+    assert text[stderr["offset"] : stderr["offset"] + stderr["length"]] == b"warn"
+    block_text = text[command["offset"] : command["offset"] + command["length"]]
+    assert block_text == "# ip route\ndefault via 10.0.0.1 ✓\n[stderr]\nwarn\n\n".encode()
+    assert records[3]["stderr"]["length"] == 0
+
+
+def _indexed_report(path, codec=None):
+    writer = ReportWriter(path, compression=codec, recorders=[report_index.IndexRecorder(path)])
+    writer.write_header(host="box", effective_user="me", owner="me")
+    for title, label, output in [("Basics", "uname", "Linux"), ("Networking", "ip route", "default via 10.0.0.1")]:
+        writer.section(title)
+        writer.write_command(label.split(), output, label=label)
+    writer.close()
+
+
+@pytest.mark.parametrize("codec", [None, "gzip"])
+def test_index_allows_reading_one_section(tmp_path, codec):
+    path = tmp_path / "report.txt"
+    if codec:
+        path = reporting.compressed_path(path, codec)
+    _indexed_report(path, codec)
+
+    index = report_index.load_index(path)
+    assert index is not None
+    assert [section.title for section in index.sections] == ["Basics", "Networking"]
+    section = index.find_section("networking")
+    assert section is not None
+    assert report_index.read_range(path, section.offset, section.length) == (
+        b"===== Networking =====\n\n# ip route\ndefault via 10.0.0.1\n\n"
+    )
+    command = section.commands[0]
+    assert command.label == "ip route"
+    assert report_index.read_range(path, command.offset, command.length) == b"# ip route\ndefault via 10.0.0.1\n\n"
+
+
+def test_scan_section_without_index(tmp_path):
+    path = tmp_path / "report.txt"
+    _indexed_report(path)
+    report_index.index_path(path).unlink()
+    assert report_index.load_index(path) is None
+    assert report_index.scan_section(path, "Basics") == b"===== Basics =====\n\n# uname\nLinux\n\n"
+    assert report_index.scan_section(path, "Missing") is None
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import subprocess
+import time
+
+import pytest
+
+from cadmu.core.runner import AsyncCommandRunner, CommandRunner, CommandSpec, strip_chunks
+
+
+def test_sync_runner_skips_sudo_without_permission():
+    result = CommandRunner().execute(CommandSpec(label="id", command=["id"], sudo=True))
+    assert result.skipped
+    assert result.exit_code == 126
+
+
+def test_async_execute_matches_sync_contract():
+    spec = CommandSpec(label="printf", command=["sh", "-c", "printf ' hello \\n'; echo oops >&2; exit 3"])
+    sync_result = CommandRunner().execute(spec)
+    async_result = asyncio.run(AsyncCommandRunner().execute(spec))
+    assert (async_result.stdout, async_result.stderr, async_result.exit_code) == (
+        sync_result.stdout,
+        sync_result.stderr,
+        sync_result.exit_code,
+    )
+    assert async_result.stdout == "hello"
+    assert async_result.ok is False
+
+
+def test_async_execute_reports_missing_binary():
+    spec = CommandSpec(label="missing", command=["cadmu-definitely-missing"])
+    result = asyncio.run(AsyncCommandRunner().execute(spec))
+    assert result.skipped
+    assert result.exit_code == 127
+
+
+def test_async_execute_many_runs_concurrently():
+    specs = [CommandSpec(label=f"sleep{i}", command=["sh", "-c", f"sleep 0.3; echo {i}"]) for i in range(4)]
+    started = time.monotonic()
+    results = asyncio.run(AsyncCommandRunner().execute_many(specs, limit=4))
+    elapsed = time.monotonic() - started
+    assert [result.stdout for result in results] == ["0", "1", "2", "3"]
+    assert elapsed < 1.0
+
+
+def test_async_stream_yields_lines_before_exit():
+    spec = CommandSpec(label="lines", command=["sh", "-c", "echo first; sleep 0.2; echo second >&2; echo third"])
+
+    async def consume():
+        seen = []
+        async with AsyncCommandRunner().stream(spec) as stream:
+            async for line in stream:
+                seen.append((line, stream._process.returncode))  # type: ignore[union-attr]
+        return seen, stream.result
+
+    seen, result = asyncio.run(consume())
+    assert [line for line, _ in seen] == ["first", "third"]
+    assert seen[0][1] is None  # first line arrived while the command was still running
+    assert result is not None
+    assert result.exit_code == 0
+    assert result.stderr == "second"
+
+
+def test_async_stream_timeout_kills_process():
+    spec = CommandSpec(label="hang", command=["sh", "-c", "echo start; exec sleep 5"], timeout=0.2)
+
+    async def consume():
+        async with AsyncCommandRunner().stream(spec) as stream:
+            return [line async for line in stream]
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(consume())
+
+
+def test_capture_limit_spills_large_output_to_disk():
+    script = "printf '  \\n'; seq 1 50000; echo warning >&2"
+    spec = CommandSpec(label="seq", command=["sh", "-c", script], capture_limit=4096)
+    result = CommandRunner().execute(spec)
+    assert result.stdout == ""
+    assert result.stdout_capture is not None and result.stdout_capture.spilled
+    assert result.stderr_capture is not None and not result.stderr_capture.spilled
+    expected = subprocess.run(["sh", "-c", script], capture_output=True, text=True).stdout.strip()
+    assert result.read_stdout() == expected
+    assert result.read_stderr() == "warning"
+    result.close()
+
+
+def test_async_capture_limit_matches_sync():
+    spec = CommandSpec(label="seq", command=["seq", "1", "20000"], capture_limit=1024)
+    sync_result = CommandRunner().execute(spec)
+    async_result = asyncio.run(AsyncCommandRunner().execute(spec))
+    assert async_result.stdout_capture is not None and async_result.stdout_capture.spilled
+    assert async_result.read_stdout() == sync_result.read_stdout()
+
+
+def test_strip_chunks_matches_str_strip():
+    chunks = ["\n  ", " \n", "alpha ", "  ", "\n beta", " \n\n", "  "]
+    assert "".join(strip_chunks(chunks)) == "".join(chunks).strip()
+    assert list(strip_chunks([" ", "\n"])) == []
+
+
+def test_stdout_sink_receives_output_while_stderr_is_captured():
+    received: list[bytes] = []
+
+    class Sink:
+        def write(self, data: bytes) -> int:
+            received.append(data)
+            return len(data)
+
+    spec = CommandSpec(label="sink", command=["sh", "-c", "seq 1 3; echo bad >&2"])
+    result = CommandRunner().execute(spec, stdout_sink=Sink())
+    assert b"".join(received) == b"1\n2\n3\n"
+    assert result.stdout_capture is None
+    assert result.read_stdout() == ""
+    assert result.read_stderr() == "bad"
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+
+from cadmu.core.reporting import ReportWriter
+from cadmu.core.snapshots import SnapshotSession, SnapshotStore
+
+
+def _snapshot(store, tmp_path, name, outputs, created):
+    session = SnapshotSession(store, report=name, host="box")
+    session.created = created
+    writer = ReportWriter(tmp_path / name, snapshots=session)
+    writer.section("Networking")
+    for label, output in outputs.items():
+        writer.write_command(label.split(), output, label=label)
+    writer.close()
+    return session
+
+
+def test_outputs_are_stored_once_and_found_by_time(tmp_path):
+    store = SnapshotStore(tmp_path / "store")
+    monday = datetime(2026, 10, 12, 9, 0, 0)
+    tuesday = monday + timedelta(days=1)
+    _snapshot(store, tmp_path, "r1.txt", {"ip route": "default via 10.0.0.1", "uname": "Linux"}, monday)
+    second = _snapshot(store, tmp_path, "r2.txt", {"ip route": "default via 10.0.0.254", "uname": "Linux"}, tuesday)
+
+    assert len(store.manifest_paths()) == 2
+    assert len(list(store.objects_dir.glob("*/*"))) == 3  # "Linux" is shared
+    assert second.manifest_path is not None and second.manifest_path.name.startswith("20261013T090000")
+
+    manifest = store.manifest_at(tuesday + timedelta(hours=3))
+    assert manifest is not None and manifest.report == "r2.txt"
+    entry = manifest.find("ip route")
+    assert entry is not None and entry.blob is not None
+    assert store.read_blob(entry.blob) == b"default via 10.0.0.254"
+
+    earlier = store.manifest_at(monday + timedelta(hours=1))
+    assert earlier is not None and earlier.report == "r1.txt"
+    assert store.manifest_at(monday - timedelta(days=1)) is None
+    assert [entry.size for _, entry in store.history("ip route")] == [20, 22]
+
+
+def test_reports_with_one_stem_in_the_same_second_keep_separate_manifests(tmp_path):
+    store = SnapshotStore(tmp_path / "store")
+    noon = datetime(2026, 10, 12, 12, 0, 0)
+    first = _snapshot(store, tmp_path, "report.txt", {"uname": "Linux 6.1"}, noon)
+    second = _snapshot(store, tmp_path, "report.txt", {"uname": "Linux 6.2"}, noon)
+    third = _snapshot(store, tmp_path, "report.txt", {"uname": "Linux 6.3"}, noon)
+    assert [path.name for path in store.manifest_paths()] == [
+        "20261012T120000-report.json",
+        "20261012T120000~01-report.json",
+        "20261012T120000~02-report.json",
+    ]
+    assert [session.manifest_path for session in (first, second, third)] == store.manifest_paths()
+    assert [store.read_blob(entry.blob) for _, entry in store.history("uname")] == [b"Linux 6.1", b"Linux 6.2", b"Linux 6.3"]
+    newest = store.manifest_at(noon)
+    assert newest is not None and newest.path == third.manifest_path
+    assert list(store.tmp_dir.iterdir()) == []
+
+
+def test_gc_expires_manifests_and_sweeps_orphaned_blobs(tmp_path):
+    store = SnapshotStore(tmp_path / "store")
+    start = datetime(2026, 1, 1)
+    for day in range(3):
+        _snapshot(store, tmp_path, f"r{day}.txt", {"uptime": f"up {day} days", "uname": "Linux"}, start + timedelta(days=day))
+
+    stats = store.gc(keep=1, grace=timedelta(0))
+    assert stats.manifests_removed == 2
+    assert stats.blobs_removed == 2
+    remaining = store.manifest_at()
+    assert remaining is not None and remaining.report == "r2.txt"
+    for entry in remaining.entries:
+        assert entry.blob is not None and store.read_blob(entry.blob)
+
+    assert store.gc(max_age=timedelta(days=1), now=start + timedelta(days=10), grace=timedelta(0)).manifests_removed == 1
+    assert list(store.objects_dir.glob("*/*")) == []
+
+
+def test_gc_leaves_a_snapshot_in_progress_alone(tmp_path):
+    store = SnapshotStore(tmp_path / "store")
+    _snapshot(store, tmp_path, "r1.txt", {"uname": "Linux"}, datetime(2026, 1, 1))
+    old_blob = store.load_manifest(store.manifest_paths()[0]).entries[0].blob
+    assert old_blob is not None
+    # The manifest is gone and the blob is old: unreferenced and past any grace period.
+    store.manifest_paths()[0].unlink()
+    os.utime(store.blob_path(old_blob), (1, 1))
+
+    # A session mid-run: one output still streaming, one committed but not in a manifest
+    # yet, and one that reuses the unreferenced "Linux" blob.
+    session = SnapshotSession(store, report="r2.txt")
+    streaming = session.open_blob()
+    streaming.write(b"partial")
+    committed = session.open_blob()
+    committed.write(b"done")
+    digest = committed.commit()
+    reused = session.open_blob()
+    reused.write(b"Linux")
+    assert reused.commit() == old_blob
+
+    assert store.gc(keep=0).blobs_removed == 0
+    streaming.write(b" output")
+    assert store.read_blob(streaming.commit()) == b"partial output"
+    assert store.read_blob(digest) == b"done"
+    assert store.read_blob(old_blob) == b"Linux"
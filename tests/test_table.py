@@ -1,4 +1,6 @@
-from cadmu.core.table import render_table
+import io
+
+from cadmu.core.table import ColumnRows, iter_table, page, render_table
 
 
 def test_render_table_wraps_long_cells():
@@ -10,3 +12,51 @@ def test_render_table_wraps_long_cells():
     assert table.count("alpha") >= 1
     # Wrapped text should contain line break with partial sentence
     assert "wrap across" in table
+
+
+def test_iter_table_matches_layout_and_fits_width():
+    headers = ["Name", "Description"]
+    rows = [["alpha", "short"], ["beta", "x" * 30 + " tail"]]
+    assert render_table(headers, rows) == "\n".join([
+        "+-------+-------------------------------------+",
+        "| Name  | Description                         |",
+        "+-------+-------------------------------------+",
+        "| alpha | short                               |",
+        "+-------+-------------------------------------+",
+        "| beta  | xxxxxxxxxxxxxxxxxxxxxxxxxxxxxx tail |",
+        "+-------+-------------------------------------+",
+    ])
+    narrow = list(iter_table(headers, iter(rows), width=30))
+    assert all(len(line) == 30 for line in narrow)
+    assert narrow[-3:-1] == ["| beta  | xxxxxxxxxxxxxxxxxx |", "|       | xxxxxxxxxxxx tail  |"]
+
+
+def test_rows_are_wrapped_and_emitted_one_at_a_time():
+    class Rows(ColumnRows):
+        passes = 0
+
+        def __iter__(self):
+            self.passes += 1
+            for index, row in enumerate(super().__iter__()):
+                if self.passes == 2 and index == 1:
+                    raise AssertionError("second row read before the first was emitted")
+                yield row
+
+    lines = iter_table(["Name", "Value"], Rows([["a", "b", "c"], ["1", "2", "3"]]))
+    assert [next(lines) for _ in range(4)][-1] == "| a    | 1     |"
+
+
+def test_page_writes_directly_when_not_a_terminal(tmp_path, monkeypatch):
+    stream = io.StringIO()
+    page(["one", "two"], stream=stream)
+    assert stream.getvalue() == "one\ntwo\n"
+
+    class Terminal(io.StringIO):
+        def isatty(self):
+            return True
+
+    out = tmp_path / "paged.txt"
+    monkeypatch.setenv("PAGER", f"sh -c 'cat > {out}'")
+    terminal = Terminal()
+    page(["one", "two"], stream=terminal)
+    assert out.read_text() == "one\ntwo\n" and terminal.getvalue() == ""
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import pytest
+
+from cadmu.core.timeseries import MetricStore, linear_fit
+
+
+def test_store_wraps_at_capacity_and_drops_samples_inside_the_interval(tmp_path):
+    path = tmp_path / "metrics.sqlite"
+    with MetricStore(path, capacity=3, interval=60.0) as store:
+        for minute in range(5):
+            assert store.record({"disk:root": minute / 10}, at=minute * 60.0) == ["disk:root"]
+        # Ten seconds after the previous sample: dropped, while a new series is written.
+        assert store.record({"disk:root": 0.9, "memory:swap": 0.1}, at=250.0) == ["memory:swap"]
+    with MetricStore(path, capacity=3, interval=60.0) as store:
+        assert store.series("disk:root") == [(120.0, 0.2), (180.0, 0.3), (240.0, 0.4)]
+        assert store.series("disk:root", since=180.0) == [(180.0, 0.3), (240.0, 0.4)]
+        assert store.names() == ["disk:root", "memory:swap"]
+
+
+def test_linear_fit_projects_time_to_limit():
+    trend = linear_fit([(1_700_000_000.0 + hour * 3600, 0.5 + 0.1 * hour) for hour in range(4)])
+    assert trend is not None
+    assert trend.value == pytest.approx(0.8)
+    assert trend.slope * 3600 == pytest.approx(0.1)
+    assert trend.r_squared == pytest.approx(1.0)
+    assert (trend.samples, trend.span) == (4, 3 * 3600)
+    assert trend.time_to(1.0) == pytest.approx(2 * 3600)
+    # A falling series never reaches a higher limit; the fit needs two distinct times.
+    assert trend.time_to(0.0) is None
+    assert linear_fit([(5.0, 0.1), (5.0, 0.2)]) is None
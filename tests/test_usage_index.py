@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import shutil
+import threading
+
+from cadmu.core.diskusage import scan_usage
+from cadmu.core import usage_index
+from cadmu.core.usage_index import UsageIndex
+
+
+def _tree(root):
+    for name in ("a/x/deep", "a/y", "b/z"):
+        (root / name).mkdir(parents=True)
+    (root / "a" / "x" / "deep" / "data.bin").write_bytes(b"d" * 40000)
+    (root / "b" / "z" / "notes.txt").write_text("n" * 5000)
+    (root / "top.txt").write_text("t")
+
+
+def test_repeat_scan_only_reads_changed_directories(tmp_path):
+    home = tmp_path / "home"
+    home.mkdir()
+    _tree(home)
+    with UsageIndex(tmp_path / "usage.sqlite") as index:
+        first = index.scan(home)
+        assert index.stats.directories_read == 7
+        assert first.directories == scan_usage(home).directories
+        assert first.entries == scan_usage(home).entries
+
+    with UsageIndex(tmp_path / "usage.sqlite") as index:
+        index.scan(home)
+        # Only the root is listed again; every other directory is a stat plus a cache hit.
+        assert (index.stats.directories_read, index.stats.directories_reused) == (1, 6)
+
+        (home / "a" / "x" / "deep" / "more.bin").write_bytes(b"m" * 90000)
+        shutil.rmtree(home / "b" / "z")
+        updated = index.scan(home)
+        assert index.stats.directories_read == 3  # root, a/x/deep, b
+        assert index.stats.directories_removed == 1
+        assert updated.directories == scan_usage(home).directories
+
+
+def test_full_scan_ignores_cache(tmp_path):
+    _tree(tmp_path / "home")
+    with UsageIndex(tmp_path / "usage.sqlite") as index:
+        index.scan(tmp_path / "home")
+        index.scan(tmp_path / "home", full=True)
+        assert index.stats.directories_reused == 0
+
+
+def test_subtrees_are_walked_on_the_scan_pool(tmp_path, monkeypatch):
+    _tree(tmp_path / "home")
+    walked = []
+    real_walk = usage_index._walk_indexed
+
+    def recording_walk(top, *args, **kwargs):
+        walked.append((top.rsplit("/", 1)[-1], threading.current_thread().name.startswith("cadmu-du")))
+        return real_walk(top, *args, **kwargs)
+
+    monkeypatch.setattr(usage_index, "_walk_indexed", recording_walk)
+    with UsageIndex(tmp_path / "usage.sqlite") as index:
+        usage = index.scan(tmp_path / "home", jobs=2)
+    assert sorted(walked) == [("a", True), ("b", True), ("home", False)]
+    assert usage.directories == scan_usage(tmp_path / "home").directories